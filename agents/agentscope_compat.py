@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+agentscope 兼容层
+
+项目用到的 agentscope 非公开接口集中在这里，升级 agentscope 时只需核对本模块
+（requirements.txt 中固定了验证过的版本范围）。导入时检查 Toolkit 的私有属性，
+缺失时立即报错，避免复制出的工具箱静默丢失技能提示词或中间件。
+"""
+from agentscope.tool import Toolkit
+
+try:
+    from agentscope.tool._types import AgentSkill
+except ImportError:
+    # AgentSkill 是 TypedDict，私有路径变化时用普通字典代替，结构相同
+    AgentSkill = dict
+
+# new_toolkit_like 读写的 Toolkit 私有属性
+_TOOLKIT_PRIVATE_ATTRS = ("_agent_skill_instruction", "_agent_skill_template", "_middlewares")
+
+_missing = [name for name in _TOOLKIT_PRIVATE_ATTRS if not hasattr(Toolkit(), name)]
+if _missing:
+    raise ImportError(
+        f"当前 agentscope 版本的 Toolkit 缺少属性 {', '.join(_missing)}，"
+        "请安装 requirements.txt 中固定的 agentscope 版本"
+    )
+
+
+def add_agent_skill(toolkit: Toolkit, name: str, description: str, skill_dir: str):
+    """把已校验过的技能直接写入 Toolkit（等同 Toolkit.register_agent_skill 校验通过后的一步）"""
+    toolkit.skills[name] = AgentSkill(name=name, description=description, dir=skill_dir)
+
+
+def new_toolkit_like(template: Toolkit) -> Toolkit:
+    """创建空工具箱，沿用模板的技能提示词模板和中间件（不复制工具和技能）"""
+    toolkit = Toolkit(
+        agent_skill_instruction=template._agent_skill_instruction,
+        agent_skill_template=template._agent_skill_template,
+    )
+    toolkit._middlewares = list(template._middlewares)
+    return toolkit
@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 """Base agent class for all specialized agents."""
 import os
-import sys
-import io
 import asyncio
 from typing import List, Optional, Dict, Any, Callable
 from agentscope.agent import ReActAgent
@@ -11,43 +9,114 @@ from agentscope.memory import InMemoryMemory
 from agentscope.model import DashScopeChatModel, OpenAIChatModel
 from config.settings import (
     MODEL_PROVIDER, AIGATEWAY_API_KEY, AIGATEWAY_BASE_URL, AIGATEWAY_MODEL,
-    ZHIPU_API_KEY, ZHIPU_BASE_URL, ZHIPU_MODEL
+    ZHIPU_API_KEY, ZHIPU_BASE_URL, ZHIPU_MODEL, MODEL_HEDGE_ENABLED
 )
-from agentscope.tool import Toolkit, execute_shell_command, execute_python_code, view_text_file
+from agents import services
+from agents.skill_registry import SKILL_BASE_PATH, get_skill_registry
+from agents.routing_model import RoutingChatModel, get_routes
+from agents.toolkit_templates import skill_toolkit
 
 
-# 技能目录的基础路径
-SKILL_BASE_PATH = "./skill"
-
 # 是否启用钩子日志（可通过环境变量控制）
 ENABLE_AGENT_HOOKS = os.environ.get("ENABLE_AGENT_HOOKS", "true").lower() == "true"
 
-# 全局日志回调（用于捕获 agent 执行过程中的日志）
-_log_callback: Optional[Callable[[str, str, str], None]] = None
+def emit_log(source: str, log_type: str, message: str):
+    """发送日志到当前运行的事件通道（未开启日志捕获时忽略）"""
+    channel = services.current_channel()
+    if channel is not None and channel.capture_logs:
+        channel.publish({"type": "console_log", "source": source, "log_type": log_type, "message": message})
+
 
+def _content_parts(content: Any) -> Dict[str, str]:
+    """提取消息内容中的正文和思考文本"""
+    parts = {"text": "", "thinking": ""}
+    if isinstance(content, str):
+        parts["text"] = content
+    elif isinstance(content, list):
+        for block in content:
+            if isinstance(block, dict) and block.get("type") in parts:
+                parts[block["type"]] += block.get(block["type"], "") or ""
+    return parts
 
-def set_log_callback(callback: Optional[Callable[[str, str, str], None]]):
-    """设置全局日志回调函数
+
+def _print_log_hook(self, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """打印前钩子 - 将完整打印的消息（last=True）作为日志发布到事件通道"""
+    channel = services.current_channel()
+    msg = kwargs.get("msg")
+    if channel is None or not channel.capture_logs or msg is None or not kwargs.get("last", True):
+        return None
     
-    Args:
-        callback: 回调函数，接收 (source, log_type, message) 参数
-    """
-    global _log_callback
-    _log_callback = callback
+    if isinstance(msg.content, str):
+        lines = [msg.content]
+    else:
+        lines = []
+        for block in msg.content or []:
+            if not isinstance(block, dict):
+                continue
+            if block.get("type") == "text":
+                lines.append(block.get("text", ""))
+            elif block.get("type") == "tool_use":
+                lines.append(f"调用工具: {block.get('name')}")
+            elif block.get("type") == "tool_result":
+                output = _content_parts(block.get("output"))["text"]
+                lines.append(f"工具 {block.get('name')} 返回: {output[:200]}")
+    for line in lines:
+        if line.strip():
+            emit_log(getattr(self, "name", "Agent"), "info", line.strip())
+    return None
 
 
-def get_log_callback() -> Optional[Callable[[str, str, str], None]]:
-    """获取全局日志回调函数"""
-    return _log_callback
+def _token_stream_hook(self, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """打印前钩子 - 流式输出时计算新增内容并推送给 token 接收函数
+    
+    ReActAgent 流式推理时会以累积的消息内容多次调用 print(last=False)，
+    这里按消息 ID 记录已推送的内容，只推送增量部分。
+    """
+    sink = getattr(self, "_token_sink", None)
+    msg = kwargs.get("msg")
+    if sink is None or msg is None:
+        return None
+    
+    sent = self._token_sent.get(msg.id, {})
+    current = _content_parts(msg.content)
+    for kind, text in current.items():
+        previous = sent.get(kind, "")
+        delta = text[len(previous):] if text.startswith(previous) else text
+        if delta:
+            try:
+                sink(delta, kind)
+            except Exception:
+                pass
+    
+    if kwargs.get("last", True):
+        self._token_sent.pop(msg.id, None)
+    else:
+        self._token_sent[msg.id] = current
+    return None
 
 
-def emit_log(source: str, log_type: str, message: str):
-    """发送日志到回调函数"""
-    if _log_callback:
-        try:
-            _log_callback(source, log_type, message)
-        except Exception:
-            pass
+def set_token_sink(agent: Any, sink: Optional[Callable[[str, str], None]]):
+    """设置智能体的流式 token 接收函数
+    
+    Args:
+        agent: BaseAgent / LiteAgent 或 ReActAgent 实例
+        sink: 接收函数，参数为 (增量文本, 类型 text/thinking)；为 None 时停止推送
+    """
+    inner = getattr(agent, "agent", agent)
+    if not hasattr(inner, "register_instance_hook"):
+        # LiteAgent 等直接调用模型的智能体自行推送增量
+        if hasattr(inner, "_token_sink"):
+            inner._token_sink = sink
+        return
+    if not getattr(inner, "_token_hook_registered", False):
+        inner.register_instance_hook(
+            hook_type="pre_print",
+            hook_name="token_stream_pre_print",
+            hook=_token_stream_hook,
+        )
+        inner._token_hook_registered = True
+    inner._token_sink = sink
+    inner._token_sent = {}
 
 
 def create_model(
@@ -55,20 +124,57 @@ def create_model(
     api_key: str = "",
     model_name: str = "",
     base_url: str = "",
+    hedge: bool = False,
     **kwargs
 ):
     """
-    根据提供商创建模型实例。
+    根据提供商创建模型实例，启用限流时调用会经过 (提供商, 模型) 共享的限流器。
+    配置了 MODEL_ROUTES 时返回路由模型，主模型出错或超时后依次切换到备用模型。
     
     Args:
-        provider: 模型提供商 ("dashscope", "aigateway" 或 "zhipu")
+        provider: 模型提供商 ("dashscope", "aigateway", "zhipu" 或 "mock")
         api_key: API 密钥
         model_name: 模型名称
         base_url: API 基础 URL
+        hedge: 主模型超过 p95 耗时未响应时是否向备用模型发送对冲请求
     """
     provider = provider or MODEL_PROVIDER
-    
-    if provider == "zhipu":
+    targets = [(provider, _create_limited_model(provider, api_key, model_name, base_url, **kwargs))]
+    for route in get_routes():
+        if (route["provider"], route.get("model", "")) in [(p, m.model_name) for p, m in targets]:
+            continue
+        targets.append((route["provider"], _create_limited_model(
+            route["provider"], route.get("api_key", ""), route.get("model", ""), route.get("base_url", ""), **kwargs
+        )))
+    if len(targets) == 1:
+        return targets[0][1]
+    return RoutingChatModel(targets, hedge=hedge and MODEL_HEDGE_ENABLED)
+
+
+def _create_limited_model(provider: str, api_key: str, model_name: str, base_url: str, **kwargs):
+    """创建模型实例，依次套上注入的模型包装器（前缀缓存、限流等，见 agents.services）"""
+    model = _create_provider_model(provider, api_key, model_name, base_url, **kwargs)
+    for wrapper in services.model_wrappers:
+        model = wrapper(model, provider)
+    return model
+
+
+def _create_provider_model(
+    provider: str,
+    api_key: str = "",
+    model_name: str = "",
+    base_url: str = "",
+    **kwargs
+):
+    """创建提供商的原始模型实例"""
+    if provider == "mock":
+        # 使用本地模拟模型（不访问网络）
+        from agents.mock_model import MockChatModel
+        return MockChatModel(
+            model_name=model_name or "mock",
+            stream=kwargs.get("stream", True),
+        )
+    elif provider == "zhipu":
         # 使用智谱 GLM 模型
         actual_api_key = api_key or ZHIPU_API_KEY
         actual_base_url = base_url or ZHIPU_BASE_URL
@@ -81,7 +187,7 @@ def create_model(
         return OpenAIChatModel(
             api_key=actual_api_key,
             model_name=actual_model,
-            client_kwargs={"base_url": actual_base_url},
+            client_kwargs={"base_url": actual_base_url, "http_client": services.http_client(provider, actual_base_url)},
             generate_kwargs={
                 "temperature": kwargs.get("temperature", 0.7),
                 "max_tokens": kwargs.get("max_tokens", 4096),
@@ -99,14 +205,13 @@ def create_model(
             actual_model = model_name
         
         print(f"[create_model] Using OpenAIChatModel with:")
-        print(f"  - api_key: {actual_api_key}")
         print(f"  - base_url: {actual_base_url}")
         print(f"  - model_name: {actual_model}")
         
         return OpenAIChatModel(
             api_key=actual_api_key,
             model_name=actual_model,
-            client_kwargs={"base_url": actual_base_url},
+            client_kwargs={"base_url": actual_base_url, "http_client": services.http_client(provider, actual_base_url)},
             generate_kwargs={
                 "temperature": kwargs.get("temperature", 0.7),
                 "max_tokens": kwargs.get("max_tokens", 4096),
@@ -136,6 +241,7 @@ class BaseAgent:
         max_iters: int = 30,
         provider: str = "",
         base_url: str = "",
+        hedge: bool = False,
     ):
         """
         Initialize a specialized agent.
@@ -147,21 +253,13 @@ class BaseAgent:
             api_key: API key for the model
             model_name: Model name to use
             max_iters: Maximum iterations for ReAct loop
+            hedge: Send hedged requests to fallback models (latency-sensitive agents)
         """
         self.name = name
         self.skills = skills or []
         
-        # Create toolkit
-        self.toolkit = Toolkit()
-        
-        # Register basic tools
-        self.toolkit.register_tool_function(execute_shell_command)
-        self.toolkit.register_tool_function(execute_python_code)
-        self.toolkit.register_tool_function(view_text_file)
-        
-        # Register skills
-        for skill_path in self.skills:
-            self.toolkit.register_agent_skill(skill_path)
+        # Create toolkit (basic tools + skills), copied from a template shared by the same skill set
+        self.toolkit = skill_toolkit(self.skills)
         
         # Create the model based on provider
         model = create_model(
@@ -171,6 +269,7 @@ class BaseAgent:
             base_url=base_url,
             enable_thinking=True,
             stream=True,
+            hedge=hedge,
         )
         
         # Create the agent
@@ -184,6 +283,13 @@ class BaseAgent:
             max_iters=max_iters,
         )
         
+        # 将打印内容发布到当前运行的事件通道
+        self.agent.register_instance_hook(
+            hook_type="pre_print",
+            hook_name="event_channel_pre_print",
+            hook=_print_log_hook,
+        )
+        
         # 注册执行日志钩子
         if ENABLE_AGENT_HOOKS:
             try:
@@ -212,34 +318,7 @@ class BaseAgent:
             except Exception as e:
                 print(f"[BaseAgent] 启动回放会话失败: {e}")
         
-        # 捕获 stdout 输出
-        original_stdout = sys.stdout
-        captured_output = io.StringIO()
-        
-        class TeeOutput:
-            """同时输出到原始 stdout 和捕获器，并发送日志"""
-            def __init__(self, original, capture, agent_name):
-                self.original = original
-                self.capture = capture
-                self.agent_name = agent_name
-                self.buffer = ""
-            
-            def write(self, text):
-                self.original.write(text)
-                self.capture.write(text)
-                # 按行发送日志
-                self.buffer += text
-                while "\n" in self.buffer:
-                    line, self.buffer = self.buffer.split("\n", 1)
-                    if line.strip():
-                        emit_log(self.agent_name, "info", line.strip())
-            
-            def flush(self):
-                self.original.flush()
-                self.capture.flush()
-        
         try:
-            sys.stdout = TeeOutput(original_stdout, captured_output, self.name)
             result = await self.agent(msg)
             emit_log(self.name, "success", "处理完成")
             return result
@@ -247,7 +326,6 @@ class BaseAgent:
             emit_log(self.name, "error", f"执行错误: {str(e)}")
             raise
         finally:
-            sys.stdout = original_stdout
             # 结束回放会话
             if session_id and ENABLE_AGENT_HOOKS:
                 try:
@@ -269,64 +347,7 @@ def get_available_skills() -> List[Dict[str, Any]]:
     Returns:
         技能信息列表，每个技能包含 name, path, description
     """
-    skills = []
-    
-    if not os.path.exists(SKILL_BASE_PATH):
-        return skills
-    
-    for skill_dir_name in os.listdir(SKILL_BASE_PATH):
-        skill_path = os.path.join(SKILL_BASE_PATH, skill_dir_name)
-        skill_md_path = os.path.join(skill_path, "SKILL.md")
-        
-        if os.path.isdir(skill_path) and os.path.exists(skill_md_path):
-            # 读取 SKILL.md 获取 name 和 description
-            skill_name = skill_dir_name  # 默认使用目录名
-            description = ""
-            try:
-                with open(skill_md_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    lines = content.strip().split("\n")
-                    
-                    # 解析 YAML frontmatter 格式 (--- 包裹的 YAML 块)
-                    in_frontmatter = False
-                    for line in lines:
-                        line_stripped = line.strip()
-                        
-                        if line_stripped == "---":
-                            if not in_frontmatter:
-                                in_frontmatter = True
-                                continue
-                            else:
-                                # frontmatter 结束
-                                break
-                        
-                        if in_frontmatter:
-                            # 解析 YAML 格式的 name 和 description
-                            if line_stripped.startswith("name:"):
-                                skill_name = line_stripped[5:].strip()
-                            elif line_stripped.startswith("description:"):
-                                description = line_stripped[12:].strip()
-                    
-                    # 如果没有 frontmatter，尝试旧的解析方式
-                    if not description:
-                        for line in lines:
-                            line_stripped = line.strip()
-                            if line_stripped.startswith("# "):
-                                description = line_stripped[2:].strip()
-                                break
-                            elif line_stripped and not line_stripped.startswith("---"):
-                                description = line_stripped[:100]
-                                break
-            except Exception:
-                pass
-            
-            skills.append({
-                "name": skill_name,
-                "path": skill_path,
-                "description": description,
-            })
-    
-    return skills
+    return [info.to_dict() for info in get_skill_registry().list_skills()]
 
 
 def create_agent_by_skills(
@@ -374,25 +395,14 @@ def create_agent_by_skills(
         else:
             skill_path = os.path.join(SKILL_BASE_PATH, skill_name)
         
-        if os.path.exists(skill_path):
+        info = get_skill_registry().get(skill_path)
+        if info is not None:
             skill_paths.append(skill_path)
-            
-            # 读取技能描述用于生成系统提示词
-            skill_md_path = os.path.join(skill_path, "SKILL.md")
-            if os.path.exists(skill_md_path):
-                try:
-                    with open(skill_md_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        lines = content.strip().split("\n")
-                        for line in lines:
-                            line = line.strip()
-                            if line.startswith("# "):
-                                skill_descriptions.append(line[2:].strip())
-                                break
-                except Exception:
-                    skill_descriptions.append(skill_name)
-            else:
-                skill_descriptions.append(skill_name)
+            # 技能描述用于生成系统提示词
+            skill_descriptions.append(info.title or skill_name)
+        elif os.path.exists(skill_path):
+            skill_paths.append(skill_path)
+            skill_descriptions.append(skill_name)
         else:
             print(f"[Warning] 技能路径不存在: {skill_path}")
     
@@ -56,4 +56,5 @@ class CodeAgent(BaseAgent):
             max_iters=max_iters,
             provider=provider,
             base_url=base_url,
+            hedge=True,
         )
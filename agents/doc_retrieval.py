@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+文档检索
+
+把目录下的 Markdown 文档按标题切分为章节片段，建立 BM25 索引，按问题返回最相关的
+前 k 个片段。制度问答智能体把这些片段直接放进提示词，不再通过 view_text_file
+反复读取整份制度文档。
+
+- 中文按字符二元组（bigram）切词，英文和数字按词切分；
+- 片段带上 "文档 › 章 › 节" 的标题路径，标题中的词同样参与打分；
+- 文档的文件名、修改时间或大小变化时自动重建索引（最多每 RETRIEVAL_CHECK_INTERVAL 秒检查一次）。
+"""
+import os
+import re
+import math
+import hashlib
+import time
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import RETRIEVAL_CHUNK_CHARS, RETRIEVAL_CHECK_INTERVAL
+
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 不参与检索的提问用语
+STOP_TOKENS = {
+    "什么", "怎么", "多少", "如何", "是否", "可以", "需要", "哪些", "时候", "请问",
+    "我们", "公司", "么时", "怎样", "有没", "没有", "的是", "是什", "多久", "么办",
+}
+
+_TOKEN_RE = re.compile(r"[一-鿿]+|[a-z0-9]+(?:\.[0-9]+)?")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+
+
+def tokenize(text: str) -> List[str]:
+    """切词：中文字符二元组，英文和数字按词"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(unicodedata.normalize("NFKC", text or "").lower()):
+        word = match.group()
+        if "一" <= word[0] <= "鿿":
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+@dataclass
+class Passage:
+    """文档片段"""
+    doc: str
+    heading: str
+    text: str
+    score: float = 0.0
+
+    @property
+    def title(self) -> str:
+        """片段的标题路径"""
+        return f"{self.doc} › {self.heading}" if self.heading else self.doc
+
+
+def split_markdown(doc: str, content: str, chunk_chars: int = RETRIEVAL_CHUNK_CHARS) -> List[Passage]:
+    """按标题把 Markdown 切分为片段，过长的章节按段落继续切分"""
+    passages: List[Passage] = []
+    headings: List[Tuple[int, str]] = []
+    lines: List[str] = []
+
+    def flush():
+        body = "\n".join(lines).strip()
+        lines.clear()
+        if not body or re.fullmatch(r"[-\s]*", body):
+            return
+        # 文档标题（一级标题）已体现在文档名中
+        heading = " › ".join(title for level, title in headings if level > 1)
+        for piece in _split_body(body, chunk_chars):
+            passages.append(Passage(doc, heading, piece))
+
+    for line in content.splitlines():
+        match = _HEADING_RE.match(line.strip())
+        if match:
+            flush()
+            level = len(match.group(1))
+            headings = [(l, t) for l, t in headings if l < level] + [(level, match.group(2).strip())]
+        else:
+            lines.append(line)
+    flush()
+    return passages
+
+
+def _split_body(body: str, chunk_chars: int) -> List[str]:
+    """按空行把正文切分为不超过 chunk_chars 的片段"""
+    if len(body) <= chunk_chars:
+        return [body]
+    pieces, current = [], ""
+    for block in re.split(r"\n\s*\n", body):
+        if current and len(current) + len(block) + 2 > chunk_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+        while len(current) > chunk_chars:
+            pieces.append(current[:chunk_chars])
+            current = current[chunk_chars:]
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+class DocIndex:
+    """单个文档目录的 BM25 索引"""
+
+    def __init__(self, docs_dir: str, chunk_chars: int = RETRIEVAL_CHUNK_CHARS,
+                 check_interval: float = RETRIEVAL_CHECK_INTERVAL):
+        """
+        初始化文档索引。
+
+        Args:
+            docs_dir: 文档目录（读取其中的 *.md）
+            chunk_chars: 片段的最大字符数
+            check_interval: 两次检查文档变化的最小间隔（秒）
+        """
+        self.docs_dir = docs_dir
+        self.chunk_chars = chunk_chars
+        self.check_interval = check_interval
+        self.passages: List[Passage] = []
+        self._tfs: List[Counter] = []
+        self._lengths: List[int] = []
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+        self._signature: Optional[tuple] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _files(self) -> List[Tuple[str, int, int]]:
+        """文档目录下的 Markdown 文件：(文件名, 修改时间, 大小)"""
+        try:
+            names = sorted(n for n in os.listdir(self.docs_dir) if n.lower().endswith(".md"))
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.docs_dir, name))
+            except OSError:
+                continue
+            files.append((name, stat.st_mtime_ns, stat.st_size))
+        return files
+
+    def refresh(self, force: bool = False):
+        """文档有变化时重建索引"""
+        now = time.monotonic()
+        if not force and self._signature is not None and now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            self._checked = now
+            files = tuple(self._files())
+            if not force and files == self._signature:
+                return
+            passages = []
+            for name, _, _ in files:
+                try:
+                    with open(os.path.join(self.docs_dir, name), "r", encoding="utf-8") as f:
+                        content = f.read()
+                except OSError as e:
+                    print(f"[DocRetrieval] 读取文档失败: {name}: {e}")
+                    continue
+                passages.extend(split_markdown(os.path.splitext(name)[0], content, self.chunk_chars))
+            self._build(passages)
+            self._signature = files
+        print(f"[DocRetrieval] 已索引 {self.docs_dir}: {len(files)} 个文档, {len(passages)} 个片段")
+
+    def version(self) -> str:
+        """当前索引对应的文档版本（文件名、修改时间、大小的摘要），文档变化后改变"""
+        self.refresh()
+        return hashlib.sha256(repr(self._signature).encode("utf-8")).hexdigest()[:16]
+
+    def _build(self, passages: List[Passage]):
+        """建立 BM25 统计量"""
+        tfs = [Counter(tokenize(f"{p.title}\n{p.text}")) for p in passages]
+        lengths = [sum(tf.values()) for tf in tfs]
+        df: Counter = Counter()
+        for tf in tfs:
+            df.update(tf.keys())
+        total = len(passages)
+        self._idf = {t: math.log(1 + (total - n + 0.5) / (n + 0.5)) for t, n in df.items()}
+        self._avg_length = (sum(lengths) / total) if total else 0.0
+        self.passages, self._tfs, self._lengths = passages, tfs, lengths
+
+    def search(self, query: str, top_k: int = 4) -> List[Passage]:
+        """返回与问题最相关的前 top_k 个片段（按得分降序，没有任何匹配时为空）"""
+        self.refresh()
+        terms = {t for t in tokenize(query) if t not in STOP_TOKENS}
+        passages, tfs, lengths, idf, avg = self.passages, self._tfs, self._lengths, self._idf, self._avg_length
+        scored = []
+        for i, tf in enumerate(tfs):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / avg) if avg else BM25_K1
+            for term in terms:
+                count = tf.get(term)
+                if count:
+                    score += idf[term] * count * (BM25_K1 + 1) / (count + norm)
+            if score > 0:
+                scored.append((score, i))
+        scored.sort(reverse=True)
+        return [
+            Passage(passages[i].doc, passages[i].heading, passages[i].text, round(score, 4))
+            for score, i in scored[:top_k]
+        ]
+
+
+def format_passages(passages: List[Passage]) -> str:
+    """把检索到的片段拼成提示文本"""
+    blocks = [f"[{i}] {p.title}\n{p.text}" for i, p in enumerate(passages, 1)]
+    return "以下是根据问题从文档中检索到的相关内容：\n\n" + "\n\n".join(blocks)
+
+
+# 文档目录 -> 索引
+_indexes: Dict[str, DocIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_doc_index(docs_dir: str) -> DocIndex:
+    """获取文档目录的共享索引，首次调用时建立"""
+    key = os.path.abspath(docs_dir)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = _indexes[key] = DocIndex(docs_dir)
+    return index
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Lightweight single-shot completion path for agents without tools."""
+import uuid
+from collections.abc import AsyncGenerator
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agentscope.formatter import DashScopeChatFormatter
+from agentscope.message import Msg
+from agents import services
+from agents.base import create_model, emit_log, _content_parts
+
+
+# 已创建的模型实例（模型实例无状态，可在并发调用间共享）
+_models: Dict[Tuple[str, str, str, str, bool], Any] = {}
+
+# 消息格式化器（无状态）
+_formatter = DashScopeChatFormatter()
+
+
+def get_model(
+    provider: str = "",
+    api_key: str = "",
+    model_name: str = "",
+    base_url: str = "",
+    stream: bool = True,
+):
+    """
+    获取共享的模型实例，相同配置只创建一次。
+
+    Args:
+        provider: 模型提供商
+        api_key: API 密钥
+        model_name: 模型名称
+        base_url: API 基础 URL
+        stream: 是否流式输出
+    """
+    key = (provider, api_key, model_name, base_url, stream)
+    model = _models.get(key)
+    if model is None:
+        model = _models[key] = create_model(
+            provider=provider,
+            api_key=api_key,
+            model_name=model_name,
+            base_url=base_url,
+            enable_thinking=False,
+            stream=stream,
+        )
+    return model
+
+
+async def complete(
+    messages: List[Msg],
+    model: Any,
+    on_delta: Optional[Callable[[str, str], None]] = None,
+) -> str:
+    """
+    单次调用模型并返回回复文本，不经过 ReAct 循环、工具箱和记忆。
+
+    Args:
+        messages: 消息列表（通常为 system + user）
+        model: 模型实例，见 get_model
+        on_delta: 流式增量接收函数，参数为 (增量文本, 类型 text/thinking)
+
+    Returns:
+        回复正文
+    """
+    with services.start_span("model.call", model=getattr(model, "model_name", "")):
+        response = await model(await _formatter.format(messages))
+        if not isinstance(response, AsyncGenerator):
+            return _content_parts(response.content)["text"]
+
+        # 流式返回的是累积内容，只推送增量部分
+        sent = {"text": "", "thinking": ""}
+        async for chunk in response:
+            current = _content_parts(chunk.content)
+            for kind, text in current.items():
+                previous = sent[kind]
+                delta = text[len(previous):] if text.startswith(previous) else text
+                if delta and on_delta is not None:
+                    try:
+                        on_delta(delta, kind)
+                    except Exception:
+                        pass
+            sent = current
+        return sent["text"]
+
+
+class LiteAgent:
+    """单次对话智能体（不带工具），直接调用模型"""
+
+    def __init__(
+        self,
+        name: str,
+        sys_prompt: str,
+        api_key: str = "",
+        model_name: str = "",
+        provider: str = "",
+        base_url: str = "",
+        record_replay: bool = False,
+    ):
+        """
+        初始化单次对话智能体。
+
+        Args:
+            name: 智能体名称
+            sys_prompt: 系统提示词
+            api_key: API 密钥
+            model_name: 模型名称
+            provider: 模型提供商
+            base_url: API 基础 URL
+            record_replay: 是否写入回放日志
+        """
+        self.name = name
+        self._sys_prompt = sys_prompt
+        self.record_replay = record_replay
+        self.model = get_model(provider, api_key, model_name, base_url)
+        # 流式 token 接收函数，见 agents.base.set_token_sink
+        self._token_sink = None
+
+    async def __call__(self, msg):
+        """处理一条消息，不保留对话历史"""
+        user_input = msg.content if isinstance(msg.content, str) else _content_parts(msg.content)["text"]
+        session_id = self._start_replay(user_input) if self.record_replay else None
+        text = None
+        try:
+            text = await complete(
+                [Msg("system", self._sys_prompt, "system"), Msg("user", user_input, "user")],
+                self.model,
+                on_delta=self._token_sink,
+            )
+        except Exception as e:
+            emit_log(self.name, "error", f"执行错误: {str(e)}")
+            raise
+        finally:
+            if session_id:
+                self._end_replay(session_id, text)
+
+        emit_log(self.name, "info", text.strip())
+        return Msg(self.name, text, "assistant")
+
+    def _start_replay(self, user_input: str) -> Optional[str]:
+        """开始回放会话"""
+        try:
+            from api.services.agent_hooks import start_replay_session
+            session_id = f"{self.name}_{uuid.uuid4().hex[:8]}"
+            start_replay_session(session_id, self.name, user_input[:200])
+            return session_id
+        except Exception as e:
+            print(f"[LiteAgent] 启动回放会话失败: {e}")
+            return None
+
+    def _end_replay(self, session_id: str, output: Optional[str]):
+        """记录回复并结束回放会话"""
+        try:
+            from api.services.agent_hooks import log_replay_step, end_replay_session
+            if output is not None:
+                log_replay_step(session_id, self.name, output)
+            end_replay_session(session_id)
+        except Exception as e:
+            print(f"[LiteAgent] 结束回放会话失败: {e}")
+
+    @property
+    def sys_prompt(self):
+        """Get the agent's system prompt."""
+        return self._sys_prompt
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""确定性的模拟大模型，用于无网络环境下的基准测试和联调"""
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union
+
+from agentscope.message import TextBlock
+from agentscope.model import ChatModelBase, ChatResponse
+from agentscope.model._model_usage import ChatUsage
+from config.settings import (
+    MOCK_LLM_LATENCY, MOCK_LLM_TOKENS_PER_SECOND, MOCK_LLM_OUTPUT_TOKENS,
+    MOCK_LLM_SEED, MOCK_LLM_RESPONSES
+)
+
+
+# 随机回复使用的词表
+_VOCAB = (
+    "工作流 节点 智能体 分析 结果 数据 用户 需求 处理 完成 系统 配置 "
+    "the workflow agent result data request output step done check"
+).split()
+
+
+class MockChatModel(ChatModelBase):
+    """
+    模拟大模型。
+
+    根据输入和随机种子生成确定性的回复，并按配置的首 token 延迟和 token 速率流式返回。
+    分类器提示词（包含 "- **分类名**:" 列表）会返回其中一个分类名，保证分支可复现。
+
+    可通过 MOCK_LLM_RESPONSES 指定 JSON 文件提供固定回复，格式为
+    {"关键词": "回复", ...}，输入包含关键词时返回对应回复。
+    """
+
+    def __init__(
+        self,
+        model_name: str = "mock",
+        stream: bool = True,
+        latency: float = MOCK_LLM_LATENCY,
+        tokens_per_second: float = MOCK_LLM_TOKENS_PER_SECOND,
+        output_tokens: int = MOCK_LLM_OUTPUT_TOKENS,
+        seed: int = MOCK_LLM_SEED,
+        responses: Union[str, Dict[str, str], None] = MOCK_LLM_RESPONSES,
+        **kwargs
+    ):
+        """
+        初始化模拟模型。
+
+        Args:
+            model_name: 模型名称
+            stream: 是否流式输出
+            latency: 首 token 延迟（秒）
+            tokens_per_second: 每秒输出的 token 数，0 表示不限速
+            output_tokens: 随机回复的 token 数
+            seed: 随机种子
+            responses: 固定回复（关键词 -> 回复）或其 JSON 文件路径
+        """
+        super().__init__(model_name, stream)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.seed = seed
+        if isinstance(responses, str) and responses:
+            with open(responses, "r", encoding="utf-8") as f:
+                responses = json.load(f)
+        self.responses: Dict[str, str] = responses or {}
+
+    async def __call__(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[dict]] = None,
+        tool_choice: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Union[ChatResponse, AsyncGenerator[ChatResponse, None]]:
+        """生成回复，不会发起工具调用"""
+        prompt = _last_user_text(messages)
+        tokens = self._reply_tokens(prompt)
+        input_tokens = sum(len(_message_text(m)) for m in messages) // 2
+
+        if self.stream:
+            return self._stream(tokens, input_tokens)
+
+        start = time.monotonic()
+        await asyncio.sleep(self.latency + self._generation_time(len(tokens)))
+        return ChatResponse(
+            content=[TextBlock(type="text", text="".join(tokens))],
+            usage=ChatUsage(input_tokens=input_tokens, output_tokens=len(tokens), time=time.monotonic() - start),
+        )
+
+    async def _stream(self, tokens: List[str], input_tokens: int) -> AsyncGenerator[ChatResponse, None]:
+        """按 token 速率流式返回累积内容"""
+        start = time.monotonic()
+        await asyncio.sleep(self.latency)
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        text = ""
+        for i, token in enumerate(tokens):
+            if interval and i:
+                await asyncio.sleep(interval)
+            text += token
+            yield ChatResponse(
+                content=[TextBlock(type="text", text=text)],
+                usage=ChatUsage(input_tokens=input_tokens, output_tokens=i + 1, time=time.monotonic() - start),
+            )
+
+    def _generation_time(self, token_count: int) -> float:
+        """非流式模式下生成全部 token 的耗时"""
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return max(0, token_count - 1) / self.tokens_per_second
+
+    def _reply_tokens(self, prompt: str) -> List[str]:
+        """生成回复并切分为 token"""
+        for keyword, reply in self.responses.items():
+            if keyword in prompt:
+                return _split_tokens(reply)
+
+        digest = hashlib.sha256(f"{self.seed}:{self.model_name}:{prompt}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+
+        # 分类器提示词：返回其中一个分类名
+        categories = re.findall(r"^- \*\*(.+?)\*\*", prompt, re.MULTILINE)
+        if categories:
+            return _split_tokens(rng.choice(categories))
+
+        return [rng.choice(_VOCAB) + " " for _ in range(self.output_tokens)]
+
+
+def _message_text(message: Any) -> str:
+    """提取格式化消息中的文本"""
+    content = message.get("content", "") if isinstance(message, dict) else getattr(message, "content", "")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return str(content or "")
+
+
+def _last_user_text(messages: List[Any]) -> str:
+    """最后一条用户消息的文本"""
+    for message in reversed(messages):
+        role = message.get("role") if isinstance(message, dict) else getattr(message, "role", None)
+        if role == "user":
+            return _message_text(message)
+    return _message_text(messages[-1]) if messages else ""
+
+
+def _split_tokens(text: str) -> List[str]:
+    """将固定回复切分为近似 token（每 4 个字符一段）"""
+    return [text[i:i + 4] for i in range(0, len(text), 4)] or [""]
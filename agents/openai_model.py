@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 """OpenAI 兼容 API 模型包装类，支持 aigateway 等 OpenAI 兼容接口"""
 import os
-from typing import List, Dict, Any, Optional, Generator
-from openai import OpenAI
+from typing import List, Dict, Any, Optional
+from agents import services
 
 
 class OpenAIChatModel:
@@ -28,6 +28,7 @@ class OpenAIChatModel:
         max_tokens: int = 4096,
         stream: bool = True,
         enable_thinking: bool = False,
+        provider: str = "aigateway",
         **kwargs
     ):
         """
@@ -41,6 +42,7 @@ class OpenAIChatModel:
             max_tokens: 最大 token 数
             stream: 是否流式输出
             enable_thinking: 是否启用思考模式（某些模型支持）
+            provider: 模型提供商，与 create_model 使用同一个连接池和限流器
         """
         self.api_key = api_key or os.environ.get("AIGATEWAY_API_KEY", "")
         self.base_url = base_url or os.environ.get("AIGATEWAY_BASE_URL", "")
@@ -57,14 +59,12 @@ class OpenAIChatModel:
         
         # 调试日志：打印配置信息
         print(f"[OpenAIChatModel] Initializing with:")
-        print(f"  - api_key: {self.api_key}")
         print(f"  - base_url: {self.base_url}")
         print(f"  - model_name: {self.model_name}")
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
+        # 共享连接池上的异步客户端和限流器
+        self.client = services.async_client(provider, self.base_url, self.api_key)
+        self.limiter = services.limiter(provider, self.model_name)
     
     async def __call__(self, messages: List[Dict[str, Any]], **kwargs) -> Any:
         """
@@ -75,7 +75,7 @@ class OpenAIChatModel:
             **kwargs: 其他参数（包括 tools, tool_choice 等）
             
         Returns:
-            模型响应对象
+            ModelResponse；流式请求读取完整个流后返回，包含拼接好的 tool_calls
         """
         # 合并默认参数和传入参数
         params = {
@@ -86,24 +86,26 @@ class OpenAIChatModel:
             "stream": kwargs.get("stream", self.stream),
         }
         
-        # 处理 tools 和 tool_choice 参数（ReAct Agent 需要）
+        # 处理 tools 和 tool_choice 参数（ReAct Agent 需要），流式时增量拼接 tool_calls
         if "tools" in kwargs and kwargs["tools"]:
             params["tools"] = kwargs["tools"]
-            # 如果有 tools，暂时禁用流式输出以便正确处理 tool_calls
-            params["stream"] = False
         if "tool_choice" in kwargs and kwargs["tool_choice"]:
             params["tool_choice"] = kwargs["tool_choice"]
         
+        started = await self.limiter.acquire(services.estimate_messages_tokens(messages))
         try:
-            response = self.client.chat.completions.create(**params)
-            
-            if params["stream"]:
-                return self._handle_stream_response(response)
-            else:
-                return self._handle_response(response)
-                
-        except Exception as e:
-            raise RuntimeError(f"OpenAI API 调用失败: {e}")
+            response = await self.client.chat.completions.create(**params)
+        except BaseException as e:
+            self.limiter.release(services.classify_error(e), started)
+            if isinstance(e, Exception):
+                raise RuntimeError(f"OpenAI API 调用失败: {e}") from e
+            raise
+        
+        if params["stream"]:
+            # 流式响应读取完毕后才归还并发名额
+            return await self._handle_stream_response(response, started)
+        self.limiter.release("success", started)
+        return self._handle_response(response)
     
     def _handle_response(self, response) -> "ModelResponse":
         """处理非流式响应，支持 tool_calls"""
@@ -111,28 +113,56 @@ class OpenAIChatModel:
         content = message.content or ""
         
         # 检查是否有 tool_calls
-        tool_calls = getattr(message, 'tool_calls', None)
+        tool_calls = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.function.name, "arguments": call.function.arguments or ""},
+            }
+            for call in getattr(message, "tool_calls", None) or []
+        ]
         
         return ModelResponse(
             text=content,
             raw_response=response,
-            tool_calls=tool_calls,
+            tool_calls=tool_calls or None,
         )
     
-    def _handle_stream_response(self, response) -> "ModelResponse":
-        """处理流式响应"""
+    async def _handle_stream_response(self, response, started: float) -> "ModelResponse":
+        """处理流式响应，累积内容，并按 index 拼接 tool_calls 的增量片段"""
         full_content = ""
-        for chunk in response:
-            if chunk.choices and chunk.choices[0].delta.content:
-                content = chunk.choices[0].delta.content
-                full_content += content
-                print(content, end="", flush=True)
-        print()  # 换行
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        outcome = "success"
+        try:
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                for call in getattr(delta, "tool_calls", None) or []:
+                    # 首个片段带 id 和函数名，后续片段只带 arguments 的一部分
+                    assembled = tool_calls.setdefault(call.index, {
+                        "id": "", "type": "function", "function": {"name": "", "arguments": ""},
+                    })
+                    if call.id:
+                        assembled["id"] = call.id
+                    if call.function is not None:
+                        assembled["function"]["name"] += call.function.name or ""
+                        assembled["function"]["arguments"] += call.function.arguments or ""
+                if delta.content:
+                    full_content += delta.content
+        except BaseException as e:
+            # 取消等非 Exception 的中断不计为成功，也不调整并发上限
+            outcome = services.classify_error(e)
+            if isinstance(e, Exception):
+                raise RuntimeError(f"OpenAI API 调用失败: {e}") from e
+            raise
+        finally:
+            self.limiter.release(outcome, started)
         
         return ModelResponse(
             text=full_content,
             raw_response=None,
-            tool_calls=None,
+            tool_calls=[tool_calls[i] for i in sorted(tool_calls)] or None,
         )
     
     def format_messages(self, messages: List[Any]) -> List[Dict[str, str]]:
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 """Policy QA agent specialized in company policy consultation."""
+from agentscope.message import Msg
+from config.settings import RETRIEVAL_ENABLED, RETRIEVAL_TOP_K
+from agents.doc_retrieval import get_doc_index, format_passages
 from .base import BaseAgent
 
 
+# 制度文档目录
+POLICY_DOCS_DIR = "./skill/company-policy-qa/docs"
+
+
 class PolicyQAAgent(BaseAgent):
     """
     Specialized agent for company policy Q&A tasks.
@@ -23,7 +30,7 @@ class PolicyQAAgent(BaseAgent):
 
 ## 工作原则
 
-1. 使用装备的技能来查阅公司制度文档
+1. 优先依据系统提示（<system-hint>）中检索到的制度条款回答；条款不足以回答时，再使用装备的技能查阅公司制度文档
 2. 回答时尽量引用具体的章节和条款
 3. 涉及金额、天数、时间等数字要准确
 4. 涉及流程的问题要分步骤说明
@@ -60,4 +67,27 @@ class PolicyQAAgent(BaseAgent):
             max_iters=max_iters,
             provider=provider,
             base_url=base_url,
+            hedge=True,
         )
+        
+        # 首次创建时建立制度文档索引
+        if RETRIEVAL_ENABLED:
+            get_doc_index(POLICY_DOCS_DIR)
+    
+    async def __call__(self, msg):
+        """
+        把检索到的制度条款作为一次性提示放在问题前，避免逐个读取整份制度文档。
+
+        提示只在本次回答期间保留在记忆中，回答结束后删除，不会随后续请求重复发送。
+        """
+        hint = None
+        if RETRIEVAL_ENABLED and isinstance(msg.content, str):
+            passages = get_doc_index(POLICY_DOCS_DIR).search(msg.content, RETRIEVAL_TOP_K)
+            if passages:
+                hint = Msg("user", f"<system-hint>{format_passages(passages)}</system-hint>", "user")
+                await self.agent.memory.add(hint)
+        try:
+            return await super().__call__(msg)
+        finally:
+            if hint is not None:
+                await self.agent.memory.delete([hint.id])
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Routing model wrapper with multi-provider failover and hedged requests."""
+import json
+import math
+import time
+import asyncio
+from collections import deque
+from collections.abc import AsyncGenerator
+from typing import Any, Deque, Dict, List, NamedTuple, Tuple
+
+from agentscope.model import ChatModelBase
+from config.settings import (
+    MODEL_ROUTES, MODEL_FAILOVER_TIMEOUT, MODEL_HEDGE_DELAY, MODEL_HEDGE_MIN_SAMPLES
+)
+
+
+# 每个 (提供商, 模型) 最近的首个响应耗时（秒），用于计算对冲延迟
+_latencies: Dict[Tuple[str, str], Deque[float]] = {}
+
+# 保留的耗时样本数
+LATENCY_WINDOW = 200
+
+
+def get_routes() -> List[Dict[str, str]]:
+    """MODEL_ROUTES 中配置的备用模型列表，每项包含 provider、model，可选 api_key、base_url"""
+    if not MODEL_ROUTES:
+        return []
+    try:
+        routes = json.loads(MODEL_ROUTES)
+    except json.JSONDecodeError as e:
+        print(f"[RoutingModel] MODEL_ROUTES 格式错误: {e}")
+        return []
+    return [route for route in routes if isinstance(route, dict) and route.get("provider")]
+
+
+def record_latency(provider: str, model_name: str, seconds: float):
+    """记录一次首个响应耗时"""
+    _latencies.setdefault((provider, model_name), deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def hedge_delay(provider: str, model_name: str) -> float:
+    """对冲延迟：样本足够时取 p95，否则使用 MODEL_HEDGE_DELAY"""
+    samples = _latencies.get((provider, model_name))
+    if not samples or len(samples) < MODEL_HEDGE_MIN_SAMPLES:
+        return MODEL_HEDGE_DELAY
+    ordered = sorted(samples)
+    return ordered[min(len(ordered), math.ceil(0.95 * len(ordered))) - 1]
+
+
+class _Prefetched(NamedTuple):
+    """已读取首个分块的流式响应"""
+    first: Any
+    stream: AsyncGenerator
+
+
+class RoutingChatModel(ChatModelBase):
+    """
+    按顺序尝试多个模型：出错或首个响应超时时切换到下一个。
+
+    开启对冲时，若当前模型在其 p95 耗时内仍未返回首个响应，会同时向下一个模型
+    发出请求，使用先返回的结果并取消另一个。流式响应以首个分块作为“返回”。
+    """
+
+    def __init__(
+        self,
+        targets: List[Tuple[str, ChatModelBase]],
+        hedge: bool = False,
+        timeout: float = MODEL_FAILOVER_TIMEOUT,
+    ):
+        """
+        初始化路由模型。
+
+        Args:
+            targets: (提供商, 模型实例) 列表，按优先级排序
+            hedge: 是否发送对冲请求
+            timeout: 单个模型返回首个响应的超时时间（秒）
+        """
+        super().__init__(targets[0][1].model_name, targets[0][1].stream)
+        self.targets = targets
+        self.hedge = hedge
+        self.timeout = timeout
+
+    def __getattr__(self, name: str) -> Any:
+        if "targets" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.__dict__["targets"][0][1], name)
+
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        """调用模型，返回最先成功的响应"""
+        running: Dict[asyncio.Task, int] = {}
+        errors: List[str] = []
+        next_index = 0
+        hedged = False
+        try:
+            while True:
+                if not running:
+                    if next_index >= len(self.targets):
+                        raise RuntimeError(f"所有模型均调用失败: {'; '.join(errors)}")
+                    running[asyncio.ensure_future(self._attempt(next_index, args, kwargs))] = next_index
+                    next_index += 1
+
+                delay = None
+                if self.hedge and not hedged and next_index < len(self.targets):
+                    provider, model = self.targets[next(iter(running.values()))]
+                    delay = hedge_delay(provider, model.model_name)
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 超过对冲延迟仍未返回，同时请求下一个模型
+                    hedged = True
+                    print(f"[RoutingModel] {delay:.2f}s 内未响应，对冲请求: {self._label(next_index)}")
+                    running[asyncio.ensure_future(self._attempt(next_index, args, kwargs))] = next_index
+                    next_index += 1
+                    continue
+
+                for task in done:
+                    index = running.pop(task)
+                    if task.exception() is None:
+                        if index:
+                            print(f"[RoutingModel] 使用 {self._label(index)} 的响应")
+                        result = task.result()
+                        if isinstance(result, _Prefetched):
+                            return _prepend(result.first, result.stream)
+                        return result
+                    errors.append(f"{self._label(index)}: {task.exception()!r}")
+                    print(f"[RoutingModel] {self._label(index)} 调用失败: {task.exception()!r}")
+        finally:
+            for task in running:
+                task.cancel()
+                task.add_done_callback(_close_result)
+
+    async def _attempt(self, index: int, args: tuple, kwargs: dict) -> Any:
+        """调用单个模型，超时未返回首个响应时抛出 TimeoutError"""
+        return await asyncio.wait_for(self._first_response(index, args, kwargs), self.timeout)
+
+    async def _first_response(self, index: int, args: tuple, kwargs: dict) -> Any:
+        """等待首个响应，流式响应会预先读取第一个分块"""
+        provider, model = self.targets[index]
+        start = time.monotonic()
+        response = await model(*args, **kwargs)
+        if not isinstance(response, AsyncGenerator):
+            record_latency(provider, model.model_name, time.monotonic() - start)
+            return response
+        try:
+            first = await response.__anext__()
+        except StopAsyncIteration:
+            first = None
+        record_latency(provider, model.model_name, time.monotonic() - start)
+        return _Prefetched(first, response)
+
+    def _label(self, index: int) -> str:
+        """模型的显示名称"""
+        provider, model = self.targets[index]
+        return f"{provider}/{model.model_name}"
+
+
+async def _prepend(first: Any, response: AsyncGenerator) -> AsyncGenerator:
+    """先返回已读取的首个分块，再继续原流式响应；提前结束迭代时关闭原流式响应"""
+    try:
+        if first is not None:
+            yield first
+        async for chunk in response:
+            yield chunk
+    finally:
+        await response.aclose()
+
+
+def _close_result(task: asyncio.Task):
+    """关闭被放弃的对冲请求已返回的流式响应（原生成器已开始执行，需直接关闭以释放限流名额）"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    result = task.result()
+    if isinstance(result, _Prefetched):
+        asyncio.ensure_future(result.stream.aclose())
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+智能体运行时服务
+
+agents 包不依赖 Web 层（api）：事件通道、共享 HTTP 连接池、限流、链路追踪和模型包装
+由应用启动时通过 configure() 注入（见 api/services/agent_services.py）。
+未注入时使用本模块的默认实现：不捕获日志、不共享连接池、不限流、不追踪。
+
+智能体代码通过 `from agents import services` 后访问 services.xxx，
+不要 `from agents.services import xxx`，否则拿到的是注入前的默认实现。
+"""
+import sys
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Callable, List, Optional
+
+from openai import AsyncOpenAI
+
+
+class _NullLimiter:
+    """默认限流器：不限流"""
+
+    async def acquire(self, tokens: int = 0) -> float:
+        return time.monotonic()
+
+    def release(self, outcome: Optional[str] = "success", started: float = None):
+        pass
+
+    def record_usage(self, reserved: int, actual: int):
+        pass
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        yield
+
+
+_null_limiter = _NullLimiter()
+
+
+# 当前运行的事件通道，返回 None 表示不捕获日志
+current_channel: Callable[[], Any] = lambda: None
+
+# (提供商, base_url) -> 传给 agentscope OpenAIChatModel 的 httpx 客户端，None 表示由 openai 自建
+http_client: Callable[[str, str], Any] = lambda provider, base_url: None
+
+# (提供商, base_url, api_key) -> AsyncOpenAI
+async_client: Callable[[str, str, str], Any] = (
+    lambda provider, base_url, api_key: AsyncOpenAI(api_key=api_key, base_url=base_url)
+)
+
+# (提供商, 模型名) -> 限流器，需提供 acquire/release/record_usage/slot
+limiter: Callable[[str, str], Any] = lambda provider, model_name="": _null_limiter
+
+# 异常 -> 限流结果分类（None 表示不调整并发上限）
+classify_error: Callable[[BaseException], Optional[str]] = lambda error: None
+
+# 限流用的 token 数估算（文本 / 消息列表），默认限流器不使用
+estimate_tokens: Callable[[str], int] = lambda text: 0
+estimate_messages_tokens: Callable[[Any], int] = lambda messages: 0
+
+# 链路追踪：start_span(名称, **属性) 返回上下文管理器
+start_span: Callable[..., Any] = lambda name, **attributes: nullcontext()
+
+# 模型包装器，create_model 按顺序调用 wrapper(model, provider)（如前缀缓存、限流）
+model_wrappers: List[Callable[[Any, str], Any]] = []
+
+
+_SERVICES = (
+    "current_channel", "http_client", "async_client", "limiter", "classify_error",
+    "estimate_tokens", "estimate_messages_tokens", "start_span", "model_wrappers",
+)
+
+
+def configure(**services):
+    """
+    注入服务实现，参数名同本模块的服务属性，未传入的保持原值
+
+    Raises:
+        ValueError: 未知的服务名
+    """
+    module = sys.modules[__name__]
+    for name, value in services.items():
+        if name not in _SERVICES:
+            raise ValueError(f"未知的智能体服务: {name}")
+        setattr(module, name, value)
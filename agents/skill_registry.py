@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+技能注册表
+
+把 ./skill 下各技能 SKILL.md 的 frontmatter 解析一次后缓存在内存索引中
+（名称、路径、描述、大小、修改时间），按目录名或 frontmatter 名称 O(1) 查找。
+
+失效策略：
+1. 调用 watch() 后由 watchdog 监听技能目录，SKILL.md 或技能目录变化时立即使对应条目失效，
+   查找时不再访问磁盘；
+2. 未监听时基于 mtime：单个技能在距上次检查超过 SKILL_REGISTRY_CHECK_INTERVAL 秒后
+   被查找时只 stat 自己的 SKILL.md，有变化才重新解析；技能列表在同样的间隔内
+   最多重新扫描一次目录。
+构建智能体时不再读取全部 SKILL.md。
+
+version() 返回技能目录下全部文件（含参考文档）的内容版本，供响应缓存判断旧回答是否失效；
+摘要计算一次后缓存，监听时技能目录内任一文件事件使其失效，未监听时按同样的间隔重新计算。
+"""
+import os
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import frontmatter
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from agentscope.tool import Toolkit
+
+from agents.agentscope_compat import add_agent_skill
+from config.settings import SKILL_REGISTRY_CHECK_INTERVAL
+
+
+# 技能目录的基础路径
+SKILL_BASE_PATH = "./skill"
+
+
+@dataclass
+class SkillInfo:
+    """一个技能的索引信息"""
+    name: str
+    path: str
+    description: str
+    # SKILL.md 正文的第一个一级标题
+    title: str
+    size: int
+    mtime: float
+    # frontmatter 是否同时包含 name 和 description（注册到 Toolkit 时必需）
+    valid: bool
+    checked: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """技能列表接口返回的字段"""
+        return {
+            "name": self.name,
+            "path": self.path,
+            "description": self.description,
+            "size": self.size,
+            "mtime": self.mtime,
+        }
+
+
+def parse_skill(skill_path: str) -> Optional[SkillInfo]:
+    """解析技能目录的 SKILL.md，目录或文件不存在时返回 None"""
+    skill_md_path = os.path.join(skill_path, "SKILL.md")
+    try:
+        stat = os.stat(skill_md_path)
+        with open(skill_md_path, "r", encoding="utf-8") as f:
+            content = f.read()
+    except OSError:
+        return None
+
+    try:
+        post = frontmatter.loads(content)
+        metadata, body = post.metadata, post.content
+    except Exception:
+        metadata, body = {}, content
+
+    lines = [line.strip() for line in body.strip().split("\n")]
+    title = next((line[2:].strip() for line in lines if line.startswith("# ")), "")
+    name = metadata.get("name")
+    description = metadata.get("description")
+
+    # 没有 frontmatter 描述时，使用第一个标题或第一行正文
+    fallback = ""
+    for line in lines:
+        if line.startswith("# "):
+            fallback = line[2:].strip()
+            break
+        elif line and not line.startswith("---"):
+            fallback = line[:100]
+            break
+
+    return SkillInfo(
+        name=str(name) if name else os.path.basename(os.path.normpath(skill_path)),
+        path=skill_path,
+        description=str(description) if description else fallback,
+        title=title,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        valid=bool(name and description),
+        checked=time.monotonic(),
+    )
+
+
+def skill_tree_digest(skill_path: str) -> str:
+    """技能目录下全部文件的 (相对路径, 修改时间, 大小) 摘要，任一文件增删改后变化"""
+    entries = []
+    for root, dirs, files in os.walk(skill_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append(f"{os.path.relpath(path, skill_path)}:{stat.st_mtime_ns}:{stat.st_size}")
+    return hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()[:16]
+
+
+class SkillEventHandler(FileSystemEventHandler):
+    """技能目录事件处理器"""
+
+    def __init__(self, registry: "SkillRegistry"):
+        self.registry = registry
+
+    def on_any_event(self, event):
+        """SKILL.md 或技能目录本身变化时使对应技能失效"""
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path:
+                self.registry.on_file_event(os.fsdecode(path), event.is_directory)
+
+
+class SkillRegistry:
+    """SKILL.md 元数据的内存索引"""
+
+    def __init__(self, base_path: str = SKILL_BASE_PATH, check_interval: float = SKILL_REGISTRY_CHECK_INTERVAL):
+        """
+        初始化技能注册表。
+
+        Args:
+            base_path: 技能目录的基础路径
+            check_interval: 两次检查文件变化的最小间隔（秒），0 表示每次都检查
+        """
+        self.base_path = base_path
+        self.check_interval = check_interval
+        # 绝对路径 -> 技能信息
+        self._by_path: Dict[str, SkillInfo] = {}
+        # frontmatter 名称 -> 技能信息（扫描基础路径时建立）
+        self._by_name: Dict[str, SkillInfo] = {}
+        # 基础路径下的技能目录（保持 listdir 顺序）
+        self._listed: List[str] = []
+        self._scanned = 0.0
+        # 绝对路径 -> (目录内容摘要, 计算时间)
+        self._versions: Dict[str, Tuple[str, float]] = {}
+        # 内容版本失效次数，计算摘要期间有文件事件时不缓存结果
+        self._version_epoch = 0
+        self._observer: Optional[Observer] = None
+        self._lock = threading.RLock()
+
+    def get(self, name_or_path: str) -> Optional[SkillInfo]:
+        """
+        按技能目录名、frontmatter 名称或技能路径查找。
+
+        Returns:
+            技能信息；技能不存在或没有 SKILL.md 时返回 None
+        """
+        info = self._load(self._resolve(name_or_path))
+        if info is None and not self._is_path(name_or_path):
+            with self._lock:
+                if self._stale():
+                    self._scan()
+                info = self._by_name.get(name_or_path)
+        return info
+
+    def list_skills(self) -> List[SkillInfo]:
+        """基础路径下的全部技能"""
+        with self._lock:
+            if self._stale():
+                self._scan()
+            return [self._by_path[key] for key in self._listed if key in self._by_path]
+
+    def version(self, name_or_path: str) -> str:
+        """技能目录下全部文件的内容版本（见 skill_tree_digest），技能不存在时为空目录的摘要"""
+        key = self._resolve(name_or_path)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(key)
+            if cached is not None and (self._observer is not None or now - cached[1] < self.check_interval):
+                return cached[0]
+            epoch = self._version_epoch
+        digest = skill_tree_digest(key)
+        with self._lock:
+            if epoch == self._version_epoch:
+                self._versions[key] = (digest, now)
+        return digest
+
+    def register(self, toolkit: Toolkit, skill_dir: str):
+        """
+        使用缓存的元数据把技能注册到 Toolkit。
+
+        缓存中没有、frontmatter 不完整或与已注册技能重名时交给 Toolkit.register_agent_skill
+        处理，由它校验并抛出错误，不在这里重复实现校验规则。
+
+        Raises:
+            ValueError: 技能目录不存在、缺少 SKILL.md、frontmatter 不完整或技能重名
+        """
+        info = self.get(skill_dir)
+        if info is None or not info.valid or info.name in toolkit.skills:
+            toolkit.register_agent_skill(skill_dir)
+            return
+        add_agent_skill(toolkit, info.name, info.description, skill_dir)
+
+    def invalidate(self, name_or_path: Optional[str] = None):
+        """使缓存失效（技能被创建、修改或删除后调用），不传参数时清空全部"""
+        with self._lock:
+            if name_or_path is None:
+                self._by_path.clear()
+                self._by_name.clear()
+                self._listed = []
+                self._versions.clear()
+            else:
+                key = self._resolve(name_or_path)
+                info = self._by_path.pop(key, None)
+                if info is not None and self._by_name.get(info.name) is info:
+                    del self._by_name[info.name]
+                self._versions.pop(key, None)
+            self._version_epoch += 1
+            self._scanned = 0.0
+
+    def watch(self):
+        """启动 watchdog 监听技能目录，之后缓存只在收到文件事件时失效"""
+        with self._lock:
+            if self._observer is not None or not os.path.isdir(self.base_path):
+                return
+            observer = Observer()
+            observer.schedule(SkillEventHandler(self), self.base_path, recursive=True)
+            observer.daemon = True
+            observer.start()
+            self._observer = observer
+            self._scanned = 0.0
+            # 监听前计算的内容版本可能已过期
+            self._versions.clear()
+            self._version_epoch += 1
+        print(f"[SkillRegistry] 开始监听技能目录: {os.path.abspath(self.base_path)}")
+
+    def stop(self):
+        """停止监听"""
+        with self._lock:
+            observer, self._observer = self._observer, None
+        if observer is not None:
+            observer.stop()
+            observer.join(timeout=5)
+
+    def on_file_event(self, path: str, is_directory: bool):
+        """处理文件事件：技能目录本身和其顶层的 SKILL.md 变化时重新解析，目录内任一文件变化时内容版本失效"""
+        base = os.path.abspath(self.base_path)
+        relative = os.path.relpath(os.path.abspath(path), base)
+        parts = relative.split(os.sep)
+        if parts[0] in (os.curdir, os.pardir):
+            return
+        key = os.path.join(base, parts[0])
+        if (len(parts) == 1 and is_directory) or (len(parts) == 2 and parts[1] == "SKILL.md"):
+            self.invalidate(key)
+            return
+        with self._lock:
+            self._versions.pop(key, None)
+            self._version_epoch += 1
+
+    def _stale(self) -> bool:
+        """技能列表是否需要重新扫描（持有锁时调用）"""
+        if self._observer is not None:
+            return not self._scanned
+        return time.monotonic() - self._scanned >= self.check_interval
+
+    def _resolve(self, name_or_path: str) -> str:
+        """技能的绝对路径"""
+        if self._is_path(name_or_path):
+            return os.path.abspath(name_or_path)
+        return os.path.abspath(os.path.join(self.base_path, name_or_path))
+
+    @staticmethod
+    def _is_path(name_or_path: str) -> bool:
+        """参数是路径而不是技能名称"""
+        return os.path.isabs(name_or_path) or name_or_path.startswith("./") or os.sep in name_or_path
+
+    def _load(self, key: str) -> Optional[SkillInfo]:
+        """从缓存读取技能，超过检查间隔时校验 SKILL.md 的修改时间和大小"""
+        now = time.monotonic()
+        with self._lock:
+            info = self._by_path.get(key)
+            if info is not None and (self._observer is not None or now - info.checked < self.check_interval):
+                return info
+        if info is not None:
+            try:
+                stat = os.stat(os.path.join(key, "SKILL.md"))
+                if stat.st_mtime == info.mtime and stat.st_size == info.size:
+                    info.checked = now
+                    return info
+            except OSError:
+                pass
+        relative = os.path.join(self.base_path, os.path.basename(key))
+        fresh = parse_skill(relative if os.path.abspath(relative) == key else key)
+        with self._lock:
+            if info is not None and self._by_name.get(info.name) is info:
+                del self._by_name[info.name]
+            if fresh is None:
+                self._by_path.pop(key, None)
+            else:
+                self._by_path[key] = fresh
+                if os.path.dirname(key) == os.path.abspath(self.base_path):
+                    self._by_name[fresh.name] = fresh
+        return fresh
+
+    def _scan(self):
+        """重新扫描基础路径，只解析新增或变化的 SKILL.md（持有锁时调用）"""
+        self._scanned = time.monotonic()
+        base = os.path.abspath(self.base_path)
+        try:
+            names = os.listdir(self.base_path)
+        except OSError:
+            names = []
+        listed = []
+        for name in names:
+            key = os.path.join(base, name)
+            if os.path.isdir(key) and self._load(key) is not None:
+                listed.append(key)
+        # 移除已删除的技能
+        for key in set(self._listed) - set(listed):
+            info = self._by_path.pop(key, None)
+            if info is not None and self._by_name.get(info.name) is info:
+                del self._by_name[info.name]
+        self._listed = listed
+
+
+# 全局技能注册表实例
+_skill_registry: Optional[SkillRegistry] = None
+
+
+def get_skill_registry() -> SkillRegistry:
+    """获取技能注册表实例"""
+    global _skill_registry
+    if _skill_registry is None:
+        _skill_registry = SkillRegistry()
+    return _skill_registry
+
+
+def register_skill(toolkit: Toolkit, skill_dir: str):
+    """把技能注册到 Toolkit（替代 Toolkit.register_agent_skill，不重复读取 SKILL.md）"""
+    get_skill_registry().register(toolkit, skill_dir)
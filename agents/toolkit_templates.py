@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Prebuilt Toolkit templates shared across agents with the same tool and skill set."""
+import copy
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agentscope.tool import Toolkit, execute_shell_command, execute_python_code, view_text_file
+from agents.agentscope_compat import new_toolkit_like
+from agents.skill_registry import get_skill_registry, register_skill
+
+
+# 模板键 -> (模板工具箱, 构建时各技能的索引信息)
+_templates: Dict[Tuple, Tuple[Toolkit, Tuple]] = {}
+_lock = threading.Lock()
+
+
+def clone_toolkit(template: Toolkit) -> Toolkit:
+    """
+    复制工具箱。
+
+    已注册的工具函数（含生成好的 JSON schema）在副本间共享，副本的 tools / groups /
+    skills 是独立的字典，之后注册或移除工具不会影响模板和其他副本。
+    """
+    toolkit = new_toolkit_like(template)
+    toolkit.tools = dict(template.tools)
+    # 工具组的激活状态属于各个智能体
+    toolkit.groups = {name: copy.copy(group) for name, group in template.groups.items()}
+    toolkit.skills = dict(template.skills)
+    return toolkit
+
+
+def get_toolkit(key: Tuple, build: Callable[[], Toolkit], skills: Optional[List[str]] = None) -> Toolkit:
+    """
+    获取模板工具箱的副本，相同 key 的模板只构建一次。
+
+    Args:
+        key: 模板标识（工具与技能集合的签名）
+        build: 构建模板的函数
+        skills: 模板中注册的技能路径，任一 SKILL.md 变化时重新构建
+    """
+    registry = get_skill_registry()
+    versions = tuple(registry.get(path) for path in skills or [])
+    entry = _templates.get(key)
+    if entry is None or any(a is not b for a, b in zip(entry[1], versions)):
+        # 构建失败（如技能目录不存在）时直接抛出，不缓存
+        entry = (build(), versions)
+        with _lock:
+            _templates[key] = entry
+    return clone_toolkit(entry[0])
+
+
+def skill_toolkit(skills: List[str]) -> Toolkit:
+    """基础工具（shell / python / 查看文件）加技能的工具箱，按技能路径列表共享模板"""
+
+    def build() -> Toolkit:
+        toolkit = Toolkit()
+        toolkit.register_tool_function(execute_shell_command)
+        toolkit.register_tool_function(execute_python_code)
+        toolkit.register_tool_function(view_text_file)
+        for skill_path in skills:
+            register_skill(toolkit, skill_path)
+        return toolkit
+
+    return get_toolkit(("skills",) + tuple(skills), build, skills)
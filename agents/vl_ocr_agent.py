@@ -5,8 +5,8 @@ import base64
 import json
 from typing import List, Dict, Any, Optional
 from pathlib import Path
-from openai import OpenAI
-from config.settings import DASHSCOPE_API_KEY
+from config.settings import DASHSCOPE_API_KEY, DASHSCOPE_COMPATIBLE_URL
+from agents import services
 
 
 class VLOCRAgent:
@@ -54,7 +54,7 @@ class VLOCRAgent:
         self,
         api_key: str = "",
         model_name: str = "qwen3-vl-flash",
-        base_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        base_url: str = DASHSCOPE_COMPATIBLE_URL,
     ):
         """
         初始化 VL OCR 智能体。
@@ -72,16 +72,16 @@ class VLOCRAgent:
         self.model_name = model_name
         self.base_url = base_url
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
-        
         print(f"[VLOCRAgent] 初始化完成:")
         print(f"  - api_key: {self.api_key[:8]}...{self.api_key[-4:] if len(self.api_key) > 12 else ''}")
         print(f"  - model: {self.model_name}")
         print(f"  - base_url: {self.base_url}")
     
+    @property
+    def client(self):
+        """共享连接池上的异步客户端"""
+        return services.async_client("dashscope", self.base_url, self.api_key)
+    
     def _encode_image(self, image_path: str) -> str:
         """将图片编码为 base64"""
         with open(image_path, "rb") as f:
@@ -281,35 +281,33 @@ bbox 说明：
             prompt = "请识别这张图片中的所有文字内容，按阅读顺序输出。"
         
         try:
-            # 使用 asyncio.to_thread 避免阻塞事件循环
-            import asyncio
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.DEFAULT_SYS_PROMPT,
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{base64_image}"
+            async with services.limiter("dashscope", self.model_name).slot(services.estimate_tokens(prompt)):
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self.DEFAULT_SYS_PROMPT,
+                        },
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:{mime_type};base64,{base64_image}"
+                                    }
+                                },
+                                {
+                                    "type": "text",
+                                    "text": prompt
                                 }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=4096,
-            )
+                            ]
+                        }
+                    ],
+                    temperature=0.1,
+                    max_tokens=4096,
+                )
             
             content = response.choices[0].message.content
             
@@ -9,7 +9,8 @@
 """
 import os
 import json
-from typing import Dict
+import hashlib
+from typing import Dict, Optional
 
 # API 密钥
 API_KEY = os.environ.get("DASHSCOPE_API_KEY", "sk-547e87e8934f4737b972199090958ff2")
@@ -17,6 +18,9 @@ API_KEY = os.environ.get("DASHSCOPE_API_KEY", "sk-547e87e8934f4737b972199090958f
 # 预定义工作流存储
 predefined_workflows: Dict[str, dict] = {}
 
+# 预定义工作流文件信息: 工作流名称 -> (文件路径, 修改时间, 内容哈希)
+_workflow_files: Dict[str, tuple] = {}
+
 # 菜单绑定配置
 menu_bindings_config: dict = {}
 
@@ -40,24 +44,66 @@ def load_menu_bindings():
         print(f"[MenuBindings] 配置文件不存在: {config_path}")
 
 
+def _load_workflow_file(workflow_name: str, filepath: str):
+    """读取工作流文件，记录修改时间和内容哈希，并预编译执行计划"""
+    from api.services.workflow_engine import get_plan
+    
+    mtime = os.path.getmtime(filepath)
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+    workflow = json.loads(raw.decode('utf-8'))
+    content_hash = hashlib.sha256(raw).hexdigest()
+    
+    predefined_workflows[workflow_name] = workflow
+    _workflow_files[workflow_name] = (filepath, mtime, content_hash)
+    get_plan(workflow, workflow_name, content_hash)
+
+
 def load_predefined_workflows():
     """加载预定义工作流"""
-    global predefined_workflows
     workflow_dir = "./workflows"
     if os.path.exists(workflow_dir):
         for filename in os.listdir(workflow_dir):
             if filename.endswith('.json'):
                 filepath = os.path.join(workflow_dir, filename)
+                workflow_name = filename.replace('.json', '')
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        workflow = json.load(f)
-                        workflow_name = filename.replace('.json', '')
-                        predefined_workflows[workflow_name] = workflow
-                        print(f"[Workflow] 加载预定义工作流: {workflow_name}")
+                    _load_workflow_file(workflow_name, filepath)
+                    print(f"[Workflow] 加载预定义工作流: {workflow_name}")
                 except Exception as e:
                     print(f"[Workflow] 加载工作流失败 {filename}: {e}")
 
 
+def get_workflow_plan(workflow_name: str):
+    """获取预定义工作流的执行计划
+    
+    工作流文件修改后会重新加载并编译，否则直接返回缓存的计划。
+    
+    Args:
+        workflow_name: 工作流名称
+        
+    Returns:
+        WorkflowPlan，工作流不存在时返回 None
+    """
+    from api.services.workflow_engine import get_plan
+    
+    file_info = _workflow_files.get(workflow_name)
+    if file_info:
+        filepath, mtime, _ = file_info
+        try:
+            if os.path.getmtime(filepath) != mtime:
+                _load_workflow_file(workflow_name, filepath)
+                print(f"[Workflow] 工作流文件已变更，重新加载: {workflow_name}")
+        except Exception as e:
+            print(f"[Workflow] 重新加载工作流失败 {workflow_name}: {e}")
+    
+    workflow = predefined_workflows.get(workflow_name)
+    if workflow is None:
+        return None
+    content_hash: Optional[str] = _workflow_files.get(workflow_name, (None, None, None))[2]
+    return get_plan(workflow, workflow_name, content_hash)
+
+
 def get_all_menus():
     """获取所有菜单项（支持分组格式）"""
     all_menus = []
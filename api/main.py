@@ -24,6 +24,10 @@ async def lifespan(app: FastAPI):
     AgentManager.set_api_key(config.API_KEY)
     execution.set_predefined_workflows(config.predefined_workflows)
     
+    # 监听技能目录，SKILL.md 变化时刷新技能注册表
+    from agents.skill_registry import get_skill_registry
+    get_skill_registry().watch()
+    
     print("\n" + "="*50)
     print("API 服务启动完成")
     print(f"工作流数量: {len(config.predefined_workflows)}")
@@ -32,7 +36,12 @@ async def lifespan(app: FastAPI):
     
     yield
     
-    # 关闭时执行（如有需要）
+    # 关闭时执行
+    from api.services.workflow_jobs import workflow_jobs
+    from api.services.llm_clients import client_registry
+    await workflow_jobs.shutdown()
+    await client_registry.aclose()
+    get_skill_registry().stop()
     print("API 服务已关闭")
 
 
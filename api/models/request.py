@@ -18,6 +18,13 @@ class PredefinedWorkflowRequest(BaseModel):
     history: List[dict] = []
 
 
+class WorkflowJobRequest(BaseModel):
+    """后台工作流任务提交请求"""
+    workflow_name: str
+    input: str
+    history: List[dict] = []
+
+
 class WorkflowTestRequest(BaseModel):
     """工作流测试请求"""
     workflow: dict
@@ -13,28 +13,15 @@ from api.services.context_builder import build_context_prompt
 from agents.base import create_agent_by_skills
 from api.services.agent_manager import AgentManager
 from api.services.token_logger import log_agent_call
+from api.services.response_cache import cached_reply
 
 router = APIRouter(prefix="/api/code-assistant", tags=["代码助手"])
 
+# 代码助手使用的技能
+CODE_ASSISTANT_SKILLS = ["amis-generator"]
 
-@router.post("/stream")
-async def code_assistant_stream(request: CodeAssistantRequest):
-    """代码助手流式 API - 支持 amis 代码生成和实时预览"""
-    async def event_generator():
-        try:
-            user_input = request.message
-            history = request.history or []
-            
-            yield f"data: {json.dumps({'type': 'start', 'message': '正在分析需求...'})}\n\n"
-            
-            # 构建包含历史上下文的提示
-            context_prompt = build_context_prompt(history)
-            
-            # 创建代码生成智能体（使用环境变量配置的 provider）
-            code_agent = create_agent_by_skills(
-                name="CodeAssistant",
-                skill_names=["amis-generator"],
-                sys_prompt="""你是一个专业的 amis 低代码配置生成助手。
+# 代码助手的系统提示词
+CODE_ASSISTANT_PROMPT = """你是一个专业的 amis 低代码配置生成助手。
 你的任务是根据用户需求生成 amis JSON 配置。
 
 输出要求：
@@ -50,31 +37,57 @@ async def code_assistant_stream(request: CodeAssistantRequest):
 - page: 页面容器
 - cards: 卡片列表
 - chart: 图表
-""",
-                max_iters=30,
-            )
+"""
+
+
+@router.post("/stream")
+async def code_assistant_stream(request: CodeAssistantRequest):
+    """代码助手流式 API - 支持 amis 代码生成和实时预览"""
+    async def event_generator():
+        try:
+            user_input = request.message
+            history = request.history or []
+            
+            yield f"data: {json.dumps({'type': 'start', 'message': '正在分析需求...'})}\n\n"
+            
+            # 构建包含历史上下文的提示
+            context_prompt = build_context_prompt(history)
             
             yield f"data: {json.dumps({'type': 'thinking', 'message': '正在生成代码...'})}\n\n"
             
             full_input = context_prompt + "当前用户需求: " + user_input if context_prompt else user_input
             
-            response = await code_agent(Msg("user", full_input, "user"))
-            result = response.content if hasattr(response, "content") else str(response)
-            
-            if isinstance(result, list):
-                result = result[0].get("text", str(result[0])) if result else ""
+            async def produce():
+                # 创建代码生成智能体（使用环境变量配置的 provider），命中缓存时不创建
+                code_agent = create_agent_by_skills(
+                    name="CodeAssistant",
+                    skill_names=CODE_ASSISTANT_SKILLS,
+                    sys_prompt=CODE_ASSISTANT_PROMPT,
+                    max_iters=30,
+                )
+                response = await code_agent(Msg("user", full_input, "user"))
+                result = response.content if hasattr(response, "content") else str(response)
+                if isinstance(result, list):
+                    result = result[0].get("text", str(result[0])) if result else ""
+                return result
             
-            # 记录 Token 消耗
-            from config.settings import MODEL_PROVIDER, AIGATEWAY_MODEL, DEFAULT_MODEL
-            current_model = AIGATEWAY_MODEL if MODEL_PROVIDER == "aigateway" else DEFAULT_MODEL
-            log_agent_call(
-                agent_id="code-agent",
-                agent_name="代码助手",
-                model=current_model,
-                input_text=full_input,
-                output_text=str(result) if result else "",
+            # 相同的需求（含对话历史）直接返回缓存的回答
+            result, cached = await cached_reply(
+                "code_assistant", CODE_ASSISTANT_PROMPT, full_input, produce, skills=CODE_ASSISTANT_SKILLS
             )
             
+            # 记录 Token 消耗（命中缓存时没有调用模型）
+            if not cached:
+                from config.settings import MODEL_PROVIDER, AIGATEWAY_MODEL, DEFAULT_MODEL
+                current_model = AIGATEWAY_MODEL if MODEL_PROVIDER == "aigateway" else DEFAULT_MODEL
+                log_agent_call(
+                    agent_id="code-agent",
+                    agent_name="代码助手",
+                    model=current_model,
+                    input_text=full_input,
+                    output_text=str(result) if result else "",
+                )
+            
             # 尝试提取 JSON 代码块
             json_match = re.search(r'```json\s*([\s\S]*?)\s*```', str(result))
             if json_match:
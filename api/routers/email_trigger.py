@@ -61,23 +61,17 @@ class ManualFetchRequest(BaseModel):
 async def workflow_trigger_callback(workflow_name: str, user_input: str, email_data: dict):
     """工作流触发回调函数
     
-    当邮件匹配到工作流时，调用此函数触发工作流执行。
+    当邮件匹配到工作流时，将工作流提交到后台任务队列，不阻塞邮件轮询。
     """
-    from api.routers.execution import run_predefined_workflow_internal
+    from api.routers.execution import submit_predefined_workflow
     
     try:
-        # 调用工作流执行
-        result = await run_predefined_workflow_internal(
-            workflow_name=workflow_name,
-            user_input=user_input,
-            history_messages=[]
-        )
-        
-        print(f"[EmailTrigger] 工作流 {workflow_name} 执行完成")
-        return result
+        job = submit_predefined_workflow(workflow_name, user_input, [])
+        print(f"[EmailTrigger] 工作流 {workflow_name} 已提交，run_id: {job.run_id}")
+        return {"success": True, "workflow_name": workflow_name, "run_id": job.run_id}
         
     except Exception as e:
-        print(f"[EmailTrigger] 工作流 {workflow_name} 执行失败: {e}")
+        print(f"[EmailTrigger] 工作流 {workflow_name} 提交失败: {e}")
         raise
 
 
@@ -8,6 +8,7 @@ from agentscope.message import Msg
 from api.models.request import OCRRequest, PolicyQARequest
 from api.services.agent_manager import AgentManager
 from api.services.token_logger import log_agent_call
+from api.services.response_cache import cached_reply
 
 router = APIRouter(prefix="/api/ocr", tags=["OCR识别"])
 
@@ -50,21 +51,26 @@ async def ocr_chat(request: PolicyQARequest):
     try:
         print(f"[OCR] 收到对话: {request.question}")
         agent = AgentManager.get("ocr")
-        response = await agent(Msg("user", request.question, "user"))
-        answer = response.content if hasattr(response, "content") else str(response)
+        
+        async def produce():
+            response = await agent(Msg("user", request.question, "user"))
+            return response.content if hasattr(response, "content") else str(response)
+        
+        answer, cached = await cached_reply("ocr", agent.sys_prompt, request.question, produce, skills=agent.skills)
         
         print(f"[OCR] 响应: {answer[:100] if answer else 'empty'}...")
         
-        # 记录 Token 消耗
-        log_agent_call(
-            agent_id="ocr-agent",
-            agent_name="OCR识别",
-            model="qwen3-max",
-            input_text=request.question,
-            output_text=answer if isinstance(answer, str) else str(answer),
-        )
+        # 记录 Token 消耗（命中缓存时没有调用模型）
+        if not cached:
+            log_agent_call(
+                agent_id="ocr-agent",
+                agent_name="OCR识别",
+                model="qwen3-max",
+                input_text=request.question,
+                output_text=answer if isinstance(answer, str) else str(answer),
+            )
         
-        return {"success": True, "answer": answer}
+        return {"success": True, "answer": answer, "cached": bool(cached)}
         
     except Exception as e:
         import traceback
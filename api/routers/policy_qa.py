@@ -10,10 +10,28 @@ from agentscope.message import Msg
 from api.models.request import PolicyQARequest
 from api.services.agent_manager import AgentManager
 from api.services.token_logger import log_agent_call
+from api.services.response_cache import cached_reply
+from agents.doc_retrieval import get_doc_index
+from agents.policy_qa_agent import POLICY_DOCS_DIR
 
 router = APIRouter(prefix="/api/policy-qa", tags=["制度问答"])
 
 
+async def _ask(question: str):
+    """调用制度问答智能体，相同或相近的问题直接返回缓存的回答"""
+    agent = AgentManager.get("policy_qa")
+
+    async def produce():
+        response = await agent(Msg("user", question, "user"))
+        return response.content if hasattr(response, "content") else str(response)
+
+    # 检索索引的文档版本变化后，旧回答不再命中
+    return await cached_reply(
+        "policy_qa", agent.sys_prompt, question, produce,
+        skills=agent.skills, version=get_doc_index(POLICY_DOCS_DIR).version(),
+    )
+
+
 @router.post("")
 async def policy_qa(request: PolicyQARequest):
     """制度问答 API（流式）"""
@@ -21,20 +39,19 @@ async def policy_qa(request: PolicyQARequest):
         try:
             yield f"data: {json.dumps({'type': 'start', 'message': '正在查询制度...'})}\n\n"
             
-            agent = AgentManager.get("policy_qa")
-            response = await agent(Msg("user", request.question, "user"))
-            answer = response.content if hasattr(response, "content") else str(response)
+            answer, cached = await _ask(request.question)
             
-            # 记录 Token 消耗
-            log_agent_call(
-                agent_id="policy-qa",
-                agent_name="制度问答",
-                model="qwen3-max",
-                input_text=request.question,
-                output_text=answer if isinstance(answer, str) else str(answer),
-            )
+            # 记录 Token 消耗（命中缓存时没有调用模型）
+            if not cached:
+                log_agent_call(
+                    agent_id="policy-qa",
+                    agent_name="制度问答",
+                    model="qwen3-max",
+                    input_text=request.question,
+                    output_text=answer if isinstance(answer, str) else str(answer),
+                )
             
-            yield f"data: {json.dumps({'type': 'answer', 'content': answer})}\n\n"
+            yield f"data: {json.dumps({'type': 'answer', 'content': answer, 'cached': bool(cached)})}\n\n"
             yield f"data: {json.dumps({'type': 'done'})}\n\n"
             
         except Exception as e:
@@ -48,12 +65,8 @@ async def policy_qa_sync(request: PolicyQARequest):
     """制度问答 API（同步版本）"""
     try:
         print(f"[PolicyQA] 收到问题: {request.question}")
-        agent = AgentManager.get("policy_qa")
-        print(f"[PolicyQA] 智能体已创建: {agent.name}")
-        response = await agent(Msg("user", request.question, "user"))
-        print(f"[PolicyQA] 收到响应: {type(response)}")
-        answer = response.content if hasattr(response, "content") else str(response)
-        print(f"[PolicyQA] 原始答案类型: {type(answer)}")
+        answer, cached = await _ask(request.question)
+        print(f"[PolicyQA] 原始答案类型: {type(answer)}" + (f"（缓存: {cached}）" if cached else ""))
         
         # 如果 answer 是列表或 JSON 字符串，提取文本内容
         if isinstance(answer, list):
@@ -83,16 +96,17 @@ async def policy_qa_sync(request: PolicyQARequest):
         
         print(f"[PolicyQA] 处理后答案: {answer[:100] if answer else 'empty'}...")
         
-        # 记录 Token 消耗
-        log_agent_call(
-            agent_id="policy-qa",
-            agent_name="制度问答",
-            model="qwen3-max",
-            input_text=request.question,
-            output_text=answer if isinstance(answer, str) else str(answer),
-        )
+        # 记录 Token 消耗（命中缓存时没有调用模型）
+        if not cached:
+            log_agent_call(
+                agent_id="policy-qa",
+                agent_name="制度问答",
+                model="qwen3-max",
+                input_text=request.question,
+                output_text=answer if isinstance(answer, str) else str(answer),
+            )
         
-        return {"success": True, "answer": answer}
+        return {"success": True, "answer": answer, "cached": bool(cached)}
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -201,6 +201,13 @@ async def get_token_logs(limit: int = 100, offset: int = 0):
     }
 
 
+@router.get("/prompt-cache")
+async def get_prompt_cache_stats():
+    """获取提示词前缀复用统计（进程启动以来）"""
+    from api.services.prompt_cache import get_prefix_registry
+    return {"models": get_prefix_registry().stats()}
+
+
 @router.delete("/clear")
 async def clear_token_logs():
     """清空 Token 日志"""
@@ -6,9 +6,10 @@
 - context_builder: 上下文构建
 - classifier: 分类器服务
 - agent_manager: 智能体管理器
+- workflow_engine: 工作流执行引擎
 """
 # 延迟导入，避免循环依赖和模块加载问题
-__all__ = ['build_context_prompt', 'ClassifierService', 'AgentManager', 'EmailListener', 'EmailListenerManager']
+__all__ = ['build_context_prompt', 'ClassifierService', 'AgentManager', 'EmailListener', 'EmailListenerManager', 'WorkflowEngine', 'compile_workflow']
 
 def __getattr__(name):
     if name == 'build_context_prompt':
@@ -26,4 +27,10 @@ def __getattr__(name):
     elif name == 'EmailListenerManager':
         from .email_listener import EmailListenerManager
         return EmailListenerManager
+    elif name == 'WorkflowEngine':
+        from .workflow_engine import WorkflowEngine
+        return WorkflowEngine
+    elif name == 'compile_workflow':
+        from .workflow_engine import compile_workflow
+        return compile_workflow
     raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
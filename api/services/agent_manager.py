@@ -9,12 +9,17 @@ from typing import Dict, Any, Optional
 
 from agents.base import BaseAgent, create_agent_by_skills
 from config.settings import MODEL_PROVIDER, AIGATEWAY_API_KEY, AIGATEWAY_BASE_URL, AIGATEWAY_MODEL, ZHIPU_API_KEY, ZHIPU_BASE_URL, ZHIPU_MODEL
-from agents.simple import SimpleAgent
+from agents.lite import LiteAgent
 from agents.policy_qa_agent import PolicyQAAgent
 from agents.code_agent import CodeAgent
 from agents.pptx_agent import PPTXAgent
 from agents.ocr_agent import OCRAgent
 from agents.skill_creator_agent import SkillCreatorAgent
+from api.services.agent_services import configure_agent_services
+
+
+# 智能体使用的事件通道、连接池、限流、追踪等服务由这里注入
+configure_agent_services()
 
 
 class AgentManager:
@@ -57,6 +62,13 @@ class AgentManager:
                 "model_name": ZHIPU_MODEL,
                 "base_url": ZHIPU_BASE_URL,
             }
+        elif MODEL_PROVIDER == "mock":
+            return {
+                "provider": "mock",
+                "api_key": "",
+                "model_name": "mock",
+                "base_url": "",
+            }
         else:
             return {
                 "provider": "dashscope",
@@ -187,23 +199,25 @@ class AgentManager:
                 base_url=base_url,
             )
         elif agent_type == "router" or agent_id == "router":
-            return SimpleAgent(
+            return LiteAgent(
                 name=config.get("name", "Router"),
                 sys_prompt=config.get("systemPrompt", "你是一个智能路由助手，负责分析用户请求并提供建议。"),
                 api_key=api_key,
                 model_name=model,
                 provider=provider,
                 base_url=base_url,
+                record_replay=config.get("recordReplay", False),
             )
         elif agent_type == "analyzer":
-            # 分析型 Agent，使用 SimpleAgent（纯对话模型，不带工具）
-            return SimpleAgent(
+            # 分析型 Agent，使用 LiteAgent（单次调用模型，不带工具）
+            return LiteAgent(
                 name=config.get("name", "Analyzer"),
                 sys_prompt=config.get("systemPrompt", "你是一个内容分析助手。"),
                 api_key=api_key,
                 model_name=model,
                 provider=provider,
                 base_url=base_url,
+                record_replay=config.get("recordReplay", False),
             )
         else:
             # 自定义 Agent，使用 BaseAgent
@@ -219,6 +233,55 @@ class AgentManager:
                 base_url=base_url,
             )
     
+    @classmethod
+    def create_from_node(cls, node: dict, api_key: str = None) -> Optional[Any]:
+        """
+        根据工作流节点创建智能体实例（非单例）。
+
+        Args:
+            node: 工作流节点，类型为 agent / skill-agent / simple-agent
+            api_key: API 密钥
+
+        Returns:
+            智能体实例，节点未配置时返回 None
+        """
+        node_type = node.get("type")
+        data = node.get("data", {})
+        model_config = cls.get_model_config()
+
+        if node_type == "agent":
+            config = data.get("agentConfig", {})
+            if not config:
+                return None
+            return cls.create_from_config(config, api_key)
+        elif node_type == "simple-agent":
+            config = data.get("simpleAgentConfig", {})
+            return LiteAgent(
+                name=config.get("name", "SimpleAgent"),
+                sys_prompt=config.get("systemPrompt", ""),
+                api_key=model_config["api_key"],
+                model_name=config.get("model") or model_config["model_name"],
+                provider=model_config["provider"],
+                base_url=model_config["base_url"],
+                record_replay=config.get("recordReplay", False),
+            )
+        elif node_type == "skill-agent":
+            config = data.get("skillAgentConfig", {})
+            skills = config.get("skills", [])
+            if not skills:
+                return None
+            return create_agent_by_skills(
+                name=f"SkillAgent_{node['id']}",
+                skill_names=skills,
+                sys_prompt=config.get("systemPrompt") or None,
+                api_key=model_config["api_key"],
+                model_name=config.get("model") or model_config["model_name"],
+                max_iters=config.get("maxIters", 30),
+                provider=model_config["provider"],
+                base_url=model_config["base_url"],
+            )
+        return None
+
     @classmethod
     def clear(cls):
         """清除所有缓存的智能体实例"""
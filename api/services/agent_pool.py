@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+智能体池
+
+缓存已构建的工作流节点智能体（Toolkit、技能注册、模型客户端、钩子），
+避免每次工作流请求都重新创建。每次借出时替换为新的 InMemoryMemory，
+保证不同请求之间不共享对话记忆。
+"""
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agentscope.memory import InMemoryMemory
+
+from api.services.agent_manager import AgentManager
+from config.settings import AGENT_POOL_MAX_IDLE
+
+
+class AgentPool:
+    """智能体池
+
+    以 (节点配置哈希, 模型, 提供商) 为键保存空闲的智能体实例。
+    借出的实例归调用方独占，归还后可被后续请求复用；
+    空闲实例总数超过上限时按最近最少使用淘汰。
+    """
+
+    def __init__(self, max_idle: int = AGENT_POOL_MAX_IDLE):
+        """
+        初始化智能体池。
+
+        Args:
+            max_idle: 最多保留的空闲实例数
+        """
+        self.max_idle = max_idle
+        self._idle: "OrderedDict[Tuple[str, int], Any]" = OrderedDict()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def node_key(node: dict) -> Tuple[str, str, str]:
+        """计算节点对应的池键"""
+        model_config = AgentManager.get_model_config()
+        data = node.get("data", {})
+        config = {k: v for k, v in data.items() if k.endswith("Config")}
+        raw = json.dumps({"type": node.get("type"), "id": node.get("id"), "config": config},
+                         sort_keys=True, ensure_ascii=False)
+        config_hash = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        model = next((c.get("model") for c in config.values() if isinstance(c, dict) and c.get("model")), None)
+        return config_hash, model or model_config["model_name"], model_config["provider"]
+
+    def acquire(self, node: dict, api_key: str = None) -> Tuple[Optional[Any], bool]:
+        """
+        借出节点对应的智能体，没有空闲实例时新建。
+
+        Args:
+            node: 工作流节点
+            api_key: API 密钥
+
+        Returns:
+            (智能体实例, 是否复用了空闲实例)；节点未配置时实例为 None
+        """
+        key = self.node_key(node)
+        with self._lock:
+            slot = next((s for s in reversed(self._idle) if s[0] == key), None)
+            if slot is not None:
+                agent = self._idle.pop(slot)
+                self.hits += 1
+            else:
+                agent = None
+                self.misses += 1
+
+        if agent is None:
+            agent = AgentManager.create_from_node(node, api_key)
+            if agent is None:
+                return None, False
+            agent._pool_key = key
+            return agent, False
+
+        self.reset_memory(agent)
+        return agent, True
+
+    def release(self, agent: Any):
+        """归还智能体，超出空闲上限时淘汰最久未使用的实例"""
+        key = getattr(agent, "_pool_key", None)
+        if key is None:
+            return
+        with self._lock:
+            self._seq += 1
+            self._idle[(key, self._seq)] = agent
+            while len(self._idle) > self.max_idle:
+                self._idle.popitem(last=False)
+
+    def release_all(self, agents: List[Any]):
+        """批量归还智能体"""
+        for agent in agents:
+            self.release(agent)
+
+    def clear(self):
+        """清空所有空闲实例"""
+        with self._lock:
+            self._idle.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """池统计信息"""
+        with self._lock:
+            return {"idle": len(self._idle), "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def reset_memory(agent: Any):
+        """为复用的智能体换上新的对话记忆"""
+        inner = getattr(agent, "agent", None)
+        if inner is not None and hasattr(inner, "memory"):
+            inner.memory = InMemoryMemory()
+
+
+# 全局智能体池
+agent_pool = AgentPool()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+智能体服务注入
+
+把 Web 层的事件通道、共享 HTTP 连接池、限流器、链路追踪和模型包装器（前缀缓存、限流）
+注入 agents 包（见 agents/services.py），agents 不再反向导入 api。
+在 agent_manager 导入时调用一次。
+"""
+from agents import services
+from config.settings import LLM_RATE_LIMIT_ENABLED, PROMPT_CACHE_ENABLED
+from api.services.event_bus import current_channel
+from api.services.llm_clients import get_async_client, get_http_client
+from api.services.prompt_cache import PromptCacheModel
+from api.services.rate_limiter import RateLimitedModel, classify_error, estimate_messages_tokens, get_limiter
+from api.services.token_logger import estimate_tokens
+from api.services.tracing import start_span
+
+
+def configure_agent_services():
+    """注入智能体运行时服务（重复调用时覆盖为同样的实现）"""
+    wrappers = []
+    if PROMPT_CACHE_ENABLED:
+        wrappers.append(PromptCacheModel)
+    if LLM_RATE_LIMIT_ENABLED:
+        wrappers.append(RateLimitedModel)
+    services.configure(
+        current_channel=current_channel,
+        http_client=get_http_client,
+        async_client=get_async_client,
+        limiter=get_limiter,
+        classify_error=classify_error,
+        estimate_tokens=estimate_tokens,
+        estimate_messages_tokens=estimate_messages_tokens,
+        start_span=start_span,
+        model_wrappers=wrappers,
+    )
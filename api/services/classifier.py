@@ -4,7 +4,11 @@
 
 提供通用的 LLM 分类功能，用于工作流中的分类器节点。
 """
-from typing import List, Dict, Optional, Any
+import re
+import asyncio
+from typing import List, Dict, Optional, Any, Tuple
+
+from config.settings import CLASSIFIER_MODE, CLASSIFIER_LEARN_ENABLED
 
 
 class ClassifierService:
@@ -20,13 +24,8 @@ class ClassifierService:
         """
         self.api_key = api_key
         self.default_model = default_model
-        self._agent = None
     
-    def _get_agent(self, model: str = None):
-        """获取或创建分类智能体"""
-        from agents.base import BaseAgent
-        
-        sys_prompt = """你是一个专业的意图分类助手。你的任务是准确理解用户的真实意图，并将其归类到最合适的类别。
+    SYS_PROMPT = """你是一个专业的意图分类助手。你的任务是准确理解用户的真实意图，并将其归类到最合适的类别。
 
 分类原则：
 1. 关注用户的核心需求，而非表面用词
@@ -38,28 +37,85 @@ class ClassifierService:
 输出要求：
 - 只输出分类名称，不要输出任何解释或其他内容
 - 分类名称必须与给定选项完全一致"""
+    
+    def _get_model(self, model: str = None):
+        """获取共享的分类模型（非流式，不经过 ReAct 循环）"""
+        from agents.lite import get_model
+        return get_model(api_key=self.api_key, model_name=model or self.default_model, stream=False)
+    
+    @staticmethod
+    def category_keywords(category: Dict[str, Any]) -> Dict[str, int]:
+        """
+        获取分类的关键词及权重。
         
-        return BaseAgent(
-            name="Classifier",
-            sys_prompt=sys_prompt,
-            api_key=self.api_key,
-            model_name=model or self.default_model,
-            max_iters=1,
-        )
+        优先使用分类配置中的 keywords，否则从名称和描述中拆分：
+        按标点和空白切词（权重 2），较长的中文片段再拆成双字词（权重 1）。
+        """
+        if category.get("keywords"):
+            return {str(kw).lower(): 2 for kw in category["keywords"]}
+        
+        text = f"{category.get('name', '')} {category.get('description', '')}".lower()
+        keywords: Dict[str, int] = {}
+        for word in re.split(r"[\s,，、。;；:：/|()（）\[\]【】\"'“”‘’!?！？.]+", text):
+            if len(word) < 2:
+                continue
+            keywords[word] = 2
+            if len(word) > 4 and not word.isascii():
+                for i in range(len(word) - 1):
+                    keywords.setdefault(word[i:i + 2], 1)
+        return keywords
+    
+    @classmethod
+    def score_categories(
+        cls,
+        input_text: str,
+        categories: List[Dict[str, Any]]
+    ) -> List[Tuple[Dict[str, Any], int]]:
+        """
+        按关键词命中的权重和为分类打分（不调用 LLM），用于预测可能的分支。
+        
+        Returns:
+            (分类, 得分) 列表，按得分从高到低排序，同分保持原顺序
+        """
+        text = input_text.lower()
+        scored = [
+            (cat, sum(weight for kw, weight in cls.category_keywords(cat).items() if kw in text))
+            for cat in categories
+        ]
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+    
+    def fast_classify(
+        self,
+        input_text: str,
+        categories: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        本地快速分类（规则 + 质心模型），不调用 LLM。
+        
+        Returns:
+            {"category", "tier", "confidence"}，没有把握时返回 None
+        """
+        if not categories:
+            return None
+        from api.services.fast_classifier import get_fast_classifier
+        return get_fast_classifier().classify(input_text, categories)
     
     async def classify(
         self,
         input_text: str,
         categories: List[Dict[str, str]],
-        model: str = None
+        model: str = None,
+        mode: str = None
     ) -> Optional[Dict[str, str]]:
         """
         对输入文本进行分类。
         
         Args:
             input_text: 待分类的文本
-            categories: 分类列表，每个分类包含 id, name, description
+            categories: 分类列表，每个分类包含 id, name, description，
+                可选 keywords（关键词列表）和 patterns（正则列表）供快速通道使用
             model: 使用的模型，默认使用初始化时的模型
+            mode: "llm" 或 "tiered"，默认取 CLASSIFIER_MODE；tiered 时先尝试本地快速分类
         
         Returns:
             匹配的分类字典，如果没有匹配则返回第一个分类
@@ -67,17 +123,20 @@ class ClassifierService:
         if not categories:
             return None
         
+        if (mode or CLASSIFIER_MODE) == "tiered":
+            fast = await asyncio.to_thread(self.fast_classify, input_text, categories)
+            if fast is not None:
+                return fast["category"]
+        
         # 构建分类提示词
         category_list = "\n".join([
             f"- **{cat['name']}**: {cat.get('description', '')}" 
             for cat in categories
         ])
         
+        # 同一节点的分类和说明不变，放在用户输入之前，使请求前缀可被提供商缓存
         classify_prompt = f"""请分析用户输入的真实意图，并选择最匹配的分类。
 
-## 用户输入
-{input_text}
-
 ## 可选分类
 {category_list}
 
@@ -86,18 +145,19 @@ class ClassifierService:
 - 如果用户是在"询问/咨询/了解"某个信息或规定，选择信息咨询类
 - 如果用户是要"制作/开发/生成"某个功能或代码，选择技术开发类
 
+## 用户输入
+{input_text}
+
 请直接输出分类名称："""
         
-        # 调用 LLM 进行分类
+        # 调用 LLM 进行分类（单次调用）
         from agentscope.message import Msg
-        agent = self._get_agent(model)
-        response = await agent(Msg("user", classify_prompt, "user"))
-        result = response.content if hasattr(response, "content") else str(response)
-        
-        # 处理返回值可能是列表的情况
-        if isinstance(result, list):
-            result = result[0].get("text", str(result[0])) if result else ""
-        result = str(result).strip()
+        from agents.lite import complete
+        result = await complete(
+            [Msg("system", self.SYS_PROMPT, "system"), Msg("user", classify_prompt, "user")],
+            self._get_model(model),
+        )
+        result = result.strip()
         
         # 匹配分类
         matched_category = None
@@ -109,5 +169,12 @@ class ClassifierService:
         # 如果没有匹配，返回第一个分类作为默认
         if not matched_category and categories:
             matched_category = categories[0]
+        elif CLASSIFIER_LEARN_ENABLED:
+            # 只记录 LLM 明确给出的结果，作为本地模型的训练样本
+            try:
+                from api.services.fast_classifier import get_fast_classifier
+                await asyncio.to_thread(get_fast_classifier().learn, input_text, matched_category["id"], categories)
+            except Exception as e:
+                print(f"[Classifier] 记录训练样本失败: {e}")
         
         return matched_category
@@ -7,9 +7,10 @@ from typing import Dict, Any, List, Optional
 from pathlib import Path
 from datetime import datetime
 from difflib import SequenceMatcher
-from openai import OpenAI
 
 from api.services.passport_ocr_service import get_passport_ocr_service
+from config.settings import DASHSCOPE_COMPATIBLE_URL
+from api.services.llm_clients import get_client
 
 # 历史记录存储路径
 HISTORY_DIR = Path("/tmp/crew_compare_history")
@@ -74,11 +75,8 @@ class CrewCompareService:
         self.history: List[Dict] = []  # 操作历史记录
         self._load_history()
         
-        # 初始化LLM客户端用于智能比对
-        self.llm_client = OpenAI(
-            api_key=os.getenv("DASHSCOPE_API_KEY"),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
+        # LLM客户端用于智能比对（共享连接池）
+        self.llm_client = get_client("dashscope", DASHSCOPE_COMPATIBLE_URL, os.getenv("DASHSCOPE_API_KEY"))
         self.llm_model = "qwen-plus"  # 使用qwen-plus进行语义比对
     
     def create_session(self) -> str:
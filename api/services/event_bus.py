@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+运行级事件通道
+
+每次工作流运行（或一次 SSE 请求）创建一个 EventChannel，并通过 contextvars
+绑定到执行该运行的任务上。智能体、钩子和引擎直接调用 publish_event 发布事件，
+事件只会进入当前上下文绑定的通道，并发运行之间互不干扰，也无需替换 sys.stdout。
+
+通道内部是有界缓冲，消费者（SSE 客户端）跟不上时：
+- token 事件合并到缓冲中同一节点、同一类型尚未取走的 token 事件，每路输出最多占一个位置；
+- 超出容量的 console_log 日志会被丢弃；
+- 节点状态等控制事件始终保留，发布方（工作流引擎）在执行每个节点前调用 drain()
+  等待缓冲低于上限，由此对整个运行施加背压，缓冲不会随慢速客户端无限增长。
+"""
+import asyncio
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+from config.settings import EVENT_QUEUE_MAX_SIZE
+
+
+# 可丢弃的事件类型
+LOSSY_EVENT_TYPES = ("console_log",)
+
+
+class EventChannel:
+    """单次运行的事件通道（单消费者）"""
+
+    def __init__(self, maxsize: int = EVENT_QUEUE_MAX_SIZE, capture_logs: bool = True):
+        """
+        初始化事件通道，需在事件循环中创建。
+
+        Args:
+            maxsize: 缓冲的事件数上限
+            capture_logs: 是否接收智能体日志（emit_log 发布的 console_log）
+        """
+        self.maxsize = maxsize
+        self.capture_logs = capture_logs
+        self.dropped = 0
+        self._buffer: deque = deque()
+        self._ready = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        # (节点 ID, 类型) -> 缓冲中尚未取走的 token 事件，缓冲已满时新 token 合并到这里
+        self._tokens: Dict[Tuple[Any, Any], dict] = {}
+        self._closed = False
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+
+    def publish(self, event: dict):
+        """发布事件，可在任意线程调用"""
+        if threading.get_ident() != self._thread_id:
+            self._loop.call_soon_threadsafe(self._append, event)
+        else:
+            self._append(event)
+
+    def close(self):
+        """关闭通道，消费者取完剩余事件后结束"""
+        self._closed = True
+        self._ready.set()
+        self._writable.set()
+
+    async def drain(self):
+        """缓冲达到上限时等待消费者取走事件（通道关闭后立即返回）"""
+        while len(self._buffer) >= self.maxsize and not self._closed:
+            self._writable.clear()
+            await self._writable.wait()
+
+    async def get(self) -> Optional[dict]:
+        """取出下一个事件，通道关闭且已取空时返回 None"""
+        while not self._buffer:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        event = self._buffer.popleft()
+        if event["type"] == "token":
+            key = (event.get("nodeId"), event.get("kind"))
+            if self._tokens.get(key) is event:
+                del self._tokens[key]
+        if len(self._buffer) < self.maxsize:
+            self._writable.set()
+        return event
+
+    def _append(self, event: dict):
+        """写入缓冲（仅在事件循环线程中调用）"""
+        if self._closed:
+            return
+        full = len(self._buffer) >= self.maxsize
+        if event["type"] == "token":
+            key = (event.get("nodeId"), event.get("kind"))
+            pending = self._tokens.get(key)
+            # 上一个 token 尚未取走且紧邻（或缓冲已满）时合并，减少事件数
+            if pending is not None and (full or self._buffer[-1] is pending):
+                pending["content"] += event["content"]
+                return
+            self._tokens[key] = event
+        elif event["type"] == "token_reset":
+            # 重试时丢弃的输出不再与之后的 token 合并
+            for key in [k for k in self._tokens if k[0] == event.get("nodeId")]:
+                del self._tokens[key]
+        elif full and event["type"] in LOSSY_EVENT_TYPES:
+            self.dropped += 1
+            return
+        self._buffer.append(event)
+        self._ready.set()
+
+
+# 当前上下文绑定的事件通道
+_current_channel: ContextVar[Optional[EventChannel]] = ContextVar("event_channel", default=None)
+
+
+def current_channel() -> Optional[EventChannel]:
+    """获取当前上下文绑定的事件通道"""
+    return _current_channel.get()
+
+
+def publish_event(event_type: str, **fields: Any):
+    """向当前上下文的事件通道发布事件，未绑定通道时忽略"""
+    channel = _current_channel.get()
+    if channel is not None:
+        channel.publish({"type": event_type, **fields})
+
+
+def create_channel_task(channel: EventChannel, coro: Awaitable) -> asyncio.Task:
+    """创建绑定到事件通道的任务，任务及其派生的子任务、线程都会发布到该通道"""
+    token = _current_channel.set(channel)
+    try:
+        return asyncio.ensure_future(coro)
+    finally:
+        _current_channel.reset(token)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+快速分类通道
+
+在 LLM 分类器之前提供两级本地分类：
+1. 规则：分类配置中的 keywords / patterns（正则）命中得分足够高且领先明显时直接返回；
+2. 模型：基于字符 n-gram 哈希特征的最近质心模型，由历史 LLM 分类结果训练，
+   相似度和领先幅度都达到阈值时直接返回。
+
+两级都没有把握时返回 None，由调用方回退到 LLM。
+训练样本按分类集合（scope）保存在 SQLite 中，每个集合只保留最近的 max_examples 条，
+进程重启后重新加载。
+"""
+import os
+import re
+import json
+import math
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import CLASSIFIER_MIN_CONFIDENCE, CLASSIFIER_MIN_EXAMPLES, CLASSIFIER_MAX_EXAMPLES
+
+
+# 特征哈希维度
+FEATURE_DIM = 1 << 18
+
+# 参与特征提取的最大字符数
+MAX_FEATURE_CHARS = 2000
+
+# 规则通道：最低得分和领先第二名的最小分差（关键词 2 分，正则 3 分）
+RULE_MIN_SCORE = 4
+RULE_MIN_MARGIN = 2
+
+# 模型通道：领先第二名的最小相似度差
+MODEL_MIN_MARGIN = 0.08
+
+
+def category_scope(categories: List[Dict[str, Any]]) -> str:
+    """分类集合的标识，相同分类（id + 名称）的分类器节点共享训练样本"""
+    raw = json.dumps([[c.get("id"), c.get("name")] for c in categories], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def extract_features(text: str) -> Dict[int, float]:
+    """提取 1-3 字符 n-gram 哈希特征（对数词频，L2 归一化）"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()[:MAX_FEATURE_CHARS]
+    counts: Dict[int, int] = defaultdict(int)
+    for n in (1, 2, 3):
+        for i in range(len(text) - n + 1):
+            counts[zlib.crc32(text[i:i + n].encode("utf-8")) & (FEATURE_DIM - 1)] += 1
+    features = {k: 1 + math.log(v) for k, v in counts.items()}
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+
+class CentroidModel:
+    """最近质心分类模型（单个分类集合）"""
+
+    def __init__(self):
+        self._sums: Dict[str, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
+        self._norms: Dict[str, float] = {}
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    def add(self, category_id: str, text: str):
+        """加入一条训练样本"""
+        centroid = self._sums[category_id]
+        for k, v in extract_features(text).items():
+            centroid[k] += v
+        self.counts[category_id] += 1
+        self._norms.pop(category_id, None)
+
+    def predict(self, text: str, min_examples: int = CLASSIFIER_MIN_EXAMPLES) -> Optional[Tuple[str, float, float]]:
+        """
+        预测分类。
+
+        Returns:
+            (分类 ID, 最高相似度, 领先第二名的相似度差)；样本不足时返回 None
+        """
+        ready = [cid for cid, count in self.counts.items() if count >= min_examples]
+        if len(ready) < 2:
+            return None
+        features = extract_features(text)
+        scores = []
+        for cid in ready:
+            centroid = self._sums[cid]
+            norm = self._norms.get(cid)
+            if norm is None:
+                norm = self._norms[cid] = math.sqrt(sum(v * v for v in centroid.values())) or 1.0
+            scores.append((sum(v * centroid.get(k, 0.0) for k, v in features.items()) / norm, cid))
+        scores.sort(reverse=True)
+        return scores[0][1], scores[0][0], scores[0][0] - scores[1][0]
+
+
+class FastClassifier:
+    """规则 + 质心模型的快速分类通道"""
+
+    def __init__(self, db_path: str = None, max_examples: int = CLASSIFIER_MAX_EXAMPLES):
+        """
+        初始化快速分类通道。
+
+        Args:
+            db_path: 训练样本数据库路径
+            max_examples: 每个分类集合保留的最大样本数
+        """
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(__file__), '../../data/classifier_examples.db')
+        self.db_path = os.path.abspath(db_path)
+        self.max_examples = max_examples
+        self._models: Dict[str, CentroidModel] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._init_database()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _init_database(self):
+        """初始化数据库表"""
+        with self.get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS classifier_examples (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scope TEXT NOT NULL,
+                    category_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_classifier_scope ON classifier_examples(scope, id)')
+
+    def _get_model(self, scope: str) -> CentroidModel:
+        """获取分类集合的模型，首次使用时从数据库加载最近的样本"""
+        with self._lock:
+            model = self._models.get(scope)
+            if model is None:
+                model = self._models[scope] = CentroidModel()
+                with self.get_connection() as conn:
+                    rows = conn.execute(
+                        'SELECT category_id, text FROM classifier_examples WHERE scope = ? ORDER BY id DESC LIMIT ?',
+                        (scope, self.max_examples)
+                    ).fetchall()
+                for category_id, text in rows:
+                    model.add(category_id, text)
+            return model
+
+    def learn(self, text: str, category_id: str, categories: List[Dict[str, Any]]):
+        """记录一条 LLM 分类结果作为训练样本（会访问数据库，异步代码中应放到线程中调用）"""
+        scope = category_scope(categories)
+        model = self._get_model(scope)
+        with self._lock:
+            model.add(category_id, text)
+        with self.get_connection() as conn:
+            conn.execute(
+                'INSERT INTO classifier_examples (scope, category_id, text, created_at) VALUES (?, ?, ?, ?)',
+                (scope, category_id, text[:MAX_FEATURE_CHARS], datetime.now().isoformat())
+            )
+            # 只保留该分类集合最近的 max_examples 条样本
+            conn.execute(
+                '''DELETE FROM classifier_examples WHERE scope = ? AND id <= (
+                       SELECT id FROM classifier_examples WHERE scope = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+                   )''',
+                (scope, scope, self.max_examples)
+            )
+
+    def classify(self, text: str, categories: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        尝试本地分类。
+
+        Returns:
+            {"category": 分类, "tier": "rule"/"model", "confidence": 置信度}；没有把握时返回 None
+        """
+        by_id = {c.get("id"): c for c in categories}
+
+        rule = self._rule_scores(text, categories)
+        if rule and rule[0][1] >= RULE_MIN_SCORE and rule[0][1] - (rule[1][1] if len(rule) > 1 else 0) >= RULE_MIN_MARGIN:
+            return {"category": rule[0][0], "tier": "rule", "confidence": float(rule[0][1])}
+
+        prediction = self._get_model(category_scope(categories)).predict(text)
+        if prediction is not None:
+            category_id, similarity, margin = prediction
+            if similarity >= CLASSIFIER_MIN_CONFIDENCE and margin >= MODEL_MIN_MARGIN and category_id in by_id:
+                return {"category": by_id[category_id], "tier": "model", "confidence": round(similarity, 4)}
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各分类集合已加载的样本数"""
+        with self._lock:
+            return {scope: dict(model.counts) for scope, model in self._models.items()}
+
+    @staticmethod
+    def _rule_scores(text: str, categories: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+        """按分类配置中显式的 keywords / patterns 打分，没有任何规则时返回空列表"""
+        if not any(c.get("keywords") or c.get("patterns") for c in categories):
+            return []
+        lowered = text.lower()
+        scored = []
+        for cat in categories:
+            score = sum(2 for kw in cat.get("keywords", []) if str(kw).lower() in lowered)
+            for pattern in cat.get("patterns", []):
+                try:
+                    if re.search(pattern, text, re.IGNORECASE):
+                        score += 3
+                except re.error:
+                    print(f"[FastClassifier] 无效的正则: {pattern}")
+            scored.append((cat, score))
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+
+# 全局快速分类通道实例
+_fast_classifier: Optional[FastClassifier] = None
+
+
+def get_fast_classifier() -> FastClassifier:
+    """获取快速分类通道实例"""
+    global _fast_classifier
+    if _fast_classifier is None:
+        _fast_classifier = FastClassifier()
+    return _fast_classifier
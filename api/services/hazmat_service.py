@@ -8,12 +8,12 @@ import shutil
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple
 
-from openai import OpenAI
-
 from api.models.hazmat import (
     ProcessStatus, HazmatResult, ExtractedInfo,
     AnalyzeResponse, RuleType
 )
+from config.settings import DASHSCOPE_COMPATIBLE_URL
+from api.services.llm_clients import get_client
 from api.services.hazmat_database import (
     get_sds_repository, get_rule_repository,
     SDSFileRepository, RuleRepository
@@ -133,10 +133,7 @@ class HazmatService:
         api_key = os.environ.get('DASHSCOPE_API_KEY')
         if api_key:
             try:
-                client = OpenAI(
-                    api_key=api_key,
-                    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-                )
+                client = get_client("dashscope", DASHSCOPE_COMPATIBLE_URL, api_key)
                 self.parser.set_llm_client(client, 'qwen-plus')
                 print("[HazmatService] LLM客户端初始化成功")
             except Exception as e:
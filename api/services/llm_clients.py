@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+大模型 HTTP 客户端注册表
+
+进程内按 (提供商, base_url) 共享一个带连接池的 httpx 客户端（keep-alive，
+安装了 h2 时启用 HTTP/2），所有 OpenAI 兼容调用都复用它，避免每个服务、
+每次请求重新建立 TLS 连接。
+
+- get_async_client: 异步代码使用的 AsyncOpenAI
+- get_client: 仍是同步调用链（如 PDF 解析）使用的 OpenAI
+- get_http_client: 提供给 agentscope OpenAIChatModel 的 client_kwargs
+"""
+import asyncio
+import threading
+import importlib.util
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from config.settings import (
+    LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE, LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_TIMEOUT, LLM_HTTP2
+)
+
+
+# 是否启用 HTTP/2（需要安装 h2）
+HTTP2_ENABLED = LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def _limits() -> httpx.Limits:
+    """连接池限制"""
+    return httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class ClientRegistry:
+    """按 (提供商, base_url) 缓存的 HTTP 客户端"""
+
+    def __init__(self):
+        self._async_http: Dict[Tuple[str, str], Tuple[httpx.AsyncClient, Optional[asyncio.AbstractEventLoop]]] = {}
+        self._sync_http: Dict[Tuple[str, str], httpx.Client] = {}
+        self._async_clients: Dict[Tuple[str, str, str], AsyncOpenAI] = {}
+        self._sync_clients: Dict[Tuple[str, str, str], OpenAI] = {}
+        self._lock = threading.Lock()
+
+    def get_http_client(self, provider: str, base_url: str) -> httpx.AsyncClient:
+        """
+        获取共享的异步 httpx 客户端。
+
+        异步连接池绑定在事件循环上，若创建它的事件循环已关闭（如多次 asyncio.run），
+        会重新创建。
+        """
+        key = (provider, base_url)
+        loop = _running_loop()
+        with self._lock:
+            entry = self._async_http.get(key)
+            if entry is not None:
+                client, owner = entry
+                if owner is None or owner is loop or not owner.is_closed():
+                    if owner is None and loop is not None:
+                        self._async_http[key] = (client, loop)
+                    return client
+                # 旧事件循环已关闭，其上的 AsyncOpenAI 也一并失效
+                for client_key in [k for k in self._async_clients if k[:2] == key]:
+                    del self._async_clients[client_key]
+            client = httpx.AsyncClient(
+                limits=_limits(),
+                timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0),
+                http2=HTTP2_ENABLED,
+            )
+            self._async_http[key] = (client, loop)
+            print(f"[LLMClients] 创建连接池: {provider} {base_url} (http2={HTTP2_ENABLED})")
+            return client
+
+    def get_async_client(self, provider: str, base_url: str, api_key: str) -> AsyncOpenAI:
+        """获取共享连接池上的 AsyncOpenAI 客户端"""
+        http_client = self.get_http_client(provider, base_url)
+        key = (provider, base_url, api_key)
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                client = self._async_clients[key] = AsyncOpenAI(
+                    api_key=api_key, base_url=base_url, http_client=http_client)
+            return client
+
+    def get_client(self, provider: str, base_url: str, api_key: str) -> OpenAI:
+        """获取共享连接池上的同步 OpenAI 客户端"""
+        key = (provider, base_url, api_key)
+        with self._lock:
+            client = self._sync_clients.get(key)
+            if client is None:
+                http_client = self._sync_http.get(key[:2])
+                if http_client is None:
+                    http_client = self._sync_http[key[:2]] = httpx.Client(
+                        limits=_limits(),
+                        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0),
+                        http2=HTTP2_ENABLED,
+                    )
+                client = self._sync_clients[key] = OpenAI(
+                    api_key=api_key, base_url=base_url, http_client=http_client)
+            return client
+
+    async def aclose(self):
+        """关闭全部连接池（应用关闭时调用）"""
+        with self._lock:
+            async_http = [client for client, _ in self._async_http.values()]
+            sync_http = list(self._sync_http.values())
+            self._async_http.clear()
+            self._sync_http.clear()
+            self._async_clients.clear()
+            self._sync_clients.clear()
+        for client in async_http:
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"[LLMClients] 关闭连接池失败: {e}")
+        for client in sync_http:
+            client.close()
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """当前线程正在运行的事件循环"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+# 全局客户端注册表
+client_registry = ClientRegistry()
+
+
+def get_http_client(provider: str, base_url: str) -> httpx.AsyncClient:
+    """获取共享的异步 httpx 客户端"""
+    return client_registry.get_http_client(provider, base_url)
+
+
+def get_async_client(provider: str, base_url: str, api_key: str) -> AsyncOpenAI:
+    """获取共享连接池上的 AsyncOpenAI 客户端"""
+    return client_registry.get_async_client(provider, base_url, api_key)
+
+
+def get_client(provider: str, base_url: str, api_key: str) -> OpenAI:
+    """获取共享连接池上的同步 OpenAI 客户端"""
+    return client_registry.get_client(provider, base_url, api_key)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+工作流节点结果缓存
+
+为确定性节点（工具节点、分类器节点）提供按需开启的结果缓存。
+在工作流 JSON 的节点 data 中配置 ``"cache": {"ttl": 600}`` 即可开启，
+缓存键为 (节点 ID, 节点配置哈希, 归一化输入)，过期或超出容量时按 LRU 淘汰。
+"""
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import NODE_CACHE_MAX_ENTRIES
+
+
+# 未配置 ttl 时的默认过期时间（秒）
+DEFAULT_CACHE_TTL = 600
+
+
+def get_cache_ttl(node: dict) -> Optional[float]:
+    """
+    读取节点的缓存配置。
+
+    Returns:
+        过期时间（秒），未开启缓存时返回 None
+    """
+    cache_config = node.get("data", {}).get("cache")
+    if not cache_config:
+        return None
+    if isinstance(cache_config, dict):
+        return float(cache_config.get("ttl", DEFAULT_CACHE_TTL))
+    return float(DEFAULT_CACHE_TTL)
+
+
+def normalize_input(value: Any) -> str:
+    """归一化节点输入：序列化并合并连续空白"""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return re.sub(r"\s+", " ", value).strip()
+
+
+class NodeResultCache:
+    """带 TTL 的 LRU 节点结果缓存"""
+
+    def __init__(self, max_entries: int = NODE_CACHE_MAX_ENTRIES):
+        """
+        初始化缓存。
+
+        Args:
+            max_entries: 最大缓存条目数
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(node: dict, node_input: Any) -> str:
+        """计算缓存键"""
+        data = {k: v for k, v in node.get("data", {}).items() if k != "label"}
+        config_raw = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        config_hash = hashlib.sha256(config_raw.encode("utf-8")).hexdigest()
+        raw = f"{node.get('id')}\n{config_hash}\n{normalize_input(node_input)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        查询缓存。
+
+        Returns:
+            (是否命中, 缓存值)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: str, value: Any, ttl: float):
+        """写入缓存"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计信息"""
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 全局节点结果缓存
+node_cache = NodeResultCache()
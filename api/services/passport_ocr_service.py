@@ -6,8 +6,10 @@ import json
 import re
 from typing import Dict, Any, Optional
 from pathlib import Path
-from openai import OpenAI
-from config.settings import DASHSCOPE_API_KEY
+from config.settings import DASHSCOPE_API_KEY, DASHSCOPE_COMPATIBLE_URL
+from api.services.llm_clients import get_async_client
+from api.services.rate_limiter import get_limiter
+from api.services.token_logger import estimate_tokens
 
 
 class PassportOCRService:
@@ -64,7 +66,7 @@ class PassportOCRService:
         self,
         api_key: str = "",
         model_name: str = "qwen-vl-max-latest",
-        base_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        base_url: str = DASHSCOPE_COMPATIBLE_URL,
     ):
         self.api_key = api_key if api_key else DASHSCOPE_API_KEY
         if not self.api_key:
@@ -72,13 +74,13 @@ class PassportOCRService:
         self.model_name = model_name
         self.base_url = base_url
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
-        
         print(f"[PassportOCR] 初始化完成: model={self.model_name}")
     
+    @property
+    def client(self):
+        """共享连接池上的异步客户端"""
+        return get_async_client("dashscope", self.base_url, self.api_key)
+    
     def _encode_image(self, image_path: str) -> str:
         """将图片编码为 base64"""
         with open(image_path, "rb") as f:
@@ -116,30 +118,29 @@ class PassportOCRService:
         mime_type = self._get_mime_type(image_path)
         
         try:
-            import asyncio
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{base64_image}"
+            async with get_limiter("dashscope", self.model_name).slot(estimate_tokens(self.PASSPORT_PROMPT)):
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:{mime_type};base64,{base64_image}"
+                                    }
+                                },
+                                {
+                                    "type": "text",
+                                    "text": self.PASSPORT_PROMPT
                                 }
-                            },
-                            {
-                                "type": "text",
-                                "text": self.PASSPORT_PROMPT
-                            }
-                        ]
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=2048,
-            )
+                            ]
+                        }
+                    ],
+                    temperature=0.1,
+                    max_tokens=2048,
+                )
             
             content = response.choices[0].message.content
             result = self._parse_response(content)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+提示词前缀缓存
+
+技能智能体每次请求都会重复发送相同的长系统提示词（含 SKILL.md 技能说明）和工具定义。
+DashScope / OpenAI 兼容接口会缓存相同的请求前缀，只要前缀逐字节不变，
+后续请求就不必重新计算这部分输入（prefill）。
+
+1. PromptCacheModel 包装 create_model 返回的模型，请求按 "开头的系统消息 + 工具定义在前，
+   每次请求变化的内容（检索片段、对话历史、用户输入）在后" 的布局发送：系统提示词由智能体
+   固定生成，动态内容以 user 消息追加在其后；工具定义按函数名排序后发送，工具注册顺序
+   不同（如技能组激活顺序不同）的智能体也发送逐字节相同的工具前缀；
+2. 计算稳定前缀的哈希并记录到前缀注册表，用于统计前缀复用率；
+3. 对 PROMPT_CACHE_HINTS 中列出的提供商，在最后一条开头系统消息上加显式缓存标记
+   （cache_control），前缀不足 PROMPT_CACHE_MIN_TOKENS 时不加。
+"""
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agentscope.model import ChatModelBase
+
+from config.settings import PROMPT_CACHE_HINTS, PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_TTL
+from api.services.token_logger import estimate_tokens
+
+
+# 发送显式缓存标记的提供商
+HINT_PROVIDERS = {p.strip() for p in PROMPT_CACHE_HINTS.split(",") if p.strip()}
+
+# 注册表最多保留的前缀数
+MAX_PREFIXES = 10000
+
+
+def _text(content: Any) -> str:
+    """消息内容中的文本"""
+    if isinstance(content, list):
+        return "".join(str(block.get("text", "")) for block in content if isinstance(block, dict))
+    return str(content or "")
+
+
+def prefix_length(messages: List[Dict[str, Any]]) -> int:
+    """开头连续的系统消息条数（稳定前缀）"""
+    count = 0
+    for message in messages:
+        if not isinstance(message, dict) or message.get("role") != "system":
+            break
+        count += 1
+    return count
+
+
+def prefix_hash(messages: List[Dict[str, Any]], tools: Optional[List[dict]] = None) -> Tuple[str, int]:
+    """
+    计算稳定前缀的哈希。
+
+    Returns:
+        (哈希, 估算的前缀 token 数)；没有系统消息和工具时哈希为空字符串
+    """
+    system = [_text(m.get("content")) for m in messages[:prefix_length(messages)]]
+    if not system and not tools:
+        return "", 0
+    raw = json.dumps({"system": system, "tools": tools or []}, ensure_ascii=False, sort_keys=True)
+    tokens = sum(estimate_tokens(text) for text in system)
+    if tools:
+        tokens += estimate_tokens(json.dumps(tools, ensure_ascii=False))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16], tokens
+
+
+def stable_tools(tools: Optional[List[dict]]) -> Optional[List[dict]]:
+    """按函数名排序工具定义（排序稳定，同名工具保持原顺序），不修改原列表"""
+    if not tools:
+        return tools
+    return sorted(tools, key=lambda tool: str((tool.get("function") or {}).get("name", ""))
+                  if isinstance(tool, dict) else "")
+
+
+def add_cache_hints(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """在最后一条开头系统消息上加显式缓存标记，返回新的消息列表（不修改原列表）"""
+    count = prefix_length(messages)
+    if not count:
+        return messages
+    marked = dict(messages[count - 1])
+    content = marked.get("content")
+    if isinstance(content, list):
+        blocks = [dict(block) if isinstance(block, dict) else block for block in content]
+        for block in reversed(blocks):
+            if isinstance(block, dict) and "text" in block:
+                block["cache_control"] = {"type": "ephemeral"}
+                break
+        marked["content"] = blocks
+    else:
+        marked["content"] = [{"type": "text", "text": str(content or ""), "cache_control": {"type": "ephemeral"}}]
+    return messages[:count - 1] + [marked] + messages[count:]
+
+
+class PrefixRegistry:
+    """最近出现过的前缀哈希，按 (提供商, 模型) 统计复用率"""
+
+    def __init__(self, ttl: float = PROMPT_CACHE_TTL, max_prefixes: int = MAX_PREFIXES):
+        """
+        初始化前缀注册表。
+
+        Args:
+            ttl: 前缀在提供商侧缓存的大致时长（秒），超过后再次出现记为未命中
+            max_prefixes: 最多保留的前缀数
+        """
+        self.ttl = ttl
+        self.max_prefixes = max_prefixes
+        self._seen: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model_name: str, digest: str, tokens: int) -> bool:
+        """记录一次请求的前缀，返回该前缀是否在 TTL 内出现过"""
+        key = (provider, model_name, digest)
+        now = time.monotonic()
+        with self._lock:
+            last = self._seen.pop(key, None)
+            hit = last is not None and now - last < self.ttl
+            self._seen[key] = now
+            while len(self._seen) > self.max_prefixes:
+                self._seen.popitem(last=False)
+            stats = self._stats.setdefault(
+                (provider, model_name),
+                {"requests": 0, "hits": 0, "prefix_tokens": 0, "reused_tokens": 0},
+            )
+            stats["requests"] += 1
+            stats["prefix_tokens"] += tokens
+            if hit:
+                stats["hits"] += 1
+                stats["reused_tokens"] += tokens
+        return hit
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各 (提供商, 模型) 的前缀复用统计"""
+        with self._lock:
+            return {
+                f"{provider}/{model_name}": {
+                    **stats,
+                    "hit_rate": round(stats["hits"] / stats["requests"], 4) if stats["requests"] else 0.0,
+                }
+                for (provider, model_name), stats in self._stats.items()
+            }
+
+    def clear(self):
+        """清空注册表"""
+        with self._lock:
+            self._seen.clear()
+            self._stats.clear()
+
+
+# 全局前缀注册表实例
+_prefix_registry: Optional[PrefixRegistry] = None
+
+
+def get_prefix_registry() -> PrefixRegistry:
+    """获取前缀注册表实例"""
+    global _prefix_registry
+    if _prefix_registry is None:
+        _prefix_registry = PrefixRegistry()
+    return _prefix_registry
+
+
+class PromptCacheModel(ChatModelBase):
+    """记录请求前缀并按提供商加缓存标记，其他属性透传给原模型"""
+
+    def __init__(self, model: ChatModelBase, provider: str):
+        """
+        包装模型。
+
+        Args:
+            model: 原模型实例
+            provider: 模型提供商
+        """
+        super().__init__(model.model_name, model.stream)
+        self.model = model
+        self.provider = provider
+
+    def __getattr__(self, name: str) -> Any:
+        if "model" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.__dict__["model"], name)
+
+    async def __call__(self, messages: Any, *args: Any, **kwargs: Any) -> Any:
+        """固定工具顺序、记录前缀后调用模型"""
+        if "tools" in kwargs:
+            kwargs["tools"] = stable_tools(kwargs["tools"])
+        elif args:
+            args = (stable_tools(args[0]),) + args[1:]
+        if isinstance(messages, list):
+            tools = kwargs.get("tools", args[0] if args else None)
+            digest, tokens = prefix_hash(messages, tools)
+            if digest:
+                get_prefix_registry().record(self.provider, self.model_name, digest, tokens)
+                if self.provider in HINT_PROVIDERS and tokens >= PROMPT_CACHE_MIN_TOKENS:
+                    messages = add_cache_hints(messages)
+        return await self.model(messages, *args, **kwargs)
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+大模型调用限流
+
+按 (提供商, 模型) 维护一个限流器：
+1. 令牌桶：每分钟请求数（RPM）和每分钟 token 数（TPM）预算，超出时排队等待；
+2. AIMD 并发控制：遇到 429 / 5xx 时并发上限减半，请求成功时缓慢增加，
+   使吞吐量贴近提供商的实际上限，而不是反复触发限流错误。
+
+create_model 返回的模型会被 RateLimitedModel 包装，OCR 等直接使用 OpenAI 客户端的
+服务通过 get_limiter(...).slot() 共享同一个限流器。
+"""
+import re
+import json
+import time
+import asyncio
+import weakref
+import threading
+from collections import deque
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from agentscope.model import ChatModelBase
+
+from config.settings import (
+    LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_CONCURRENCY_INITIAL, LLM_CONCURRENCY_MIN,
+    LLM_CONCURRENCY_MAX, LLM_RATE_LIMITS
+)
+from api.services.token_logger import estimate_tokens
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """
+    判断异常是否来自提供商限流或服务端错误。
+
+    Returns:
+        "throttle"（429/限流）、"server"（5xx/超时），其他异常返回 None
+    """
+    if isinstance(error, asyncio.CancelledError):
+        return None
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    text = str(error)
+    if not isinstance(status, int):
+        # DashScope 的错误只包含在消息文本中
+        match = re.search(r"status_code[\"']?\s*[:=]\s*(\d{3})", text)
+        status = int(match.group(1)) if match else None
+    lowered = text.lower()
+    if status == 429 or "throttl" in lowered or "rate limit" in lowered:
+        return "throttle"
+    if (status is not None and 500 <= status < 600) or isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return "server"
+    return None
+
+
+class TokenBucket:
+    """令牌桶，预算按分钟计，可在多个事件循环和线程间共享"""
+
+    def __init__(self, per_minute: float):
+        """
+        初始化令牌桶。
+
+        Args:
+            per_minute: 每分钟补充的令牌数，桶容量同为一分钟的预算
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """预扣令牌（余额可以为负），返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """按实际用量修正余额（amount 为负时退还）"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AIMDController:
+    """加性增、乘性减的并发控制器"""
+
+    def __init__(self, initial: int, minimum: int, maximum: int, backoff: float = 0.5):
+        """
+        初始化并发控制器。
+
+        Args:
+            initial: 初始并发上限
+            minimum: 最小并发上限
+            maximum: 最大并发上限
+            backoff: 限流时上限的缩减比例
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        self.throttled = 0
+        self._last_backoff = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> float:
+        """
+        占用一个并发名额，超过上限时排队。
+
+        Returns:
+            获得名额的时间，归还时传给 release
+        """
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                return time.monotonic()
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    waiter = None
+            # 已分配名额但任务被取消时归还
+            if waiter is not None and waiter.done() and not waiter.cancelled():
+                self.release(None)
+            raise
+        return time.monotonic()
+
+    def release(self, outcome: Optional[str] = "success", started: float = None):
+        """
+        归还名额并根据结果调整上限。
+
+        Args:
+            outcome: "success" 增加上限，"throttle" / "server" 减小上限，None 不调整
+            started: acquire 返回的时间；上次减半之前发出的请求失败时不再重复减半
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome in ("throttle", "server"):
+                self.throttled += 1
+                if started is None or started >= self._last_backoff:
+                    self._last_backoff = time.monotonic()
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+            self._wake()
+
+    def _wake(self):
+        """按当前上限唤醒排队的请求（持有锁时调用）"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+
+    def _grant(self, waiter: asyncio.Future):
+        """在等待者所在的事件循环中交付名额"""
+        if waiter.cancelled():
+            self.release(None)
+        elif not waiter.done():
+            waiter.set_result(None)
+
+
+class ProviderLimiter:
+    """单个 (提供商, 模型) 的限流器"""
+
+    def __init__(self, key: str, rpm: float = 0, tpm: float = 0,
+                 initial: int = LLM_CONCURRENCY_INITIAL, minimum: int = LLM_CONCURRENCY_MIN,
+                 maximum: int = LLM_CONCURRENCY_MAX):
+        """
+        初始化限流器。
+
+        Args:
+            key: 限流器标识（提供商/模型）
+            rpm: 每分钟请求数预算，0 表示不限制
+            tpm: 每分钟 token 预算，0 表示不限制
+            initial: 初始并发上限
+            minimum: 最小并发上限
+            maximum: 最大并发上限
+        """
+        self.key = key
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = AIMDController(initial, minimum, maximum)
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """等待 RPM / TPM 预算和并发名额，返回值传给 release"""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            if self.requests is not None:
+                self.requests.adjust(-1)
+            if self.tokens is not None and tokens:
+                self.tokens.adjust(-tokens)
+            raise
+        return await self.concurrency.acquire()
+
+    def release(self, outcome: Optional[str] = "success", started: float = None):
+        """归还并发名额"""
+        self.concurrency.release(outcome, started)
+
+    def record_usage(self, reserved: int, actual: int):
+        """按实际 token 用量修正 TPM 预算"""
+        if self.tokens is not None and actual:
+            self.tokens.adjust(actual - reserved)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """在 with 块内占用一次调用的预算和并发名额，异常时按类型调整并发上限"""
+        started = await self.acquire(tokens)
+        outcome = "success"
+        try:
+            yield self
+        except BaseException as e:
+            outcome = classify_error(e)
+            raise
+        finally:
+            self.release(outcome, started)
+
+    def stats(self) -> Dict[str, Any]:
+        """当前状态"""
+        return {
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "queued": len(self.concurrency._waiters),
+            "throttled": self.concurrency.throttled,
+        }
+
+
+# 全局限流器
+_limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _overrides() -> Dict[str, Dict[str, Any]]:
+    """LLM_RATE_LIMITS 中按 "提供商/模型" 或 "提供商" 配置的预算"""
+    if not LLM_RATE_LIMITS:
+        return {}
+    try:
+        return json.loads(LLM_RATE_LIMITS)
+    except json.JSONDecodeError as e:
+        print(f"[RateLimiter] LLM_RATE_LIMITS 格式错误: {e}")
+        return {}
+
+
+def get_limiter(provider: str, model_name: str = "") -> ProviderLimiter:
+    """获取 (提供商, 模型) 的共享限流器"""
+    key = (provider or "", model_name or "")
+    limiter = _limiters.get(key)
+    if limiter is not None:
+        return limiter
+    with _limiters_lock:
+        if key not in _limiters:
+            overrides = _overrides()
+            config = overrides.get(f"{key[0]}/{key[1]}") or overrides.get(key[0]) or {}
+            _limiters[key] = ProviderLimiter(
+                f"{key[0]}/{key[1]}",
+                rpm=config.get("rpm", LLM_RPM_LIMIT),
+                tpm=config.get("tpm", LLM_TPM_LIMIT),
+                initial=config.get("concurrency", LLM_CONCURRENCY_INITIAL),
+                minimum=config.get("min_concurrency", LLM_CONCURRENCY_MIN),
+                maximum=config.get("max_concurrency", LLM_CONCURRENCY_MAX),
+            )
+        return _limiters[key]
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """全部限流器的状态"""
+    return {limiter.key: limiter.stats() for limiter in list(_limiters.values())}
+
+
+def estimate_messages_tokens(messages: Any) -> int:
+    """估算格式化后消息列表的输入 token 数"""
+    total = 0
+    for message in messages or []:
+        content = message.get("content", "") if isinstance(message, dict) else getattr(message, "content", "")
+        if isinstance(content, list):
+            content = "".join(str(block.get("text", "")) for block in content if isinstance(block, dict))
+        total += estimate_tokens(str(content or ""))
+    return total
+
+
+def _release_once(limiter: "ProviderLimiter", started: float) -> Callable[[Optional[str]], None]:
+    """只归还一次名额的回调（流式响应的 finally 和回收终结器都可能调用）"""
+    lock = threading.Lock()
+    released = False
+
+    def release(outcome: Optional[str]):
+        nonlocal released
+        with lock:
+            if released:
+                return
+            released = True
+        limiter.release(outcome, started)
+
+    return release
+
+
+class RateLimitedModel(ChatModelBase):
+    """为 agentscope 模型加上限流，其他属性透传给原模型"""
+
+    def __init__(self, model: ChatModelBase, provider: str):
+        """
+        包装模型。
+
+        Args:
+            model: 原模型实例
+            provider: 模型提供商
+        """
+        super().__init__(model.model_name, model.stream)
+        self.model = model
+        self.limiter = get_limiter(provider, model.model_name)
+
+    def __getattr__(self, name: str) -> Any:
+        if "model" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.__dict__["model"], name)
+
+    async def __call__(self, messages: Any, *args: Any, **kwargs: Any) -> Any:
+        """在限流器的预算内调用模型，流式响应在读取完毕后才归还名额"""
+        reserved = estimate_messages_tokens(messages)
+        started = await self.limiter.acquire(reserved)
+        try:
+            response = await self.model(messages, *args, **kwargs)
+        except BaseException as e:
+            self.limiter.release(classify_error(e), started)
+            raise
+        if isinstance(response, AsyncGenerator):
+            release = _release_once(self.limiter, started)
+            stream = self._stream(response, reserved, release)
+            # 调用方未开始迭代就丢弃流式响应时生成器的 finally 不会执行，由终结器归还名额（不调整上限）
+            weakref.finalize(stream, release, None)
+            return stream
+        self.limiter.release("success", started)
+        self._record_usage(response, reserved)
+        return response
+
+    async def _stream(self, response: AsyncGenerator, reserved: int,
+                      release: Callable[[Optional[str]], None]) -> AsyncGenerator:
+        """透传流式响应"""
+        outcome = "success"
+        last = None
+        try:
+            async for chunk in response:
+                last = chunk
+                yield chunk
+        except BaseException as e:
+            outcome = classify_error(e)
+            raise
+        finally:
+            release(outcome)
+            self._record_usage(last, reserved)
+
+    def _record_usage(self, response: Any, reserved: int):
+        """按响应中的实际用量修正 TPM 预算"""
+        usage = getattr(response, "usage", None) if response is not None else None
+        if usage is not None:
+            self.limiter.record_usage(reserved, usage.input_tokens + usage.output_tokens)
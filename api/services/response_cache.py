@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+响应缓存
+
+制度问答、代码助手等对话接口经常收到相同或几乎相同的问题。在调用智能体前先查缓存：
+1. 精确匹配：(智能体, 系统提示词和技能文件版本的哈希, 规范化后的问题) 相同时直接返回；
+2. 近似匹配（可选）：问题字符 3-gram 的 MinHash 签名估算的 Jaccard 相似度
+   达到阈值、且两个问题中的数字完全相同时返回（"年假5天" 与 "年假15天" 不互相命中），
+   候选项通过 LSH 分桶索引查找，不扫描全表。
+
+缓存保存在 SQLite 中，条目按 TTL 过期，超过条目数或容量上限时按最近使用时间淘汰。
+是否启用由 config/agents.yaml 的 response_cache 段按智能体配置。
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import zlib
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from agents.skill_registry import get_skill_registry
+from config.settings import (
+    AGENTS_CONFIG, RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_MB
+)
+
+
+# MinHash 签名长度与 LSH 分桶（BANDS * ROWS == NUM_PERM）
+NUM_PERM = 64
+BANDS = 16
+ROWS = 4
+
+# MinHash 使用的梅森素数和各哈希函数的参数（固定种子，保证重启后签名一致）
+_PRIME = (1 << 61) - 1
+_PERMS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], "big") % (_PRIME - 1) + 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], "big") % _PRIME)
+    for i in range(NUM_PERM)
+]
+
+
+def normalize_question(text: str) -> str:
+    """规范化问题：全半角统一、小写、合并空白、去掉结尾标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?？。.!！~～ ")
+
+
+def minhash(text: str) -> List[int]:
+    """字符 3-gram 的 MinHash 签名"""
+    shingles = {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def numbers(text: str) -> List[str]:
+    """问题中按出现顺序的数字（近似匹配要求完全相同）"""
+    return re.findall(r"\d+(?:\.\d+)?", text)
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """由两个签名估算的 Jaccard 相似度"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def _bands(scope: str, signature: List[int]) -> List[str]:
+    """签名的 LSH 分桶标识（包含作用域，不同智能体或提示词互不匹配）"""
+    return [
+        f"{scope}:{i}:" + hashlib.md5(json.dumps(signature[i * ROWS:(i + 1) * ROWS]).encode()).hexdigest()[:12]
+        for i in range(BANDS)
+    ]
+
+
+class ResponseCache:
+    """对话响应缓存"""
+
+    def __init__(self, db_path: str = None, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = int(RESPONSE_CACHE_MAX_MB * 1024 * 1024)):
+        """
+        初始化响应缓存。
+
+        Args:
+            db_path: 数据库路径
+            max_entries: 最大条目数
+            max_bytes: 缓存回复的总容量上限（字节）
+        """
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(__file__), '../../data/response_cache.db')
+        self.db_path = os.path.abspath(db_path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._init_database()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _init_database(self):
+        """初始化数据库表"""
+        with self.get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    signature TEXT,
+                    size INTEGER NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache_bands (
+                    band TEXT NOT NULL,
+                    key TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_used ON response_cache(last_used)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache(expires_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_scope ON response_cache(scope)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_response_bands_band ON response_cache_bands(band)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_response_bands_key ON response_cache_bands(key)')
+
+    @staticmethod
+    def scope(agent_id: str, sys_prompt: str, version: str = "") -> str:
+        """缓存作用域：智能体 + 系统提示词和版本的哈希，任一变化后旧回答不再命中"""
+        digest = hashlib.sha256(f"{sys_prompt or ''}\n{version}".encode("utf-8")).hexdigest()[:16]
+        return f"{agent_id}:{digest}"
+
+    def get(self, agent_id: str, sys_prompt: str, question: str, semantic: bool = False,
+            threshold: float = RESPONSE_CACHE_SIMILARITY, version: str = "") -> Optional[Dict[str, Any]]:
+        """
+        查找缓存的回答。
+
+        Args:
+            version: 回答所依赖文件的版本（见 skill_version），变化后旧回答不再命中
+
+        Returns:
+            {"response": 回答, "tier": "exact"/"semantic", "similarity": 相似度}；未命中返回 None
+        """
+        scope = self.scope(agent_id, sys_prompt, version)
+        normalized = normalize_question(question)
+        key = hashlib.sha256(f"{scope}\n{normalized}".encode("utf-8")).hexdigest()
+        now = time.time()
+        with self.get_connection() as conn:
+            row = conn.execute(
+                'SELECT key, response FROM response_cache WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            tier, score = "exact", 1.0
+            if row is None and semantic:
+                row, score = self._nearest(conn, scope, normalized, threshold, now)
+                tier = "semantic"
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            conn.execute(
+                'UPDATE response_cache SET hits = hits + 1, last_used = ? WHERE key = ?', (now, row["key"])
+            )
+        with self._lock:
+            self.hits[tier] += 1
+        return {"response": json.loads(row["response"]), "tier": tier, "similarity": round(score, 4)}
+
+    def _nearest(self, conn: sqlite3.Connection, scope: str, normalized: str,
+                 threshold: float, now: float) -> Tuple[Optional[sqlite3.Row], float]:
+        """在 LSH 候选项中查找数字相同、相似度最高且达到阈值的条目"""
+        signature = minhash(normalized)
+        digits = numbers(normalized)
+        bands = _bands(scope, signature)
+        rows = conn.execute(
+            f'''SELECT DISTINCT c.key, c.question, c.response, c.signature FROM response_cache_bands b
+                JOIN response_cache c ON c.key = b.key
+                WHERE b.band IN ({",".join("?" * len(bands))}) AND c.expires_at > ?''',
+            (*bands, now)
+        ).fetchall()
+        best, best_score = None, 0.0
+        for row in rows:
+            if numbers(normalize_question(row["question"])) != digits:
+                continue
+            score = similarity(signature, json.loads(row["signature"]))
+            if score >= threshold and score > best_score:
+                best, best_score = row, score
+        return best, best_score
+
+    def put(self, agent_id: str, sys_prompt: str, question: str, response: Any,
+            ttl: float = RESPONSE_CACHE_TTL, version: str = ""):
+        """缓存一条回答"""
+        scope = self.scope(agent_id, sys_prompt, version)
+        normalized = normalize_question(question)
+        key = hashlib.sha256(f"{scope}\n{normalized}".encode("utf-8")).hexdigest()
+        signature = minhash(normalized)
+        payload = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self.get_connection() as conn:
+            conn.execute('DELETE FROM response_cache_bands WHERE key = ?', (key,))
+            conn.execute(
+                '''INSERT OR REPLACE INTO response_cache
+                   (key, scope, question, response, signature, size, hits, created_at, expires_at, last_used)
+                   VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)''',
+                (key, scope, question[:2000], payload, json.dumps(signature), len(payload.encode("utf-8")),
+                 now, now + ttl, now)
+            )
+            conn.executemany(
+                'INSERT INTO response_cache_bands (band, key) VALUES (?, ?)',
+                [(band, key) for band in _bands(scope, signature)]
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，超过条目数或容量上限时按最近使用时间淘汰"""
+        expired = [row["key"] for row in conn.execute(
+            'SELECT key FROM response_cache WHERE expires_at <= ?', (now,)
+        ).fetchall()]
+        count, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache WHERE expires_at > ?', (now,)
+        ).fetchone()
+        victims = list(expired)
+        if count > self.max_entries or total > self.max_bytes:
+            for row in conn.execute(
+                'SELECT key, size FROM response_cache WHERE expires_at > ? ORDER BY last_used', (now,)
+            ):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                victims.append(row["key"])
+                count -= 1
+                total -= row["size"]
+        for i in range(0, len(victims), 500):
+            batch = victims[i:i + 500]
+            marks = ",".join("?" * len(batch))
+            conn.execute(f'DELETE FROM response_cache WHERE key IN ({marks})', batch)
+            conn.execute(f'DELETE FROM response_cache_bands WHERE key IN ({marks})', batch)
+
+    def clear(self, agent_id: Optional[str] = None) -> int:
+        """清空缓存（可按智能体），返回删除的条目数"""
+        with self.get_connection() as conn:
+            if agent_id is None:
+                deleted = conn.execute('DELETE FROM response_cache').rowcount
+                conn.execute('DELETE FROM response_cache_bands')
+            else:
+                keys = [row["key"] for row in conn.execute(
+                    'SELECT key FROM response_cache WHERE scope LIKE ?', (f"{agent_id}:%",)
+                ).fetchall()]
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i + 500]
+                    marks = ",".join("?" * len(batch))
+                    conn.execute(f'DELETE FROM response_cache WHERE key IN ({marks})', batch)
+                    conn.execute(f'DELETE FROM response_cache_bands WHERE key IN ({marks})', batch)
+                deleted = len(keys)
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存条目数、容量和进程启动以来的命中情况"""
+        with self.get_connection() as conn:
+            count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache').fetchone()
+        with self._lock:
+            return {"entries": count, "bytes": total, "hits": dict(self.hits), "misses": self.misses}
+
+
+# 全局响应缓存实例
+_response_cache: Optional[ResponseCache] = None
+
+# agents.yaml 中 response_cache 段的缓存：(修改时间, 配置)
+_config_cache: Tuple[Optional[float], Dict[str, Any]] = (None, {})
+
+
+def get_response_cache() -> ResponseCache:
+    """获取响应缓存实例"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+
+def cache_config(agent_id: str) -> Optional[Dict[str, Any]]:
+    """智能体的响应缓存配置（agents.yaml 的 response_cache 段），未开启时返回 None"""
+    global _config_cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    try:
+        mtime = os.path.getmtime(AGENTS_CONFIG)
+    except OSError:
+        return None
+    if _config_cache[0] != mtime:
+        try:
+            with open(AGENTS_CONFIG, "r", encoding="utf-8") as f:
+                section = (yaml.safe_load(f) or {}).get("response_cache") or {}
+        except Exception as e:
+            print(f"[ResponseCache] 读取 agents.yaml 失败: {e}")
+            section = {}
+        _config_cache = (mtime, section)
+    config = _config_cache[1].get(agent_id)
+    if not isinstance(config, dict) or not config.get("enabled", False):
+        return None
+    return config
+
+
+def skill_version(skills: List[str]) -> str:
+    """技能目录内容版本的组合摘要（由技能注册表缓存，任一文件增删改后变化）"""
+    registry = get_skill_registry()
+    versions = "\n".join(registry.version(skill) for skill in skills or [])
+    return hashlib.sha256(versions.encode("utf-8")).hexdigest()[:16]
+
+
+async def cached_reply(agent_id: str, sys_prompt: str, question: str,
+                       produce: Callable[[], Awaitable[Any]], skills: Optional[List[str]] = None,
+                       version: str = "") -> Tuple[Any, Optional[str]]:
+    """
+    先查缓存，未命中时调用 produce 生成回答并写入缓存。
+
+    Args:
+        agent_id: 智能体标识（agents.yaml response_cache 段的键）
+        sys_prompt: 智能体的系统提示词
+        question: 用户问题
+        produce: 生成回答的协程函数，返回值需可 JSON 序列化；未命中时才调用，
+            智能体应在其中创建，命中缓存时不必构建智能体
+        skills: 智能体使用的技能（名称或路径），技能文件变化后旧回答不再命中
+        version: 其他依赖数据的版本（如检索索引的签名）
+
+    Returns:
+        (回答, 命中方式 "exact"/"semantic"；未命中或未开启缓存时为 None)
+    """
+    config = cache_config(agent_id)
+    if config is None:
+        return await produce(), None
+
+    def lookup() -> Tuple[Optional[Dict[str, Any]], str]:
+        scope_version = f"{skill_version(skills)}:{version}" if skills else version
+        return get_response_cache().get(
+            agent_id, sys_prompt, question,
+            semantic=config.get("semantic", False),
+            threshold=float(config.get("threshold", RESPONSE_CACHE_SIMILARITY)),
+            version=scope_version,
+        ), scope_version
+
+    # 技能版本和 SQLite 读写都在线程中执行，不阻塞事件循环
+    try:
+        hit, scope_version = await asyncio.to_thread(lookup)
+    except Exception as e:
+        print(f"[ResponseCache] 查询缓存失败: {e}")
+        hit, scope_version = None, None
+    if hit is not None:
+        print(f"[ResponseCache] {agent_id} 命中缓存 ({hit['tier']}, 相似度 {hit['similarity']})")
+        return hit["response"], hit["tier"]
+
+    response = await produce()
+    if response and scope_version is not None:
+        try:
+            await asyncio.to_thread(
+                get_response_cache().put, agent_id, sys_prompt, question, response,
+                ttl=float(config.get("ttl", RESPONSE_CACHE_TTL)), version=scope_version,
+            )
+        except Exception as e:
+            print(f"[ResponseCache] 写入缓存失败: {e}")
+    return response, None
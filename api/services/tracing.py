@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+工作流执行追踪
+
+为工作流的每个执行步骤（准备、智能体构建、模型调用、工具调用、分类、SSE 推送）
+记录 span（开始/结束时间、父 span、属性），以 run_id 作为 trace ID。
+运行结束后导出为 OTLP 兼容的 JSON 文件，并可通过 /api/workflow/traces/{run_id} 查询。
+
+span 的父子关系通过 contextvars 传递，asyncio 子任务会自动继承当前 span。
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import WORKFLOW_TRACE_ENABLED, WORKFLOW_TRACE_MAX_RUNS
+
+
+# 追踪文件目录
+TRACE_DIR = Path("./logs/traces")
+
+# OTLP 资源中的服务名
+SERVICE_NAME = "agentskills"
+
+
+@dataclass
+class Span:
+    """一个执行步骤"""
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    message: str = ""
+
+    def set_attribute(self, key: str, value: Any):
+        """设置属性"""
+        self.attributes[key] = value
+
+    def end(self, status: str = None, message: str = ""):
+        """结束 span 并写入追踪存储"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if status:
+            self.status = status
+            self.message = message
+        trace_store.add(self)
+
+    @property
+    def duration_ms(self) -> float:
+        """耗时（毫秒）"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """简化格式，供追踪查看接口使用"""
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "message": self.message,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP JSON 格式"""
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2 if self.status == "error" else 1, "message": self.message},
+        }
+        if self.parent_id:
+            otlp["parentSpanId"] = self.parent_id
+        return otlp
+
+    @classmethod
+    def from_otlp(cls, data: Dict[str, Any]) -> "Span":
+        """从 OTLP JSON 还原"""
+        attributes = {}
+        for attr in data.get("attributes", []):
+            value = attr.get("value", {})
+            if "intValue" in value:
+                attributes[attr["key"]] = int(value["intValue"])
+            else:
+                attributes[attr["key"]] = next(iter(value.values()), None)
+        status = data.get("status", {})
+        return cls(
+            trace_id=data["traceId"],
+            span_id=data["spanId"],
+            parent_id=data.get("parentSpanId"),
+            name=data["name"],
+            start_ns=int(data["startTimeUnixNano"]),
+            end_ns=int(data["endTimeUnixNano"]),
+            attributes=attributes,
+            status="error" if status.get("code") == 2 else "ok",
+            message=status.get("message", ""),
+        )
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """转换为 OTLP 属性格式"""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class TraceStore:
+    """追踪存储：内存中保留最近的运行，结束时导出到文件，导出目录同样只保留最近的运行"""
+
+    def __init__(self, max_runs: int = WORKFLOW_TRACE_MAX_RUNS, trace_dir: Path = TRACE_DIR):
+        """
+        初始化追踪存储。
+
+        Args:
+            max_runs: 内存中和导出目录中保留的运行数
+            trace_dir: 导出目录
+        """
+        self.max_runs = max_runs
+        self.trace_dir = trace_dir
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        """记录已结束的 span"""
+        with self._lock:
+            self._traces.setdefault(span.trace_id, []).append(span)
+            self._traces.move_to_end(span.trace_id)
+            while len(self._traces) > self.max_runs:
+                self._traces.popitem(last=False)
+
+    def get_spans(self, trace_id: str) -> List[Span]:
+        """获取运行的全部 span（内存中没有时从文件读取），按开始时间排序"""
+        with self._lock:
+            spans = list(self._traces.get(trace_id, []))
+        if not spans:
+            spans = self._load(trace_id)
+        return sorted(spans, key=lambda s: s.start_ns)
+
+    def export(self, trace_id: str) -> Optional[str]:
+        """导出运行的 span 为 OTLP JSON 文件，恢复执行的运行会与已有文件合并"""
+        with self._lock:
+            spans = list(self._traces.get(trace_id, []))
+        if not spans:
+            return None
+        known = {s.span_id for s in spans}
+        spans = [s for s in self._load(trace_id) if s.span_id not in known] + spans
+
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        path = self.trace_dir / f"{trace_id}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(to_otlp(spans), f, ensure_ascii=False)
+        self._prune_files()
+        return str(path)
+
+    def _prune_files(self):
+        """按修改时间删除超出 max_runs 的旧导出文件"""
+        files = []
+        for path in self.trace_dir.glob("*.json"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        if len(files) <= self.max_runs:
+            return
+        files.sort(reverse=True)
+        for _, path in files[self.max_runs:]:
+            try:
+                path.unlink()
+            except OSError as e:
+                print(f"[Tracing] 删除追踪文件失败: {e}")
+
+    def _load(self, trace_id: str) -> List[Span]:
+        """从导出文件读取 span"""
+        path = self.trace_dir / f"{trace_id}.json"
+        if not path.exists():
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[Tracing] 读取追踪文件失败: {e}")
+            return []
+        return [
+            Span.from_otlp(span)
+            for resource in data.get("resourceSpans", [])
+            for scope in resource.get("scopeSpans", [])
+            for span in scope.get("spans", [])
+        ]
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    """将 span 列表包装为 OTLP ExportTraceServiceRequest JSON"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "workflow_engine"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+# 全局追踪存储
+trace_store = TraceStore()
+
+# 当前上下文中的 span
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """获取当前上下文中的 span"""
+    return _current_span.get()
+
+
+def begin_span(name: str, trace_id: str = None, parent: Span = None, **attributes: Any) -> Optional[Span]:
+    """
+    开始一个 span（不改变当前上下文），调用方负责调用 span.end()。
+
+    Args:
+        name: span 名称
+        trace_id: 根 span 的 trace ID；为空时挂在父 span 下
+        parent: 父 span，默认为当前上下文中的 span
+        attributes: span 属性
+
+    Returns:
+        新的 span；未开启追踪或不在追踪上下文中时返回 None
+    """
+    if not WORKFLOW_TRACE_ENABLED:
+        return None
+    if trace_id is None:
+        parent = parent or _current_span.get()
+        if parent is None:
+            return None
+    return Span(
+        trace_id=trace_id or parent.trace_id,
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if trace_id is None else None,
+        name=name,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+
+
+@contextmanager
+def start_span(name: str, trace_id: str = None, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    在 with 块内记录 span，并将其设为当前 span。
+
+    块内抛出的异常会记录到 span 状态后继续抛出。
+    """
+    span = begin_span(name, trace_id=trace_id, **attributes)
+    if span is None:
+        yield None
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.end("error", str(e) or type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+# ============= 智能体钩子 =============
+
+def _pre_reasoning_hook(self, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """推理前钩子 - 开始模型调用 span"""
+    span = begin_span("model.call", agent=getattr(self, "name", ""))
+    if span is not None:
+        self._trace_spans["reasoning"] = span
+    return None
+
+
+def _post_reasoning_hook(self, kwargs: Dict[str, Any], output: Any) -> Any:
+    """推理后钩子 - 结束模型调用 span"""
+    span = self._trace_spans.pop("reasoning", None)
+    if span is not None:
+        span.end()
+    return None
+
+
+def _pre_acting_hook(self, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """行动前钩子 - 开始工具调用 span"""
+    tool_call = kwargs.get("tool_call") or {}
+    span = begin_span("tool.call", agent=getattr(self, "name", ""), tool=tool_call.get("name", ""))
+    if span is not None:
+        # 同一步推理中的多个工具调用可能并行执行，按调用 ID 区分各自的 span
+        self._trace_spans[("acting", tool_call.get("id"))] = span
+    return None
+
+
+def _post_acting_hook(self, kwargs: Dict[str, Any], output: Any) -> Any:
+    """行动后钩子 - 结束工具调用 span"""
+    tool_call = kwargs.get("tool_call") or {}
+    span = self._trace_spans.pop(("acting", tool_call.get("id")), None)
+    if span is not None:
+        span.end()
+    return None
+
+
+def trace_agent(agent: Any):
+    """为智能体注册模型调用和工具调用的追踪钩子（重复调用无副作用）"""
+    inner = getattr(agent, "agent", agent)
+    if not hasattr(inner, "register_instance_hook") or getattr(inner, "_trace_spans", None) is not None:
+        return
+    inner._trace_spans = {}
+    for hook_type, hook in (
+        ("pre_reasoning", _pre_reasoning_hook),
+        ("post_reasoning", _post_reasoning_hook),
+        ("pre_acting", _pre_acting_hook),
+        ("post_acting", _post_acting_hook),
+    ):
+        inner.register_instance_hook(hook_type=hook_type, hook_name=f"tracing_{hook_type}", hook=hook)
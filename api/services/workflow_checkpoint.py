@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+工作流检查点服务
+
+将每次工作流运行及其已完成节点的输出持久化到 SQLite，
+进程崩溃或重新部署后可以从最后完成的节点继续执行，避免重复调用大模型。
+运行完成后删除其节点输出；超过保留天数或条数的运行记录在新建运行时清理。
+"""
+import sqlite3
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+from contextlib import contextmanager
+
+from config.settings import WORKFLOW_CHECKPOINT_MAX_AGE_DAYS, WORKFLOW_CHECKPOINT_MAX_RUNS
+
+
+class CheckpointStore:
+    """工作流检查点存储"""
+
+    def __init__(self, db_path: str = None, max_age_days: float = WORKFLOW_CHECKPOINT_MAX_AGE_DAYS,
+                 max_runs: int = WORKFLOW_CHECKPOINT_MAX_RUNS):
+        """
+        初始化检查点存储。
+
+        Args:
+            db_path: 数据库路径
+            max_age_days: 运行记录的保留天数（按最后更新时间），0 表示不限制
+            max_runs: 保留的已结束运行数，0 表示不限制
+        """
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(__file__), '../../data/workflow_runs.db')
+
+        self.db_path = os.path.abspath(db_path)
+        self.max_age_days = max_age_days
+        self.max_runs = max_runs
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._init_database()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _init_database(self):
+        """初始化数据库表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+            # 工作流运行表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS workflow_runs (
+                    run_id TEXT PRIMARY KEY,
+                    workflow_name TEXT NOT NULL,
+                    content_hash TEXT,
+                    full_input TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    final_output TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+
+            # 节点输出表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS workflow_node_outputs (
+                    run_id TEXT NOT NULL,
+                    node_id TEXT NOT NULL,
+                    output TEXT,
+                    handles TEXT,
+                    finished_at TEXT NOT NULL,
+                    PRIMARY KEY (run_id, node_id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_workflow_runs_updated ON workflow_runs(updated_at)')
+
+    def create_run(self, run_id: str, workflow_name: str, content_hash: str, full_input: str):
+        """记录新的运行"""
+        now = datetime.now().isoformat()
+        with self.get_connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO workflow_runs
+                (run_id, workflow_name, content_hash, full_input, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 'running', ?, ?)
+            ''', (run_id, workflow_name, content_hash, full_input, now, now))
+            self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection):
+        """删除超过保留天数的运行，以及超出保留条数的已结束运行"""
+        if self.max_age_days > 0:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            conn.execute('DELETE FROM workflow_runs WHERE updated_at < ?', (cutoff,))
+        if self.max_runs > 0:
+            conn.execute('''
+                DELETE FROM workflow_runs WHERE status != 'running' AND run_id NOT IN (
+                    SELECT run_id FROM workflow_runs WHERE status != 'running'
+                    ORDER BY updated_at DESC LIMIT ?
+                )
+            ''', (self.max_runs,))
+        conn.execute(
+            'DELETE FROM workflow_node_outputs WHERE run_id NOT IN (SELECT run_id FROM workflow_runs)'
+        )
+
+    def save_node(self, run_id: str, node_id: str, output: str, handles: Optional[set]):
+        """保存节点输出"""
+        now = datetime.now().isoformat()
+        handles_json = json.dumps(sorted(handles)) if handles is not None else None
+        with self.get_connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO workflow_node_outputs (run_id, node_id, output, handles, finished_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (run_id, node_id, output, handles_json, now))
+            conn.execute('UPDATE workflow_runs SET updated_at = ? WHERE run_id = ?', (now, run_id))
+
+    def finish_run(self, run_id: str, status: str, final_output: str = None, error: str = None):
+        """更新运行状态（completed / failed / cancelled / running）"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                UPDATE workflow_runs SET status = ?, final_output = ?, error = ?, updated_at = ?
+                WHERE run_id = ?
+            ''', (status, final_output, error, datetime.now().isoformat(), run_id))
+            if status == "completed":
+                # 已完成的运行不会再恢复，节点输出不再需要
+                conn.execute('DELETE FROM workflow_node_outputs WHERE run_id = ?', (run_id,))
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """获取运行记录"""
+        with self.get_connection() as conn:
+            row = conn.execute('SELECT * FROM workflow_runs WHERE run_id = ?', (run_id,)).fetchone()
+            return dict(row) if row else None
+
+    def get_node_outputs(self, run_id: str) -> Dict[str, Tuple[str, Optional[set]]]:
+        """获取运行中已完成节点的输出: node_id -> (输出, 分支 handle 集合)"""
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT node_id, output, handles FROM workflow_node_outputs WHERE run_id = ?', (run_id,)
+            ).fetchall()
+        return {
+            row["node_id"]: (row["output"] or "", set(json.loads(row["handles"])) if row["handles"] else None)
+            for row in rows
+        }
+
+    def list_runs(self, status: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """按更新时间倒序列出运行记录"""
+        sql = 'SELECT run_id, workflow_name, status, error, created_at, updated_at FROM workflow_runs'
+        params: list = []
+        if status:
+            sql += ' WHERE status = ?'
+            params.append(status)
+        sql += ' ORDER BY updated_at DESC LIMIT ?'
+        params.append(limit)
+        with self.get_connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+# 全局检查点存储实例
+_checkpoint_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """获取检查点存储实例"""
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        _checkpoint_store = CheckpointStore()
+    return _checkpoint_store
@@ -0,0 +1,816 @@
+# -*- coding: utf-8 -*-
+"""
+工作流执行引擎
+
+将工作流 JSON 编译为执行计划，并按计划调度节点执行。
+HTTP、SSE、邮件触发和工作流测试入口都只是该引擎的适配层。
+"""
+import json
+import uuid
+import asyncio
+import logging
+import time
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, AsyncIterator, Awaitable, Callable
+
+from agentscope.message import Msg
+
+from api.services.context_builder import build_context_prompt
+from api.services.classifier import ClassifierService
+from api.services.agent_manager import AgentManager
+from api.services.agent_pool import agent_pool
+from api.services.node_cache import node_cache, get_cache_ttl
+from api.services.workflow_checkpoint import get_checkpoint_store
+from api.services.event_bus import EventChannel, create_channel_task
+from api.services.tracing import trace_store, start_span, begin_span, current_span, trace_agent
+from api.services.token_logger import log_agent_call
+from api.services.tool_executor import tool_executor
+from api.utils.graph import get_execution_levels
+from agents.base import set_token_sink
+from config.settings import (
+    WORKFLOW_MAX_CONCURRENCY, WORKFLOW_NODE_TIMEOUT, WORKFLOW_CHECKPOINT_ENABLED, WORKFLOW_PREWARM_TOP_K,
+    CLASSIFIER_MODE
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 智能体类节点
+AGENT_NODE_TYPES = ("agent", "skill-agent", "simple-agent")
+
+# 产出结果的节点类型，其输出会成为工作流的最终输出
+RESULT_NODE_TYPES = AGENT_NODE_TYPES + ("tool", "output")
+
+# 编译计划缓存上限（按 LRU 淘汰，防止测试接口提交的临时工作流无限增长）
+PLAN_CACHE_SIZE = 128
+
+# 智能体节点对应的配置字段
+AGENT_CONFIG_KEYS = {
+    "agent": "agentConfig",
+    "skill-agent": "skillAgentConfig",
+    "simple-agent": "simpleAgentConfig",
+}
+
+
+@dataclass
+class WorkflowPlan:
+    """编译后的工作流执行计划"""
+    name: str
+    nodes: Dict[str, dict]
+    order: List[str]
+    levels: List[List[str]]
+    incoming: Dict[str, List[dict]]
+    outgoing: Dict[str, List[dict]]
+    # 分支节点的 handle -> 出边映射，handle 为 None 的出边总是被激活
+    branches: Dict[str, Dict[Optional[str], List[dict]]] = field(default_factory=dict)
+    input_nodes: List[str] = field(default_factory=list)
+    agent_nodes: List[str] = field(default_factory=list)
+    max_concurrency: int = WORKFLOW_MAX_CONCURRENCY
+    content_hash: str = ""
+
+
+# 编译计划缓存: (工作流名称, 内容哈希) -> 执行计划
+_plan_cache: "OrderedDict[tuple, WorkflowPlan]" = OrderedDict()
+
+
+def workflow_hash(workflow: dict) -> str:
+    """计算工作流定义的内容哈希"""
+    raw = json.dumps(workflow, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_plan(workflow: dict, name: str = "", content_hash: str = None) -> WorkflowPlan:
+    """
+    获取工作流的编译计划，相同内容只编译一次。
+
+    Args:
+        workflow: 工作流定义
+        name: 工作流名称
+        content_hash: 预先计算的内容哈希，未提供时现场计算
+
+    Returns:
+        执行计划
+    """
+    key = (name, content_hash or workflow_hash(workflow))
+    plan = _plan_cache.get(key)
+    if plan is not None:
+        _plan_cache.move_to_end(key)
+        return plan
+
+    plan = compile_workflow(workflow, name)
+    plan.content_hash = key[1]
+    _plan_cache[key] = plan
+    while len(_plan_cache) > PLAN_CACHE_SIZE:
+        _plan_cache.popitem(last=False)
+    return plan
+
+
+def compile_workflow(workflow: dict, name: str = "") -> WorkflowPlan:
+    """
+    将工作流 JSON 编译为执行计划。
+
+    Args:
+        workflow: 工作流定义，包含 nodes 和 edges
+        name: 工作流名称
+
+    Returns:
+        执行计划
+    """
+    node_list = workflow.get("nodes", [])
+    edge_list = workflow.get("edges", [])
+
+    nodes = {n["id"]: n for n in node_list}
+    incoming = {nid: [] for nid in nodes}
+    outgoing = {nid: [] for nid in nodes}
+
+    for edge in edge_list:
+        source = edge.get("source")
+        target = edge.get("target")
+        if source in nodes and target in nodes:
+            item = {"source": source, "target": target, "handle": edge.get("sourceHandle") or None}
+            outgoing[source].append(item)
+            incoming[target].append(item)
+
+    branches = {}
+    for node_id, edges in outgoing.items():
+        if any(e["handle"] for e in edges):
+            branch_map = {}
+            for edge in edges:
+                branch_map.setdefault(edge["handle"], []).append(edge)
+            branches[node_id] = branch_map
+
+    levels = get_execution_levels(node_list, edge_list)
+    order = [nid for level in levels for nid in level]
+
+    return WorkflowPlan(
+        name=name or workflow.get("name", ""),
+        nodes=nodes,
+        order=order,
+        levels=levels,
+        incoming=incoming,
+        outgoing=outgoing,
+        branches=branches,
+        input_nodes=[nid for nid in order if nodes[nid].get("type") == "input"],
+        agent_nodes=[nid for nid in order if nodes[nid].get("type") in AGENT_NODE_TYPES],
+        max_concurrency=max(1, int(workflow.get("maxConcurrency") or WORKFLOW_MAX_CONCURRENCY)),
+    )
+
+
+@dataclass
+class _RunState:
+    """单次执行的运行状态"""
+    full_input: str
+    outputs: Dict[str, str] = field(default_factory=dict)
+    taken_edges: set = field(default_factory=set)
+    final_output: str = ""
+
+
+def _node_option(node: dict, key: str, default: Any) -> Any:
+    """读取节点执行选项，先查 data，再查节点类型对应的配置字段"""
+    data = node.get("data", {})
+    if data.get(key) is not None:
+        return data[key]
+    config_key = AGENT_CONFIG_KEYS.get(node.get("type"), f"{node.get('type')}Config")
+    config = data.get(config_key)
+    if isinstance(config, dict) and config.get(key) is not None:
+        return config[key]
+    return default
+
+
+def _response_text(response: Any) -> str:
+    """提取智能体响应中的文本内容"""
+    output = response.content if hasattr(response, "content") else str(response)
+    if isinstance(output, list):
+        text_parts = [item.get("text", "") for item in output if isinstance(item, dict) and "text" in item]
+        output = "\n".join(text_parts) if text_parts else str(output)
+    return str(output) if output else ""
+
+
+# 当前进程中正在执行的运行 ID，同一运行不能同时执行两次（如重复恢复）
+_active_runs: set = set()
+
+def is_run_active(run_id: str) -> bool:
+    """运行是否正在当前进程中执行"""
+    return run_id in _active_runs
+
+
+class WorkflowEngine:
+    """工作流执行引擎
+
+    按就绪层级执行节点，同一层级中被激活的节点并发执行，并发数受
+    plan.max_concurrency 限制。分类器和条件节点只激活选中分支的出边，
+    未被激活的节点及其下游会被跳过。执行过程以事件字典的形式产出。
+
+    每个节点完成后其输出会写入检查点，运行中断后可通过 run_id 恢复。
+    智能体节点的模型增量输出会实时以 token 事件推送。
+    """
+
+    def __init__(self, plan: WorkflowPlan, api_key: str = None, capture_logs: bool = False,
+                 run_id: str = None, checkpoint: bool = WORKFLOW_CHECKPOINT_ENABLED,
+                 continue_on_error: bool = False):
+        """
+        初始化执行引擎。
+
+        Args:
+            plan: 编译后的执行计划
+            api_key: API 密钥，默认使用 AgentManager 的配置
+            capture_logs: 是否捕获智能体执行日志并以 console_log 事件推送
+            run_id: 运行 ID，恢复执行时传入已有的 ID
+            checkpoint: 是否将节点输出写入检查点
+            continue_on_error: 节点出错时推送 node_error 后把节点输入作为输出继续执行
+                （工作流测试使用），默认中止运行
+        """
+        self.plan = plan
+        self.api_key = api_key or AgentManager.get_api_key()
+        self.capture_logs = capture_logs
+        self.run_id = run_id or uuid.uuid4().hex
+        self.checkpoint = checkpoint
+        self.continue_on_error = continue_on_error
+        self._agents: Dict[str, Any] = {}
+        self._prewarm: Dict[str, asyncio.Task] = {}
+        self._channel: Optional[EventChannel] = None
+        self._root_span = None
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+
+    async def stream(self, user_input: str = "", history: List[dict] = None,
+                     resume: bool = False) -> AsyncIterator[dict]:
+        """
+        执行工作流并逐个产出执行事件。
+
+        执行失败时异常会在事件产出完毕后抛出，由调用方决定如何呈现。
+        调用方提前关闭迭代器时，正在执行的任务会被取消。
+
+        Args:
+            user_input: 用户输入
+            history: 对话历史
+            resume: 是否从 run_id 对应的检查点恢复执行（此时忽略 user_input 和 history）
+        """
+        # 执行任务绑定到本次运行的事件通道，智能体日志只会发布到这里
+        self._channel = EventChannel(capture_logs=self.capture_logs)
+        task = create_channel_task(self._channel, self._execute(user_input, history or [], resume))
+        task.add_done_callback(lambda _: self._channel.close())
+
+        started_ns = time.time_ns()
+        event_count = 0
+        blocked_ns = 0
+        try:
+            while True:
+                event = await self._channel.get()
+                if event is None:
+                    break
+                event_count += 1
+                yielded_ns = time.time_ns()
+                yield event
+                # 调用方处理（写出 SSE）事件期间引擎事件会在通道中积压
+                blocked_ns += time.time_ns() - yielded_ns
+            await task
+        finally:
+            if not task.done():
+                logger.info(f"调用方已断开，取消执行: {self.plan.name}")
+                task.cancel()
+            self._finish_trace(task, started_ns, event_count, blocked_ns)
+
+    async def run(self, user_input: str = "", history: List[dict] = None, resume: bool = False) -> str:
+        """执行工作流并返回最终输出"""
+        final_output = ""
+        async for event in self.stream(user_input, history, resume):
+            if event["type"] == "content":
+                final_output = event["content"]
+        return final_output
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+
+    def _emit(self, event_type: str, **fields):
+        """推送执行事件"""
+        if self._channel is not None:
+            self._channel.publish({"type": event_type, **fields})
+
+    def _finish_trace(self, task: asyncio.Task, started_ns: int, event_count: int, blocked_ns: int):
+        """记录 SSE 推送 span，并在执行任务结束后导出本次运行的追踪"""
+        if self._root_span is None:
+            return
+        span = begin_span("sse.flush", parent=self._root_span, events=event_count,
+                          blocked_ms=round(blocked_ns / 1e6, 3))
+        span.start_ns = started_ns
+        span.end()
+
+        def export(_=None):
+            # 读写追踪文件和清理旧文件在线程中执行，不阻塞事件循环
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._export_trace()
+                return
+            loop.run_in_executor(None, self._export_trace)
+
+        if task.done():
+            export()
+        else:
+            task.add_done_callback(export)
+
+    def _export_trace(self):
+        """导出本次运行的追踪文件"""
+        try:
+            trace_store.export(self.run_id)
+        except Exception as e:
+            logger.warning(f"导出追踪失败: {e}")
+
+    async def _execute(self, user_input: str, history: List[dict], resume: bool):
+        """执行工作流，根 span 覆盖整个运行"""
+        if self.run_id in _active_runs:
+            raise RuntimeError(f"运行 {self.run_id} 正在执行")
+        _active_runs.add(self.run_id)
+        try:
+            with start_span("workflow.run", trace_id=self.run_id, workflow=self.plan.name, resumed=resume) as span:
+                self._root_span = span
+                await self._run_workflow(user_input, history, resume)
+        finally:
+            _active_runs.discard(self.run_id)
+
+    async def _run_workflow(self, user_input: str, history: List[dict], resume: bool):
+        """执行工作流（检查点的 SQLite 读写都在线程中执行，不阻塞事件循环）"""
+        plan = self.plan
+        store = await asyncio.to_thread(get_checkpoint_store) if self.checkpoint or resume else None
+
+        self._emit("run_start", runId=self.run_id, resumed=resume)
+        self._emit("thinking", message="正在分析需求...")
+        self._emit("console_log", source="system", log_type="info", message=f"开始执行工作流: {plan.name}")
+
+        restored = {}
+        with start_span("workflow.prepare", nodes=len(plan.order), levels=len(plan.levels),
+                        content_hash=plan.content_hash):
+            if resume:
+                run = await asyncio.to_thread(store.get_run, self.run_id)
+                if run is None:
+                    raise ValueError(f"运行记录 {self.run_id} 不存在")
+                full_input = run["full_input"]
+                restored = await asyncio.to_thread(store.get_node_outputs, self.run_id)
+                self._emit("thinking", message=f"从检查点恢复，已完成 {len(restored)} 个节点")
+                if self.checkpoint:
+                    await asyncio.to_thread(store.finish_run, self.run_id, "running")
+            else:
+                context_prompt = ""
+                if history:
+                    self._emit("thinking", message=f"加载对话历史 ({len(history)} 条消息)...")
+                    context_prompt = build_context_prompt(history)
+                full_input = context_prompt + user_input if context_prompt else user_input
+                if self.checkpoint:
+                    await asyncio.to_thread(store.create_run, self.run_id, plan.name, plan.content_hash, full_input)
+
+        try:
+            final_output = await self._schedule(full_input, restored)
+        except asyncio.CancelledError:
+            if self.checkpoint:
+                await asyncio.to_thread(store.finish_run, self.run_id, "cancelled", error="执行已取消")
+            raise
+        except Exception as e:
+            if self.checkpoint:
+                await asyncio.to_thread(store.finish_run, self.run_id, "failed", error=str(e))
+            raise
+        finally:
+            self._release_prewarm()
+            agent_pool.release_all(list(self._agents.values()))
+            self._agents.clear()
+
+        if self.checkpoint:
+            await asyncio.to_thread(store.finish_run, self.run_id, "completed", final_output=final_output)
+        self._emit("console_log", source="system", log_type="success", message="工作流执行完成")
+        self._emit("content", content=final_output)
+        self._emit("done")
+
+    async def _schedule(self, full_input: str, restored: Dict[str, tuple]) -> str:
+        """按层级调度节点，已在检查点中完成的节点直接复用其输出，返回最终输出"""
+        plan = self.plan
+        self._emit("thinking", message=f"执行顺序: {len(plan.order)} 个节点")
+
+        state = _RunState(full_input=full_input)
+        semaphore = asyncio.Semaphore(plan.max_concurrency)
+
+        for level in plan.levels:
+            ready = [nid for nid in level if self._is_active(nid, state)]
+            if not ready:
+                continue
+            results = {}
+            for node_id in ready:
+                if node_id in restored:
+                    results[node_id] = restored[node_id]
+                    node_label = plan.nodes[node_id].get("data", {}).get("label", node_id)
+                    self._emit("node_complete", nodeId=node_id, nodeLabel=node_label, message=f"{node_label} 已从检查点恢复")
+            pending = [nid for nid in ready if nid not in results]
+            tasks = [asyncio.create_task(self._run_ready(nid, state, semaphore)) for nid in pending]
+            try:
+                results.update(zip(pending, await asyncio.gather(*tasks)))
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            # 按层级内的节点顺序合并结果，保证最终输出与并发完成顺序无关
+            for node_id in ready:
+                output, handles = results[node_id]
+                state.outputs[node_id] = output
+                if plan.nodes[node_id].get("type") in RESULT_NODE_TYPES:
+                    state.final_output = output
+                self._take_edges(node_id, handles, state)
+
+        return state.final_output
+
+    async def _run_ready(self, node_id: str, state: _RunState, semaphore: asyncio.Semaphore):
+        """在并发限制内执行一个已就绪的节点"""
+        node = self.plan.nodes[node_id]
+        label = node.get("data", {}).get("label", node_id)
+        with start_span(f"node.{node.get('type')}", node_id=node_id, label=label) as span:
+            queued_ns = time.time_ns()
+            async with semaphore:
+                # 消费者跟不上时先等待事件通道腾出空间，再开始产生新事件
+                if self._channel is not None:
+                    await self._channel.drain()
+                if span is not None:
+                    span.set_attribute("queue_ms", round((time.time_ns() - queued_ns) / 1e6, 3))
+                node_input = self._collect_input(node_id, state)
+                output, handles = await self._execute_node(node, node_input, state)
+            if self.checkpoint:
+                with start_span("checkpoint.save"):
+                    await asyncio.to_thread(get_checkpoint_store().save_node, self.run_id, node_id, output, handles)
+        return output, handles
+
+    async def _get_agent(self, node: dict) -> Optional[Any]:
+        """首次执行到智能体节点时才从智能体池借出，未选中的分支不会构建"""
+        node_id = node["id"]
+        if node_id in self._agents:
+            return self._agents[node_id]
+
+        label = self._agent_name(node)
+        built = None
+        prewarm_task = self._prewarm.pop(node_id, None)
+        if prewarm_task is not None:
+            try:
+                built = await prewarm_task
+            except Exception as e:
+                self._emit("console_log", source="workflow", log_type="warning",
+                           message=f"[Workflow] 预热智能体失败: {label}: {e}")
+        if built is not None:
+            agent, reused = built
+            action = "使用预热的智能体"
+        else:
+            self._emit("thinking", message=f"初始化智能体: {label}")
+            with start_span("agent.build", agent=label) as span:
+                # 在线程中构建，不阻塞同一层级中并发执行的其他节点
+                build = asyncio.ensure_future(asyncio.to_thread(agent_pool.acquire, node, self.api_key))
+                try:
+                    agent, reused = await asyncio.shield(build)
+                except asyncio.CancelledError:
+                    # 构建线程无法中断，完成后把实例归还智能体池
+                    build.add_done_callback(
+                        lambda t: agent_pool.release(t.result()[0])
+                        if not t.cancelled() and t.exception() is None and t.result()[0] is not None else None
+                    )
+                    raise
+                if span is not None:
+                    span.set_attribute("reused", reused)
+            action = "复用智能体" if reused else "创建智能体"
+        if agent is None:
+            return None
+        trace_agent(agent)
+        self._emit("console_log", source="agent", log_type="info", message=f"[Agent] {action}: {label}")
+        self._agents[node_id] = agent
+        return agent
+
+    def _prewarm_branches(self, node: dict, node_input: str, categories: List[dict]):
+        """
+        分类调用进行期间，按关键词得分预先构建最可能的 top-k 个分支的智能体。
+
+        通过节点的 prewarm 选项（数字为 top-k，true 为 1）或 WORKFLOW_PREWARM_TOP_K 开启。
+        """
+        top_k = int(_node_option(node, "prewarm", WORKFLOW_PREWARM_TOP_K))
+        if top_k <= 0:
+            return
+        branch_map = self.plan.branches.get(node["id"], {})
+        for category, score in ClassifierService.score_categories(node_input, categories)[:top_k]:
+            if score <= 0:
+                break
+            for edge in branch_map.get(category.get("id"), []):
+                target = self.plan.nodes[edge["target"]]
+                target_id = target["id"]
+                if (target.get("type") not in AGENT_NODE_TYPES
+                        or target_id in self._agents or target_id in self._prewarm):
+                    continue
+                self._prewarm[target_id] = asyncio.create_task(self._build_agent(target))
+                self._emit("console_log", source="agent", log_type="info",
+                           message=f"[Prewarm] 预热分支智能体: {self._agent_name(target)} "
+                                   f"(分类: {category.get('name')}, 得分: {score})")
+
+    async def _build_agent(self, node: dict):
+        """在线程中从智能体池借出智能体，不阻塞事件循环"""
+        with start_span("agent.prewarm", agent=self._agent_name(node)) as span:
+            agent, reused = await asyncio.to_thread(agent_pool.acquire, node, self.api_key)
+            if span is not None:
+                span.set_attribute("reused", reused)
+        return agent, reused
+
+    def _release_prewarm(self, keep: set = frozenset()):
+        """
+        放弃未选中分支的预热智能体。
+
+        构建线程无法中断，仍在构建的实例会在完成后归还智能体池，供后续请求复用。
+        """
+        def release(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is None and task.result()[0] is not None:
+                agent_pool.release(task.result()[0])
+
+        for node_id in [nid for nid in self._prewarm if nid not in keep]:
+            self._prewarm.pop(node_id).add_done_callback(release)
+
+    def _is_active(self, node_id: str, state: _RunState) -> bool:
+        """节点是否在本次执行路径上（无入边或至少一条入边被激活）"""
+        incoming = self.plan.incoming[node_id]
+        if not incoming:
+            return True
+        return any((e["source"], e["target"]) in state.taken_edges for e in incoming)
+
+    def _collect_input(self, node_id: str, state: _RunState) -> str:
+        """汇总被激活的上游节点输出作为节点输入"""
+        parts = [
+            state.outputs[e["source"]]
+            for e in self.plan.incoming[node_id]
+            if (e["source"], e["target"]) in state.taken_edges
+        ]
+        if not parts:
+            return state.full_input
+        return parts[0] if len(parts) == 1 else "\n\n".join(parts)
+
+    def _take_edges(self, node_id: str, handles: Optional[set], state: _RunState):
+        """激活节点出边，handles 为 None 时激活全部出边"""
+        branch_map = self.plan.branches.get(node_id)
+        if handles is None or branch_map is None:
+            edges = self.plan.outgoing[node_id]
+        else:
+            edges = list(branch_map.get(None, []))
+            matched = [e for handle in handles if handle in branch_map for e in branch_map[handle]]
+            if not matched:
+                # 没有匹配的分支时走第一个分支
+                default_handle = next(h for h in branch_map if h)
+                matched = branch_map[default_handle]
+            edges += matched
+        for edge in edges:
+            state.taken_edges.add((edge["source"], edge["target"]))
+
+    # ------------------------------------------------------------------
+    # 节点执行
+    # ------------------------------------------------------------------
+
+    async def _call_with_policy(self, node: dict, make_call: Callable[[], Awaitable[Any]],
+                                on_retry: Callable[[], None] = None, span_name: str = "node.call") -> Any:
+        """
+        按节点的 timeoutSeconds / retries / backoff 配置执行调用。
+
+        Args:
+            node: 工作流节点
+            make_call: 每次尝试时创建新协程的工厂函数
+            on_retry: 重试前的清理回调
+            span_name: 每次尝试记录的 span 名称
+
+        Returns:
+            调用结果
+        """
+        node_label = node.get("data", {}).get("label", node["id"])
+        timeout = float(_node_option(node, "timeoutSeconds", WORKFLOW_NODE_TIMEOUT)) or None
+        retries = max(0, int(_node_option(node, "retries", 0)))
+        backoff = float(_node_option(node, "backoff", 1.0))
+
+        for attempt in range(retries + 1):
+            try:
+                with start_span(span_name, attempt=attempt + 1):
+                    return await asyncio.wait_for(make_call(), timeout)
+            except asyncio.TimeoutError:
+                error = TimeoutError(f"节点 {node_label} 执行超时 ({timeout:g}s)")
+            except Exception as e:
+                error = e
+            if attempt >= retries:
+                raise error
+            delay = backoff * (2 ** attempt)
+            self._emit("console_log", source="workflow", log_type="warning",
+                       message=f"[Workflow] {node_label} 第 {attempt + 1} 次执行失败: {error}，{delay:g}s 后重试")
+            if on_retry:
+                on_retry()
+            await asyncio.sleep(delay)
+
+    async def _execute_node(self, node: dict, node_input: str, state: _RunState):
+        """
+        执行单个节点。
+
+        Returns:
+            (节点输出, 激活的分支 handle 集合；None 表示激活全部出边)
+        """
+        node_id = node["id"]
+        node_type = node.get("type")
+        node_label = node.get("data", {}).get("label", node_id)
+
+        try:
+            if node_type in AGENT_NODE_TYPES:
+                return await self._run_agent(node, node_input, state), None
+            elif node_type == "classifier":
+                return node_input, await self._run_classifier(node, node_input)
+            elif node_type == "condition":
+                return node_input, self._run_condition(node, node_input)
+            elif node_type == "tool":
+                return await self._run_tool(node, node_input, state), None
+            elif node_type == "parallel":
+                self._emit("parallel_start", nodeId=node_id, nodeLabel=node_label,
+                           branchCount=len(self.plan.outgoing[node_id]))
+            elif node_type == "output":
+                self._emit("output", nodeId=node_id, nodeLabel=node_label, content=node_input)
+            return node_input, None
+        except Exception as e:
+            self._emit("node_error", nodeId=node_id, nodeLabel=node_label, error=str(e))
+            if self.continue_on_error:
+                return node_input, None
+            raise
+
+    def _cache_lookup(self, node: dict, cache_input: Any):
+        """
+        查询节点结果缓存（仅对配置了 cache 的节点生效）。
+
+        Returns:
+            (缓存键, 是否命中, 缓存值)；未开启缓存时缓存键为 None
+        """
+        if get_cache_ttl(node) is None:
+            return None, False, None
+        cache_key = node_cache.make_key(node, cache_input)
+        hit, value = node_cache.get(cache_key)
+        span = current_span()
+        if span is not None:
+            span.set_attribute("cache_hit", hit)
+        node_label = node.get("data", {}).get("label", node["id"])
+        stats = node_cache.stats()
+        self._emit("console_log", source="cache", log_type="success" if hit else "info",
+                   message=f"[Cache] {node_label} {'命中' if hit else '未命中'} "
+                           f"(hits={stats['hits']}, misses={stats['misses']})")
+        return cache_key, hit, value
+
+    def _cache_store(self, node: dict, cache_key: Optional[str], value: Any):
+        """写入节点结果缓存"""
+        if cache_key is not None:
+            node_cache.set(cache_key, value, get_cache_ttl(node))
+
+    def _agent_name(self, node: dict) -> str:
+        """智能体显示名称"""
+        config = node.get("data", {}).get(AGENT_CONFIG_KEYS[node["type"]], {})
+        if node["type"] == "skill-agent":
+            return ", ".join(config.get("skills", [])) or node["id"]
+        return config.get("name", node["id"])
+
+    async def _run_agent(self, node: dict, node_input: str, state: _RunState) -> str:
+        """执行智能体节点"""
+        node_id = node["id"]
+        node_type = node["type"]
+        data = node.get("data", {})
+        node_label = data.get("label", node_id)
+        config = data.get(AGENT_CONFIG_KEYS[node_type], {})
+
+        agent = await self._get_agent(node)
+        if agent is None:
+            return node_input
+
+        skill_info = ""
+        if node_type == "skill-agent":
+            skill_info = f" (技能: {', '.join(config.get('skills', []))})"
+        elif node_type == "simple-agent":
+            skill_info = " (对话模式)"
+
+        self._emit("node_start", nodeId=node_id, nodeLabel=node_label, message=f"正在执行: {node_label}{skill_info}")
+        self._emit("console_log", source="workflow", log_type="info", message=f"[Workflow] 执行节点: {node_label}{skill_info}")
+        thinking_msg = f"{node_label}{skill_info} 正在执行..." if skill_info else f"{node_label} 正在思考..."
+        self._emit("thinking", message=thinking_msg)
+
+        def on_retry():
+            agent_pool.reset_memory(agent)
+            self._emit("token_reset", nodeId=node_id, nodeLabel=node_label)
+
+        # 模型增量输出以 token 事件推送
+        set_token_sink(agent, lambda delta, kind: self._emit(
+            "token", nodeId=node_id, nodeLabel=node_label, kind=kind, content=delta))
+        try:
+            response = await self._call_with_policy(
+                node,
+                lambda: agent(Msg("user", node_input, "user")),
+                on_retry=on_retry,
+                span_name="agent.call",
+            )
+        finally:
+            set_token_sink(agent, None)
+        output = _response_text(response)
+
+        output_preview = output[:100] + "..." if len(output) > 100 else output
+        self._emit("console_log", source="agent", log_type="success", message=f"[Agent] {node_label} 输出: {output_preview}")
+
+        # 记录 Token 消耗
+        log_agent_call(
+            agent_id=node_id,
+            agent_name=config.get("name", node_label),
+            model=config.get("model", "qwen3-max"),
+            input_text=node_input,
+            output_text=output,
+        )
+
+        self._emit("node_complete", nodeId=node_id, nodeLabel=node_label, message=f"{node_label}{skill_info} 执行完成")
+        return output
+
+    async def _run_classifier(self, node: dict, node_input: str) -> set:
+        """执行分类器节点，返回选中的分支 handle"""
+        node_id = node["id"]
+        node_label = node.get("data", {}).get("label", node_id)
+        classifier_config = node.get("data", {}).get("classifierConfig", {})
+        categories = classifier_config.get("categories", [])
+        model = classifier_config.get("model", "qwen3-max")
+
+        self._emit("node_start", nodeId=node_id, nodeLabel=node_label, message=f"正在分类: {node_label}")
+        if not categories:
+            return set()
+
+        self._emit("thinking", message="正在分析分类...")
+        cache_key, hit, matched = self._cache_lookup(node, node_input)
+        tier = "cache" if hit else "llm"
+        classifier = ClassifierService(self.api_key, default_model=model)
+        fast = None
+        if not hit and _node_option(node, "mode", CLASSIFIER_MODE) == "tiered":
+            with start_span("classifier.fast") as span:
+                # 首次使用某组分类时会从 SQLite 加载样本，放到线程中执行
+                fast = await asyncio.to_thread(classifier.fast_classify, node_input, categories)
+                if span is not None:
+                    span.set_attribute("hit", fast is not None)
+            if fast is not None:
+                matched, tier = fast["category"], fast["tier"]
+                self._emit("console_log", source="classifier", log_type="success",
+                           message=f"[Classifier] 快速通道命中 ({tier}, 置信度 {fast['confidence']:g}): {matched['name']}")
+        if not hit and fast is None:
+            self._prewarm_branches(node, node_input, categories)
+            matched = await self._call_with_policy(
+                node, lambda: classifier.classify(node_input, categories, model, mode="llm"),
+                span_name="classifier.call")
+            self._cache_store(node, cache_key, matched)
+            # 保留选中分支的预热智能体，其余归还
+            chosen = self.plan.branches.get(node_id, {}).get(matched.get("id") if matched else None, [])
+            self._release_prewarm(keep={edge["target"] for edge in chosen})
+
+        self._emit("console_log", source="classifier", log_type="info",
+                   message=f"[Workflow] 分类器结果: {matched['name'] if matched else 'None'} ({tier})")
+        self._emit("classifier_result", nodeId=node_id, nodeLabel=node_label,
+                   result=matched["name"] if matched else "None", tier=tier, input=node_input[:100])
+        self._emit("node_complete", nodeId=node_id, nodeLabel=node_label, message=f"{node_label} 分类完成")
+        return {matched.get("id")} if matched else set()
+
+    def _run_condition(self, node: dict, node_input: str) -> set:
+        """执行条件节点，返回选中的分支 handle"""
+        node_id = node["id"]
+        node_label = node.get("data", {}).get("label", node_id)
+        condition_expr = node.get("data", {}).get("conditionConfig", {}).get("expression", "")
+
+        self._emit("node_start", nodeId=node_id, nodeLabel=node_label, message=f"正在判断: {node_label}")
+        result = condition_expr.lower() in node_input.lower() if condition_expr else True
+        self._emit("condition_result", nodeId=node_id, nodeLabel=node_label, result=result, expression=condition_expr)
+        self._emit("node_complete", nodeId=node_id, nodeLabel=node_label, message=f"{node_label} 判断完成")
+        return {"true" if result else "false"}
+
+    async def _run_tool(self, node: dict, node_input: str, state: _RunState) -> str:
+        """执行工具节点"""
+        node_id = node["id"]
+        node_label = node.get("data", {}).get("label", node_id)
+        tool_config = node.get("data", {}).get("toolConfig", {})
+        tool_type = tool_config.get("toolType", "")
+        tool_params = tool_config.get("params", {})
+
+        self._emit("node_start", nodeId=node_id, nodeLabel=node_label, message=f"正在执行工具: {node_label}")
+        self._emit("thinking", message=f"执行工具 {node_label}...")
+
+        # 构建上下文变量
+        context = {
+            "input": node_input,
+            "content": node_input,
+            "output": state.final_output or node_input,
+        }
+        cache_key, hit, result = self._cache_lookup(node, context)
+        if not hit:
+            result = await self._call_with_policy(
+                node, lambda: asyncio.to_thread(tool_executor.execute, tool_type, tool_params, context),
+                span_name="tool.call")
+            if result.get("success"):
+                self._cache_store(node, cache_key, result)
+
+        if result.get("success"):
+            output = json.dumps(result, ensure_ascii=False)
+            tool_msg = result.get("message", "")
+            self._emit("console_log", source="tool", log_type="success", message=f"[Tool] {node_label} 执行成功: {tool_msg}")
+        else:
+            error_msg = result.get("error", "工具执行失败")
+            self._emit("console_log", source="tool", log_type="error", message=f"[Tool] {node_label} 执行失败: {error_msg}")
+            output = f"工具执行失败: {error_msg}"
+
+        self._emit("node_complete", nodeId=node_id, nodeLabel=node_label, message=f"{node_label} 执行完成")
+        return output
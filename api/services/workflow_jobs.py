@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+工作流后台任务队列
+
+提交工作流后立即返回 run_id，由固定数量的异步 worker 在后台执行，
+调用方通过状态查询、结果查询、取消和 SSE 订阅接口获取进度。
+worker 数量限制了单个进程内同时执行的工作流（大模型调用）数量，
+排队的任务数不超过 WORKFLOW_JOB_MAX_QUEUE，队列已满时拒绝新提交。
+"""
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config.settings import WORKFLOW_JOB_WORKERS, WORKFLOW_JOB_RETENTION, WORKFLOW_JOB_MAX_QUEUE
+
+# 任务终态
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+@dataclass
+class WorkflowJob:
+    """工作流后台任务"""
+    run_id: str
+    workflow_name: str
+    engine: Any
+    user_input: str = ""
+    history: List[dict] = field(default_factory=list)
+    resume: bool = False
+    status: str = "queued"
+    output: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    events: deque = field(default_factory=lambda: deque(maxlen=2000))
+    subscribers: List[asyncio.Queue] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态（不含输出内容）"""
+        return {
+            "run_id": self.run_id,
+            "workflow_name": self.workflow_name,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def publish(self, event: Optional[dict]):
+        """记录事件并推送给所有订阅者，None 表示事件流结束
+
+        token 增量事件只推送给在线订阅者，不进入回放缓冲，避免挤掉节点级事件。
+        """
+        if event is not None and event["type"] not in ("token", "token_reset"):
+            self.events.append(event)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # 订阅者消费过慢，丢弃该订阅
+                self.subscribers.remove(queue)
+
+
+class WorkflowJobQueue:
+    """工作流后台任务队列"""
+
+    def __init__(self, workers: int = WORKFLOW_JOB_WORKERS, retention: int = WORKFLOW_JOB_RETENTION,
+                 max_queue: int = WORKFLOW_JOB_MAX_QUEUE):
+        """
+        初始化任务队列。
+
+        Args:
+            workers: worker 数量（同时执行的工作流上限）
+            retention: 内存中保留的已结束任务数
+            max_queue: 排队等待执行的任务数上限，0 表示不限制
+        """
+        self.worker_count = max(1, workers)
+        self.retention = retention
+        self.max_queue = max(0, max_queue)
+        self.jobs: "OrderedDict[str, WorkflowJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def _ensure_workers(self):
+        """在当前事件循环中按需启动 worker"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [w for w in self._workers if not w.done()]
+        for i in range(len(self._workers), self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+
+    def submit(self, engine: Any, workflow_name: str, user_input: str = "",
+               history: List[dict] = None, resume: bool = False) -> WorkflowJob:
+        """
+        提交工作流任务。
+
+        Args:
+            engine: WorkflowEngine 实例，任务 ID 即 engine.run_id
+            workflow_name: 工作流名称
+            user_input: 用户输入
+            history: 对话历史
+            resume: 是否从检查点恢复执行
+
+        Returns:
+            排队中的任务
+
+        Raises:
+            asyncio.QueueFull: 排队的任务数已达上限
+        """
+        self._ensure_workers()
+        if self._queue.full():
+            raise asyncio.QueueFull(f"任务队列已满（{self.max_queue} 个排队中）")
+        job = WorkflowJob(
+            run_id=engine.run_id,
+            workflow_name=workflow_name,
+            engine=engine,
+            user_input=user_input,
+            history=history or [],
+            resume=resume,
+        )
+        self.jobs[job.run_id] = job
+        self._prune()
+        self._queue.put_nowait(job)
+        print(f"[WorkflowJobs] 已提交任务 {job.run_id} ({workflow_name})，排队 {self._queue.qsize()} 个")
+        return job
+
+    def get(self, run_id: str) -> Optional[WorkflowJob]:
+        """获取任务"""
+        return self.jobs.get(run_id)
+
+    def cancel(self, run_id: str) -> bool:
+        """取消排队中或执行中的任务"""
+        job = self.jobs.get(run_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            self._finish(job, "cancelled", error="任务已取消")
+        return True
+
+    async def subscribe(self, run_id: str) -> AsyncIterator[dict]:
+        """订阅任务事件：先回放已产生的事件，再持续推送直到任务结束"""
+        job = self.jobs.get(run_id)
+        if job is None:
+            return
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        history = list(job.events)
+        finished = job.status in FINISHED_STATUSES
+        if not finished:
+            job.subscribers.append(queue)
+        try:
+            for event in history:
+                yield event
+            while not finished:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            if queue in job.subscribers:
+                job.subscribers.remove(queue)
+
+    async def shutdown(self):
+        """停止所有 worker 并取消执行中的任务"""
+        for job in self.jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def stats(self) -> Dict[str, int]:
+        """队列统计"""
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        counts["workers"] = self.worker_count
+        counts["queue_size"] = self._queue.qsize() if self._queue is not None else 0
+        counts["max_queue"] = self.max_queue
+        return counts
+
+    async def _worker(self, index: int):
+        """worker 循环：逐个取出任务执行"""
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != "queued":
+                    continue
+                job.task = asyncio.create_task(self._run(job))
+                # 使用 wait 避免任务被取消时连带结束 worker
+                await asyncio.wait({job.task})
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: WorkflowJob):
+        """执行单个任务"""
+        job.status = "running"
+        job.started_at = datetime.now().isoformat()
+        print(f"[WorkflowJobs] 开始执行任务 {job.run_id} ({job.workflow_name})")
+        try:
+            async for event in job.engine.stream(job.user_input, job.history, job.resume):
+                if event["type"] == "content":
+                    job.output = event["content"]
+                job.publish(event)
+            self._finish(job, "completed")
+        except asyncio.CancelledError:
+            job.publish({"type": "error", "message": "任务已取消"})
+            self._finish(job, "cancelled", error="任务已取消")
+        except Exception as e:
+            print(f"[WorkflowJobs] 任务 {job.run_id} 执行失败: {e}")
+            job.publish({"type": "error", "message": str(e)})
+            self._finish(job, "failed", error=str(e))
+
+    def _finish(self, job: WorkflowJob, status: str, error: str = None):
+        """标记任务结束并通知订阅者"""
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now().isoformat()
+        job.engine = None
+        job.publish(None)
+        job.subscribers.clear()
+
+    def _prune(self):
+        """淘汰最早结束的任务，保留最近 retention 个"""
+        finished = [rid for rid, job in self.jobs.items() if job.status in FINISHED_STATUSES]
+        for run_id in finished[:max(0, len(finished) - self.retention)]:
+            del self.jobs[run_id]
+
+
+# 全局工作流任务队列
+workflow_jobs = WorkflowJobQueue()
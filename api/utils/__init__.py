@@ -2,6 +2,6 @@
 """
 工具函数模块
 """
-from .graph import get_execution_order
+from .graph import get_execution_order, get_execution_levels
 
-__all__ = ['get_execution_order']
+__all__ = ['get_execution_order', 'get_execution_levels']
@@ -2,9 +2,24 @@
 """
 图算法工具
 
-提供工作流图相关的算法，如拓扑排序。
+提供工作流图相关的算法，如拓扑排序、分层调度。
 """
-from typing import List, Dict
+from typing import List, Dict, Tuple
+
+
+def _dependency_graph(nodes: List[dict], edges: List[dict]) -> Tuple[Dict[str, int], Dict[str, List[str]]]:
+    """构建入度表和邻接表（忽略指向未知节点的边）"""
+    in_degree = {n["id"]: 0 for n in nodes}
+    adj = {n["id"]: [] for n in nodes}
+    
+    for edge in edges:
+        source = edge.get("source")
+        target = edge.get("target")
+        if source and target and source in adj and target in in_degree:
+            adj[source].append(target)
+            in_degree[target] += 1
+    
+    return in_degree, adj
 
 
 def get_execution_order(nodes: List[dict], edges: List[dict]) -> List[str]:
@@ -16,32 +31,41 @@ def get_execution_order(nodes: List[dict], edges: List[dict]) -> List[str]:
         edges: 边列表，每条边包含 source 和 target
     
     Returns:
-        按执行顺序排列的节点 ID 列表
+        按执行顺序排列的节点 ID 列表（即逐层展开的执行层级，与 Kahn 算法按队列出队的顺序一致）
     """
-    # 构建入度表和邻接表
-    in_degree = {n["id"]: 0 for n in nodes}
-    adj = {n["id"]: [] for n in nodes}
+    return [node for level in get_execution_levels(nodes, edges) for node in level]
+
+
+def get_execution_levels(nodes: List[dict], edges: List[dict]) -> List[List[str]]:
+    """
+    按就绪层级对节点分组（分层拓扑排序）。
     
-    for edge in edges:
-        source = edge.get("source")
-        target = edge.get("target")
-        if source and target and source in adj and target in in_degree:
-            adj[source].append(target)
-            in_degree[target] += 1
+    同一层级内的节点之间没有依赖，上游层级全部完成后即可并发执行。
+    
+    Args:
+        nodes: 节点列表，每个节点包含 id
+        edges: 边列表，每条边包含 source 和 target
+    
+    Returns:
+        层级列表，每个层级为节点 ID 列表
+    """
+    in_degree, adj = _dependency_graph(nodes, edges)
     
-    # Kahn 算法进行拓扑排序
-    queue = [n for n in in_degree if in_degree[n] == 0]
-    order = []
+    # Kahn 算法，每一轮入度降为 0 的节点组成下一层级
+    levels = []
+    current = [n for n in in_degree if in_degree[n] == 0]
     
-    while queue:
-        node = queue.pop(0)
-        order.append(node)
-        for neighbor in adj[node]:
-            in_degree[neighbor] -= 1
-            if in_degree[neighbor] == 0:
-                queue.append(neighbor)
+    while current:
+        levels.append(current)
+        next_level = []
+        for node in current:
+            for neighbor in adj[node]:
+                in_degree[neighbor] -= 1
+                if in_degree[neighbor] == 0:
+                    next_level.append(neighbor)
+        current = next_level
     
-    return order
+    return levels
 
 
 def build_adjacency_graph(nodes: List[dict], edges: List[dict]) -> Dict[str, List[dict]]:
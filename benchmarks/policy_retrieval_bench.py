@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+制度问答检索基准测试
+
+对一组带关键词标注的员工问题，统计文档检索的耗时和召回率（关键词出现在前 k 个片段中），
+并估算每次回答的提示词 token 数和延迟：
+
+- 读文件（基线）：模型先读取 SKILL.md，再读取包含答案的整份制度文档，共 3 次调用，
+  每次调用都重新发送之前的全部内容；按第一次就选对文档计算，是基线的下限；
+- 检索：问题前附带前 k 个片段的一次性提示，1 次调用。
+
+延迟估算 = 调用次数 × 单次调用开销 + 提示词 token 总数 / 预填充速率。不调用模型，
+不需要网络和 API 密钥。
+
+使用方式（在项目根目录执行）:
+    python -m benchmarks.policy_retrieval_bench
+    python -m benchmarks.policy_retrieval_bench --top-k 2 4 8 --call-latency 1.0 --prefill-tps 3000
+    python -m benchmarks.policy_retrieval_bench --output retrieval.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# (问题, 答案中必须出现的关键词, 答案所在文档)
+QUESTIONS = [
+    ("工资每个月几号发？", "20日", "员工手册V3.2"),
+    ("请假需要提前多久申请？", "1个工作日", "员工手册V3.2"),
+    ("年假有几天？", "年假", "员工手册V3.2"),
+    ("迟到一次扣多少钱？", "50元", "员工手册V3.2"),
+    ("忘记打卡了怎么办？", "补卡", "员工手册V3.2"),
+    ("试用期是多长时间？", "3个月", "员工手册V3.2"),
+    ("辞职要提前多久通知？", "1个月", "员工手册V3.2"),
+    ("自己买电脑公司补贴多少？", "50%", "自行购置电脑补贴制度V2.0"),
+    ("出差住宿标准是多少？", "住宿", "财务制度V3.2"),
+    ("业务招待费怎么报销？", "招待", "财务制度V3.2"),
+    ("员工借款的流程是什么？", "借支", "财务制度V3.2"),
+]
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="制度问答检索基准测试")
+    parser.add_argument("--top-k", nargs="+", type=int, default=[2, 4, 8], help="检索的片段数")
+    parser.add_argument("--repeat", type=int, default=100, help="每个问题重复检索的次数（统计耗时）")
+    parser.add_argument("--call-latency", type=float, default=0.8, help="单次模型调用的固定开销（秒）")
+    parser.add_argument("--prefill-tps", type=float, default=2000, help="提示词预填充速率（token/秒）")
+    parser.add_argument("--output", help="结果 JSON 输出路径")
+    return parser.parse_args(argv)
+
+
+def configure_environment():
+    """在导入项目模块前设置环境变量（配置在导入时读取）"""
+    os.environ["MODEL_PROVIDER"] = "mock"
+    sys.path.insert(0, str(ROOT))
+    os.chdir(ROOT)
+
+
+def read_text(path: Path) -> str:
+    """读取文本文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def estimate_latency(prompts: List[int], args: argparse.Namespace) -> float:
+    """按调用次数和提示词 token 数估算延迟（秒）"""
+    return len(prompts) * args.call_latency + sum(prompts) / args.prefill_tps
+
+
+def main(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """执行基准测试并打印结果表"""
+    from agents.policy_qa_agent import PolicyQAAgent, POLICY_DOCS_DIR
+    from agents.toolkit_templates import skill_toolkit
+    from agents.doc_retrieval import DocIndex, format_passages
+    from api.services.token_logger import estimate_tokens
+
+    skill_dir = Path(POLICY_DOCS_DIR).parent
+    toolkit = skill_toolkit([f"./{skill_dir.as_posix()}"])
+    system = estimate_tokens(PolicyQAAgent.DEFAULT_SYS_PROMPT + (toolkit.get_agent_skill_prompt() or ""))
+    skill_md = estimate_tokens(read_text(skill_dir / "SKILL.md"))
+    docs = {p.stem: estimate_tokens(read_text(p)) for p in Path(POLICY_DOCS_DIR).glob("*.md")}
+
+    start = time.perf_counter()
+    index = DocIndex(POLICY_DOCS_DIR)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"索引: {len(docs)} 个文档, {len(index.passages)} 个片段, 建立耗时 {build_ms:.1f} ms")
+    print(f"系统提示词约 {system} tokens, SKILL.md 约 {skill_md} tokens, "
+          f"制度文档约 {', '.join(f'{name} {tokens}' for name, tokens in docs.items())} tokens\n")
+
+    # 读文件基线：问题 → 读 SKILL.md → 读制度文档 → 回答
+    baseline_tokens, baseline_seconds = [], []
+    for question, _, doc in QUESTIONS:
+        base = system + estimate_tokens(question)
+        prompts = [base, base + skill_md, base + skill_md + docs[doc]]
+        baseline_tokens.append(sum(prompts))
+        baseline_seconds.append(estimate_latency(prompts, args))
+
+    results = [{
+        "mode": "file_reading",
+        "top_k": None,
+        "recall": None,
+        "search_ms": None,
+        "calls": 3,
+        "prompt_tokens": round(sum(baseline_tokens) / len(QUESTIONS)),
+        "est_latency_s": round(sum(baseline_seconds) / len(QUESTIONS), 2),
+    }]
+    for top_k in args.top_k:
+        hits, tokens, seconds, search_ms = 0, [], [], []
+        for question, keyword, _ in QUESTIONS:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                passages = index.search(question, top_k)
+            search_ms.append((time.perf_counter() - start) * 1000 / args.repeat)
+            hits += any(keyword in p.text for p in passages)
+            prompts = [system + estimate_tokens(format_passages(passages)) + estimate_tokens(question)]
+            tokens.append(sum(prompts))
+            seconds.append(estimate_latency(prompts, args))
+        results.append({
+            "mode": "retrieval",
+            "top_k": top_k,
+            "recall": round(hits / len(QUESTIONS), 3),
+            "search_ms": round(sum(search_ms) / len(search_ms), 3),
+            "calls": 1,
+            "prompt_tokens": round(sum(tokens) / len(QUESTIONS)),
+            "est_latency_s": round(sum(seconds) / len(QUESTIONS), 2),
+        })
+
+    print(f"{'mode':<16}{'top_k':>6}{'recall':>8}{'search ms':>11}{'calls':>7}{'tokens':>9}{'est s':>8}")
+    for row in results:
+        print(f"{row['mode']:<16}{str(row['top_k'] or '-'):>6}{str(row['recall'] if row['recall'] is not None else '-'):>8}"
+              f"{str(row['search_ms'] if row['search_ms'] is not None else '-'):>11}{row['calls']:>7}"
+              f"{row['prompt_tokens']:>9}{row['est_latency_s']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment()
+    main(arguments)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+工作流基准测试
+
+使用模拟模型（MODEL_PROVIDER=mock）在不同并发下重放 workflows/ 中的工作流，
+统计延迟 p50/p95、首 token 延迟、吞吐量和进程峰值内存，作为引擎、智能体池、
+日志等改动的回归基线。不需要网络和 API 密钥。
+
+使用方式（在项目根目录执行）:
+    python -m benchmarks.workflow_bench
+    python -m benchmarks.workflow_bench --workflows parallel_workflow data_flow --concurrency 1 8 32 --runs 64
+    python -m benchmarks.workflow_bench --latency 0.05 --tps 0 --output bench.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKFLOW_DIR = ROOT / "workflows"
+
+# 是否保留执行过程中的控制台输出
+VERBOSE = False
+
+# 轮换使用的测试输入
+SAMPLE_INPUTS = [
+    "请帮我分析一下这份数据并给出结论",
+    "公司的年假制度是怎样规定的？",
+    "帮我生成一个用户管理页面",
+    "这封邮件需要派单给哪个部门处理",
+    "请把下面的内容整理成 PPT 大纲",
+]
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="工作流基准测试（模拟模型）")
+    parser.add_argument("--workflows", nargs="*", help="工作流名称（默认 workflows/ 下全部，跳过 *_backup）")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="并发级别")
+    parser.add_argument("--runs", type=int, default=32, help="每个并发级别的运行次数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟模型首 token 延迟（秒）")
+    parser.add_argument("--tps", type=float, default=200, help="模拟模型 token 速率，0 表示不限速")
+    parser.add_argument("--tokens", type=int, default=64, help="模拟模型回复的 token 数")
+    parser.add_argument("--seed", type=int, default=0, help="模拟模型随机种子")
+    parser.add_argument("--checkpoint", action="store_true", help="开启检查点（写入临时数据库）")
+    parser.add_argument("--trace", action="store_true", help="开启执行追踪")
+    parser.add_argument("--hooks", action="store_true", help="开启智能体钩子日志")
+    parser.add_argument("--run-tools", action="store_true", help="真实执行工具节点（默认跳过以避免副作用）")
+    parser.add_argument("--output", help="结果 JSON 输出路径")
+    parser.add_argument("--verbose", action="store_true", help="保留工作流执行过程中的控制台输出")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace):
+    """在导入项目模块前设置环境变量（配置在导入时读取）"""
+    os.environ["MODEL_PROVIDER"] = "mock"
+    os.environ["MOCK_LLM_LATENCY"] = str(args.latency)
+    os.environ["MOCK_LLM_TOKENS_PER_SECOND"] = str(args.tps)
+    os.environ["MOCK_LLM_OUTPUT_TOKENS"] = str(args.tokens)
+    os.environ["MOCK_LLM_SEED"] = str(args.seed)
+    os.environ["WORKFLOW_CHECKPOINT_ENABLED"] = "true" if args.checkpoint else "false"
+    os.environ["WORKFLOW_TRACE_ENABLED"] = "true" if args.trace else "false"
+    os.environ["ENABLE_AGENT_HOOKS"] = "true" if args.hooks else "false"
+    sys.path.insert(0, str(ROOT))
+    os.chdir(ROOT)
+    global VERBOSE
+    VERBOSE = args.verbose
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程峰值常驻内存（MB）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered)))) - 1
+    return round(ordered[index], 2)
+
+
+async def run_once(plan: Any, user_input: str) -> Dict[str, Any]:
+    """执行一次工作流，返回耗时（毫秒）"""
+    from api.services.workflow_engine import WorkflowEngine
+
+    engine = WorkflowEngine(plan, api_key="mock")
+    start = time.perf_counter()
+    first_token = None
+    error = None
+    try:
+        async for event in engine.stream(user_input):
+            if first_token is None and event["type"] == "token":
+                first_token = time.perf_counter()
+    except Exception as e:
+        error = str(e)
+    end = time.perf_counter()
+    return {
+        "latency_ms": (end - start) * 1000,
+        "ttft_ms": (first_token - start) * 1000 if first_token else None,
+        "error": error,
+    }
+
+
+async def bench_level(plan: Any, concurrency: int, runs: int) -> Dict[str, Any]:
+    """在指定并发下执行 runs 次工作流"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(i: int):
+        async with semaphore:
+            return await run_once(plan, f"{SAMPLE_INPUTS[i % len(SAMPLE_INPUTS)]} #{i}")
+
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if not VERBOSE:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        results = await asyncio.gather(*(worker(i) for i in range(runs)))
+    wall = time.perf_counter() - start
+
+    latencies = [r["latency_ms"] for r in results]
+    ttfts = [r["ttft_ms"] for r in results if r["ttft_ms"] is not None]
+    errors = [r["error"] for r in results if r["error"]]
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "ttft_p50_ms": percentile(ttfts, 50),
+        "throughput_rps": round(runs / wall, 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def main(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """执行基准测试并打印结果表"""
+    from api.services.workflow_engine import get_plan
+    from api.services import workflow_checkpoint
+    from api.services import token_logger
+    from api.services import fast_classifier
+    from api.services.tool_executor import tool_executor
+
+    # Token 日志、检查点和分类样本写入临时目录，不污染 data/
+    work_dir = tempfile.mkdtemp(prefix="workflow_bench_")
+    token_logger.TOKEN_LOG_FILE = os.path.join(work_dir, "token_logs.json")
+    if args.checkpoint:
+        workflow_checkpoint._checkpoint_store = workflow_checkpoint.CheckpointStore(
+            os.path.join(work_dir, "workflow_runs.db"))
+    fast_classifier._fast_classifier = fast_classifier.FastClassifier(
+        os.path.join(work_dir, "classifier_examples.db"))
+    if not args.run_tools:
+        tool_executor.execute = lambda tool_type, params, context=None: {"success": True, "message": "skipped"}
+
+    names = args.workflows or sorted(p.stem for p in WORKFLOW_DIR.glob("*.json") if not p.stem.endswith("_backup"))
+    results = []
+    print(f"{'workflow':<24}{'conc':>6}{'runs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'ttft ms':>10}{'rps':>9}{'rss MB':>9}")
+    for name in names:
+        with open(WORKFLOW_DIR / f"{name}.json", "r", encoding="utf-8") as f:
+            plan = get_plan(json.load(f), name)
+        for concurrency in args.concurrency:
+            row = {"workflow": name, **await bench_level(plan, concurrency, max(args.runs, concurrency))}
+            results.append(row)
+            print(f"{name:<24}{row['concurrency']:>6}{row['runs']:>6}{row['errors']:>5}"
+                  f"{row['p50_ms']:>10}{row['p95_ms']:>10}{str(row['ttft_p50_ms']):>10}"
+                  f"{row['throughput_rps']:>9}{str(row['peak_rss_mb']):>9}")
+            if row["first_error"]:
+                print(f"  错误示例: {row['first_error']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    asyncio.run(main(arguments))
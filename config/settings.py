@@ -15,6 +15,9 @@ AGENTS_CONFIG = PROJECT_ROOT / "config" / "agents.yaml"
 # API Keys
 DASHSCOPE_API_KEY = os.environ.get("DASHSCOPE_API_KEY", "")
 
+# DashScope 的 OpenAI 兼容接口
+DASHSCOPE_COMPATIBLE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
 # AIGateway 配置 (OpenAI 兼容接口)
 AIGATEWAY_API_KEY = os.environ.get("AIGATEWAY_API_KEY", "")
 AIGATEWAY_BASE_URL = os.environ.get("AIGATEWAY_BASE_URL", "")  # 例如: https://aigateway.edgecloudapp.com/v1/{id}/{name}
@@ -29,8 +32,112 @@ ZHIPU_MODEL = os.environ.get("ZHIPU_MODEL", "glm-4-flash")
 DEFAULT_MODEL = "qwen3-max"
 DEFAULT_MAX_ITERS = 30
 
-# 模型提供商: "dashscope" 或 "aigateway"
+# 工作流中同一层级并发执行的最大节点数（可被工作流 JSON 的 maxConcurrency 覆盖）
+WORKFLOW_MAX_CONCURRENCY = int(os.environ.get("WORKFLOW_MAX_CONCURRENCY", "4"))
+
+# 工作流节点默认超时时间（秒），可被节点的 timeoutSeconds 覆盖，0 表示不限制
+WORKFLOW_NODE_TIMEOUT = float(os.environ.get("WORKFLOW_NODE_TIMEOUT", "600"))
+
+# 是否将工作流节点输出写入检查点（data/workflow_runs.db），用于中断后恢复执行
+WORKFLOW_CHECKPOINT_ENABLED = os.environ.get("WORKFLOW_CHECKPOINT_ENABLED", "true").lower() == "true"
+# 检查点保留：超过天数未更新的运行及超出条数的已结束运行在新建运行时删除
+WORKFLOW_CHECKPOINT_MAX_AGE_DAYS = float(os.environ.get("WORKFLOW_CHECKPOINT_MAX_AGE_DAYS", "7"))
+WORKFLOW_CHECKPOINT_MAX_RUNS = int(os.environ.get("WORKFLOW_CHECKPOINT_MAX_RUNS", "1000"))
+
+# 后台工作流任务队列的 worker 数量（同时执行的工作流上限）及保留的已结束任务数
+WORKFLOW_JOB_WORKERS = int(os.environ.get("WORKFLOW_JOB_WORKERS", "2"))
+WORKFLOW_JOB_RETENTION = int(os.environ.get("WORKFLOW_JOB_RETENTION", "200"))
+# 排队等待执行的任务数上限，队列已满时拒绝新提交（0 表示不限制）
+WORKFLOW_JOB_MAX_QUEUE = int(os.environ.get("WORKFLOW_JOB_MAX_QUEUE", "100"))
+
+# 每个运行（SSE 客户端）事件通道的缓冲上限，超出时丢弃日志事件
+EVENT_QUEUE_MAX_SIZE = int(os.environ.get("EVENT_QUEUE_MAX_SIZE", "1000"))
+
+# 是否记录工作流执行追踪（span），以及内存中保留追踪的运行数
+WORKFLOW_TRACE_ENABLED = os.environ.get("WORKFLOW_TRACE_ENABLED", "true").lower() == "true"
+WORKFLOW_TRACE_MAX_RUNS = int(os.environ.get("WORKFLOW_TRACE_MAX_RUNS", "200"))
+
+# 分类器节点调用期间预热的候选分支数（按关键词得分取 top-k），0 表示关闭，可被节点的 prewarm 覆盖
+WORKFLOW_PREWARM_TOP_K = int(os.environ.get("WORKFLOW_PREWARM_TOP_K", "0"))
+
+# 分类器模式: "llm"（每次调用大模型）或 "tiered"（先走本地规则/质心模型，没把握时再调用大模型），可被节点的 mode 覆盖
+CLASSIFIER_MODE = os.environ.get("CLASSIFIER_MODE", "llm")
+# 是否将大模型分类结果记录为本地模型的训练样本（会把输入原文保存到 data/classifier_examples.db，默认关闭）
+CLASSIFIER_LEARN_ENABLED = os.environ.get("CLASSIFIER_LEARN_ENABLED", "false").lower() == "true"
+# 本地质心模型直接返回结果所需的最低相似度，以及每个分类参与预测所需的最少样本数
+CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get("CLASSIFIER_MIN_CONFIDENCE", "0.35"))
+CLASSIFIER_MIN_EXAMPLES = int(os.environ.get("CLASSIFIER_MIN_EXAMPLES", "5"))
+# 每个分类集合保留的训练样本数（超出的旧样本在写入时删除）
+CLASSIFIER_MAX_EXAMPLES = int(os.environ.get("CLASSIFIER_MAX_EXAMPLES", "5000"))
+
+# 大模型 HTTP 连接池：最大连接数、最大空闲连接数、空闲连接保持时间（秒）、请求超时（秒）
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_TIMEOUT = float(os.environ.get("LLM_HTTP_TIMEOUT", "120"))
+# 是否启用 HTTP/2（需要安装 h2，未安装时自动使用 HTTP/1.1）
+LLM_HTTP2 = os.environ.get("LLM_HTTP2", "true").lower() == "true"
+
+# 大模型限流：是否启用、默认每分钟请求数 / token 数预算（0 表示不限制）
+LLM_RATE_LIMIT_ENABLED = os.environ.get("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+LLM_RPM_LIMIT = float(os.environ.get("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = float(os.environ.get("LLM_TPM_LIMIT", "0"))
+# 自适应并发（AIMD）：初始、最小、最大并发上限
+LLM_CONCURRENCY_INITIAL = int(os.environ.get("LLM_CONCURRENCY_INITIAL", "16"))
+LLM_CONCURRENCY_MIN = int(os.environ.get("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.environ.get("LLM_CONCURRENCY_MAX", "64"))
+# 按提供商或模型覆盖的预算（JSON），例如: {"aigateway/claude-4.5-sonnet": {"rpm": 60, "tpm": 100000, "max_concurrency": 8}}
+LLM_RATE_LIMITS = os.environ.get("LLM_RATE_LIMITS", "")
+
+# 模型路由：主模型失败或超时后依次尝试的备用模型（JSON），例如:
+# [{"provider": "aigateway", "model": "claude-4.5-sonnet"}, {"provider": "dashscope", "model": "qwen3-max"}]
+MODEL_ROUTES = os.environ.get("MODEL_ROUTES", "")
+# 单个模型返回首个响应的超时时间（秒），超时后切换到下一个模型
+MODEL_FAILOVER_TIMEOUT = float(os.environ.get("MODEL_FAILOVER_TIMEOUT", "60"))
+# 对冲请求：是否启用、耗时样本不足时的默认延迟（秒）、按 p95 计算延迟所需的最少样本数
+MODEL_HEDGE_ENABLED = os.environ.get("MODEL_HEDGE_ENABLED", "true").lower() == "true"
+MODEL_HEDGE_DELAY = float(os.environ.get("MODEL_HEDGE_DELAY", "3.0"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.environ.get("MODEL_HEDGE_MIN_SAMPLES", "20"))
+
+# 技能注册表检查 SKILL.md 变化的最小间隔（秒），0 表示每次查找都检查
+SKILL_REGISTRY_CHECK_INTERVAL = float(os.environ.get("SKILL_REGISTRY_CHECK_INTERVAL", "2.0"))
+
+# 提示词前缀缓存：是否记录请求前缀（统计复用率）、发送显式缓存标记的提供商（逗号分隔，如 "dashscope,aigateway"）
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+PROMPT_CACHE_HINTS = os.environ.get("PROMPT_CACHE_HINTS", "")
+# 加显式缓存标记的最小前缀 token 数、提供商侧缓存的大致时长（秒）
+PROMPT_CACHE_MIN_TOKENS = int(os.environ.get("PROMPT_CACHE_MIN_TOKENS", "1024"))
+PROMPT_CACHE_TTL = float(os.environ.get("PROMPT_CACHE_TTL", "300"))
+
+# 对话响应缓存：总开关（各智能体在 config/agents.yaml 的 response_cache 段中开启）、默认 TTL（秒）、
+# 近似匹配的默认相似度阈值、最大条目数和容量上限（MB）
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.85"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_MAX_MB = float(os.environ.get("RESPONSE_CACHE_MAX_MB", "50"))
+
+# 制度问答检索：是否把检索到的制度片段放入提示词、片段数、片段最大字符数、检查文档变化的最小间隔（秒）
+RETRIEVAL_ENABLED = os.environ.get("RETRIEVAL_ENABLED", "true").lower() == "true"
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_CHUNK_CHARS = int(os.environ.get("RETRIEVAL_CHUNK_CHARS", "800"))
+RETRIEVAL_CHECK_INTERVAL = float(os.environ.get("RETRIEVAL_CHECK_INTERVAL", "5.0"))
+
+# 智能体池最多保留的空闲实例数
+AGENT_POOL_MAX_IDLE = int(os.environ.get("AGENT_POOL_MAX_IDLE", "32"))
+
+# 工作流节点结果缓存的最大条目数
+NODE_CACHE_MAX_ENTRIES = int(os.environ.get("NODE_CACHE_MAX_ENTRIES", "1024"))
+
+# 模型提供商: "dashscope"、"aigateway"、"zhipu" 或 "mock"
 MODEL_PROVIDER = os.environ.get("MODEL_PROVIDER", "dashscope")
 
+# 模拟模型配置（MODEL_PROVIDER=mock 时生效，用于无网络环境的基准测试）
+MOCK_LLM_LATENCY = float(os.environ.get("MOCK_LLM_LATENCY", "0.2"))  # 首 token 延迟（秒）
+MOCK_LLM_TOKENS_PER_SECOND = float(os.environ.get("MOCK_LLM_TOKENS_PER_SECOND", "50"))  # 0 表示不限速
+MOCK_LLM_OUTPUT_TOKENS = int(os.environ.get("MOCK_LLM_OUTPUT_TOKENS", "64"))
+MOCK_LLM_SEED = int(os.environ.get("MOCK_LLM_SEED", "0"))
+MOCK_LLM_RESPONSES = os.environ.get("MOCK_LLM_RESPONSES", "")  # 固定回复 JSON 文件路径
+
 # 日志配置
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")